@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import pytest
+import os
+import sys
 import pyBigWig
 from cyvcf2 import VCF
 import logging
@@ -20,6 +22,9 @@ import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# shared vcf_prepper modules, e.g. - csq_schema
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "../nextflow/vcf_prepper/bin"))
+
 def pytest_addoption(parser):
     parser.addoption("--vcf", type=str, default=None)
     parser.addoption("--bigbed", type=str, default=None)
@@ -22,6 +22,8 @@ import random
 from math import isclose
 import logging
 
+from csq_schema import CsqSchema
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -133,9 +135,7 @@ class TestHeader:
     def test_info_csq(self, vcf_reader, species):
         assert vcf_reader.get_header_type("CSQ")
 
-        csq_info_description = vcf_reader.get_header_type("CSQ")["Description"].strip("\"")
-        prefix = "Consequence annotations from Ensembl VEP. Format: "
-        csq_list = [csq.strip() for csq in csq_info_description[len(prefix):].split("|")]
+        csq_list = CsqSchema.from_vcf(vcf_reader).csq_list
 
         for csq_field in CSQ_FIELDS:
             if "field_existance" in CSQ_FIELDS[csq_field]:
@@ -277,13 +277,9 @@ class TestContent:
         NO_VARIANTS = 100
         NO_ITER = 100000
         
-        csq_info_description = vcf_reader.get_header_type("CSQ")["Description"]
-        csq_list = [csq.strip() for csq in csq_info_description.split("Format: ")[1].split("|")]
-
-        csq_field_idx = {}
-        for csq_field in CSQ_FIELDS:
-            if csq_field in csq_list:
-                csq_field_idx[csq_field] = csq_list.index(csq_field)
+        csq_header = CsqSchema.from_vcf(vcf_reader)
+        csq_fields = [csq_field for csq_field in CSQ_FIELDS if csq_header.has(csq_field)]
+        csq_schema = CsqSchema.from_vcf(vcf_reader, csq_fields)
 
         chrs = vcf_reader.seqnames
         variants = []
@@ -299,17 +295,17 @@ class TestContent:
             iter += 1
 
         csq_field_cnt = {}
-        for csq_field in csq_field_idx:
+        for csq_field in csq_fields:
             csq_field_cnt[csq_field] = 0
 
         for variant in variants:
             csq = variant.INFO["CSQ"].split(",")[0]
-            csq_field_vals = csq.split("|")
-            for csq_field in csq_field_idx:
-                if csq_field_vals[csq_field_idx[csq_field]] != '':
+            csq_field_vals = csq_schema.project(csq)
+            for (csq_field, csq_field_val) in zip(csq_fields, csq_field_vals):
+                if csq_field_val != '':
                     csq_field_cnt[csq_field] += 1
 
-        for csq_field in csq_field_idx:
+        for csq_field in csq_fields:
             if "empty_value" in CSQ_FIELDS[csq_field]:
                 canbe_empty = CSQ_FIELDS[csq_field]["empty_value"]
             else:
@@ -343,12 +339,7 @@ class TestSummaryStatistics:
         NO_VARIANTS = 100
         NO_ITER = 100000
         
-        csq_info_description = vcf_reader.get_header_type("CSQ")["Description"]
-        csq_list = [csq.strip() for csq in csq_info_description.split("Format: ")[1].split("|")]
-
-        csq_field_idx = {}
-        for csq_field in csq_list:
-                csq_field_idx[csq_field] = csq_list.index(csq_field)
+        csq_schema = CsqSchema.from_vcf(vcf_reader, ["PUBMED"])
 
         chrs = vcf_reader.seqnames
         variants = []
@@ -360,12 +351,8 @@ class TestSummaryStatistics:
             for variant in vcf_reader(f"{chr}:{start}"):
                 citation = set()
 
-                csqs = variant.INFO["CSQ"]
-                for csq in csqs.split(","):
-                    csq_values = csq.split("|")
-
-                    if "PUBMED" in csq_field_idx:
-                        cites = csq_values[csq_field_idx["PUBMED"]]
+                for (cites,) in csq_schema.parse(variant.INFO["CSQ"]):
+                    if csq_schema.has("PUBMED"):
                         for cite in cites.split("&"):
                             if cite != "":
                                 citation.add(cite)
@@ -381,12 +368,7 @@ class TestSummaryStatistics:
         NO_VARIANTS = 100
         NO_ITER = 100000
         
-        csq_info_description = vcf_reader.get_header_type("CSQ")["Description"]
-        csq_list = [csq.strip() for csq in csq_info_description.split("Format: ")[1].split("|")]
-
-        csq_field_idx = {}
-        for csq_field in csq_list:
-                csq_field_idx[csq_field] = csq_list.index(csq_field)
+        csq_schema = CsqSchema.from_vcf(vcf_reader, ["Allele", "Consequence", "Feature", "Gene", "PHENOTYPES"])
 
         chrs = vcf_reader.seqnames
         variants = []
@@ -402,14 +384,7 @@ class TestSummaryStatistics:
                 gene_phenotype = {}
                 variant_phenotype = {}
 
-                csqs = variant.INFO["CSQ"]
-                for csq in csqs.split(","):
-                    csq_values = csq.split("|")
-
-                    allele = csq_values[csq_field_idx["Allele"]]
-                    consequences = csq_values[csq_field_idx["Consequence"]]
-                    feature_stable_id = csq_values[csq_field_idx["Feature"]]
-
+                for (allele, consequences, feature_stable_id, gene_stable_id, phenotypes) in csq_schema.parse(variant.INFO["CSQ"]):
                     for csq in consequences.split("&"):
                         if csq not in self.SKIP_CONSEQUENCE:
                             if csq.startswith("regulatory"):
@@ -422,10 +397,9 @@ class TestSummaryStatistics:
                                 transcript_consequence[allele].add(f"{feature_stable_id}:{consequences}")
                                 if allele not in gene:
                                     gene[allele] = set()
-                                gene[allele].add(csq_values[csq_field_idx["Gene"]] )
+                                gene[allele].add(gene_stable_id)
 
-                    if "PHENOTYPES" in csq_field_idx:
-                        phenotypes = csq_values[csq_field_idx["PHENOTYPES"]]
+                    if csq_schema.has("PHENOTYPES"):
                         for phenotype in phenotypes.split("&"):
                             pheno_per_allele_fields = phenotype.split("+")
                             if len(pheno_per_allele_fields) != 3:
@@ -490,14 +464,9 @@ class TestSummaryStatistics:
         NO_VARIANTS = 100
         NO_ITER = 100000
 
-        csq_info_description = vcf_reader.get_header_type("CSQ")["Description"]
-        csq_list = [csq.strip() for csq in csq_info_description.split("Format: ")[1].split("|")]
-
-        csq_field_idx = {}
-        for csq_field in csq_list:
-                csq_field_idx[csq_field] = csq_list.index(csq_field)
+        csq_schema = CsqSchema.from_vcf(vcf_reader, ["Allele", freq_csq_field])
             
-        assert freq_csq_field in csq_field_idx
+        assert csq_schema.has(freq_csq_field)
 
         chrs = vcf_reader.seqnames
         variants = []
@@ -509,13 +478,7 @@ class TestSummaryStatistics:
             for variant in vcf_reader(f"{chr}:{start}"):
                 frequency = {}
 
-                csqs = variant.INFO["CSQ"]
-                for csq in csqs.split(","):
-                    csq_values = csq.split("|")
-
-                    allele = csq_values[csq_field_idx["Allele"]]
-                    freq = csq_values[csq_field_idx[freq_csq_field]]
-
+                for (allele, freq) in csq_schema.parse(variant.INFO["CSQ"]):
                     if freq != "":
                         frequency[allele] = float(freq)
                 
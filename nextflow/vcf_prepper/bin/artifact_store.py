@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import subprocess
+from typing import Callable
+
+# Local store of the large files the pipeline copies or downloads (VEP caches, FASTA, conservation
+# bigwigs). Each file is stored once, under the digest of a key identifying its content - source
+# path, size and mtime for a copy, URL for a download - and every target is made a hardlink to it
+# (a reflink or a copy if the target is on another file system). So a FASTA used by two genomes or
+# by the next run is copied only once.
+#
+#     <store_dir>/objects/<digest>        stored file, read-only
+#     <store_dir>/objects/<digest>.json   key, size, last use and targets (refs) of the file
+#
+# A stored file is referenced while one of its targets still exists as the same file. Files that
+# are not referenced are removed, least recently used first, when the store is larger than its
+# maximum size.
+
+LOCK_FILE = "store.lock"
+
+class ArtifactStore():
+    def __init__(self, store_dir: str, max_size: int = None):
+        self.store_dir = store_dir
+        self.max_size = max_size
+        self.objects_dir = os.path.join(store_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok = True)
+
+    @staticmethod
+    def file_key(src_file: str) -> list:
+        stat = os.stat(src_file)
+        return ["file", os.path.realpath(src_file), stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def url_key(url: str) -> list:
+        # files on the release FTP directories do not change
+        return ["url", url]
+
+    def _object_file(self, key: list) -> str:
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.objects_dir, digest)
+
+    def _lock(self, lock_file: str, blocking: bool = True):
+        '''Returns open file holding an exclusive lock on lock_file, None if not blocking and it is locked'''
+        file = open(lock_file, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            file.close()
+            return None
+
+        return file
+
+    def _read_meta(self, object_file: str) -> dict:
+        try:
+            with open(object_file + ".json", "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, object_file: str, meta: dict) -> None:
+        temp_file = object_file + ".json.tmp"
+        with open(temp_file, "w") as file:
+            json.dump(meta, file)
+        os.replace(temp_file, object_file + ".json")
+
+    def _link(self, object_file: str, dest_file: str) -> str:
+        '''Make dest_file a hardlink, reflink or copy of object_file, returns how it was made'''
+        temp_file = dest_file + ".store.tmp"
+        if os.path.lexists(temp_file):
+            os.remove(temp_file)
+
+        try:
+            os.link(object_file, temp_file)
+            mode = "hardlink"
+        except OSError:
+            process = subprocess.run(["cp", "--reflink=always", object_file, temp_file],
+                stdout = subprocess.PIPE,
+                stderr = subprocess.PIPE
+            )
+            if process.returncode == 0:
+                mode = "reflink"
+            else:
+                shutil.copyfile(object_file, temp_file)
+                mode = "copy"
+            os.chmod(temp_file, 0o644)
+
+        os.replace(temp_file, dest_file)
+
+        return mode
+
+    def _remove_object(self, object_file: str) -> None:
+        os.remove(object_file)
+
+    def _has_room(self, total_size: int, reserve: int) -> bool:
+        return self.max_size is None or total_size + reserve <= self.max_size
+
+    def _is_live(self, ref: dict) -> bool:
+        try:
+            stat = os.stat(ref["path"])
+        except OSError:
+            return False
+
+        return stat.st_ino == ref["ino"] and stat.st_dev == ref["dev"]
+
+    def materialise(self, key: list, dest_file: str, producer: Callable) -> int:
+        '''
+        Make dest_file the stored file of key. If it is not stored yet, producer(path) is called to
+        create it at path, it must return 0 on success. Returns 0 on success, else the producer or
+        store error code.
+        '''
+        object_file = self._object_file(key)
+
+        # the object lock makes other processes wait for a file being stored instead of storing it again
+        lock = self._lock(object_file + ".lock")
+        try:
+            meta = self._read_meta(object_file)
+            if meta is None or meta["key"] != key or not os.path.isfile(object_file):
+                # the producer path is kept if it fails so that a download can resume from it
+                temp_file = object_file + ".new"
+                returncode = producer(temp_file)
+                if returncode != 0:
+                    return returncode
+
+                os.chmod(temp_file, 0o444)
+                os.replace(temp_file, object_file)
+                meta = {"key": key, "size": os.path.getsize(object_file), "refs": []}
+            else:
+                print(f"[INFO] Using stored {key[1]}")
+
+            try:
+                mode = self._link(object_file, dest_file)
+            except OSError as e:
+                print(f"[WARNING] Could not create {dest_file} from store - {e}")
+                return 1
+
+            stat = os.stat(dest_file)
+            refs = [ref for ref in meta["refs"] if ref["path"] != os.path.abspath(dest_file) and self._is_live(ref)]
+            refs.append({"path": os.path.abspath(dest_file), "ino": stat.st_ino, "dev": stat.st_dev, "mode": mode})
+            meta["refs"] = refs
+            meta["last_used"] = time.time()
+            self._write_meta(object_file, meta)
+        finally:
+            lock.close()
+
+        if self.max_size is not None:
+            self.collect_garbage()
+
+        return 0
+
+    def collect_garbage(self, reserve: int = 0) -> list:
+        '''
+        Remove stored files with no live target, least recently used first, until the store is
+        not larger than max_size (with reserve bytes more to store). Returns the removed keys.
+        '''
+        lock = self._lock(os.path.join(self.store_dir, LOCK_FILE))
+        try:
+            objects = []
+            for file in os.listdir(self.objects_dir):
+                if not file.endswith(".json"):
+                    continue
+                object_file = os.path.join(self.objects_dir, file[:-len(".json")])
+                meta = self._read_meta(object_file)
+                if meta is not None and os.path.exists(object_file):
+                    objects.append((object_file, meta))
+
+            total_size = sum(meta["size"] for (_, meta) in objects)
+            removed = []
+            for (object_file, meta) in sorted(objects, key = lambda object: object[1].get("last_used", 0)):
+                if self._has_room(total_size, reserve):
+                    break
+
+                # skip files being stored or linked right now
+                object_lock = self._lock(object_file + ".lock", blocking = False)
+                if object_lock is None:
+                    continue
+                try:
+                    if any(self._is_live(ref) for ref in meta["refs"]):
+                        continue
+                    self._remove_object(object_file)
+                    os.remove(object_file + ".json")
+                finally:
+                    object_lock.close()
+
+                total_size -= meta["size"]
+                removed.append(meta["key"])
+
+            # a caller reserving room reports it itself
+            if reserve == 0 and not self._has_room(total_size, reserve):
+                print(f"[WARNING] Artifact store {self.store_dir} is {total_size} bytes, over its maximum {self.max_size}, but all files are in use")
+        finally:
+            lock.close()
+
+        return removed
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import zlib
+import struct
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# BGZF writing, used by the scripts of vcf_prepper (through helper) and by prepare_fasta.py of both
+# vcf_prepper and vep_prepper. It only uses the standard library so that it can be shipped in the
+# bin directory of either pipeline on its own.
+
+# same block size as htslib so that a block of incompressible data still fits in 64 KiB
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_EOF = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+def compress_bgzf_block(data: bytes, compresslevel: int = 6) -> bytes:
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+
+    # gzip header with the BC extra field holding total block size - 1
+    return struct.pack("<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed) + 25) + \
+        compressed + struct.pack("<2I", zlib.crc32(data), len(data))
+
+class BgzfWriter():
+    '''
+    Write BGZF (bgzip compatible) file. Data is cut into blocks of BGZF_BLOCK_SIZE and, with
+    threads > 1, the blocks are compressed on a thread pool (zlib releases the GIL) and written
+    in order.
+
+        with BgzfWriter(output_file, threads = 4) as output:
+            output.write(header)
+            for line in lines:
+                output.write(line)
+
+    Both str and bytes can be written. flush() ends the current block, so that what follows
+    starts in a new block - e.g. after a VCF header.
+
+    If a VcfIndex is given, every written record is added to it and it is finished with the
+    virtual offsets of the records on close; writing it out is up to the caller.
+    '''
+
+    def __init__(self, filename: str, threads: int = 1, compresslevel: int = 6, index: "VcfIndex" = None):
+        self._file = open(filename, "wb")
+        self._compresslevel = compresslevel
+        self._buffer = bytearray()
+        self._pool = ThreadPoolExecutor(threads) if threads > 1 else None
+        # keep a few blocks per thread in flight, more only costs memory
+        self._max_pending = threads * 4
+        self._pending = deque()
+
+        # uncompressed and compressed start offset of every block, to resolve virtual offsets
+        self._index = index
+        self._offset = 0
+        self._block_offset = 0
+        self._block_offsets = []
+        self._block_addresses = []
+        self._address = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data) -> None:
+        if isinstance(data, str):
+            data = data.encode()
+
+        if self._index is not None:
+            self._index.push(data, self._offset)
+        self._offset += len(data)
+
+        buffer = self._buffer
+        buffer += data
+        if len(buffer) >= BGZF_BLOCK_SIZE:
+            for start in range(0, len(buffer) - BGZF_BLOCK_SIZE + 1, BGZF_BLOCK_SIZE):
+                self._write_block(bytes(buffer[start:start + BGZF_BLOCK_SIZE]))
+            del buffer[:start + BGZF_BLOCK_SIZE]
+
+    def _write_block(self, data: bytes) -> None:
+        self._block_offsets.append(self._block_offset)
+        self._block_offset += len(data)
+
+        if self._pool is None:
+            self._emit(compress_bgzf_block(data, self._compresslevel))
+            return
+
+        self._pending.append(self._pool.submit(compress_bgzf_block, data, self._compresslevel))
+        while len(self._pending) > self._max_pending:
+            self._emit(self._pending.popleft().result())
+
+    def _emit(self, block: bytes) -> None:
+        self._block_addresses.append(self._address)
+        self._address += len(block)
+        self._file.write(block)
+
+    def virtual_offset(self, offset: int) -> int:
+        '''
+        Virtual offset (compressed block address << 16 | offset in block) of the given offset in
+        the uncompressed data. Only valid for data that is already flushed.
+        '''
+        block = bisect_right(self._block_offsets, offset) - 1
+        if block < 0:
+            return 0
+
+        return (self._block_addresses[block] << 16) | (offset - self._block_offsets[block])
+
+    def block_offsets(self) -> list:
+        '''
+        (compressed, uncompressed) start offset of every block written so far - e.g. for a .gzi
+        index. Only valid for data that is already flushed.
+        '''
+        return list(zip(self._block_addresses, self._block_offsets))
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._write_block(bytes(self._buffer))
+            self._buffer.clear()
+
+        while self._pending:
+            self._emit(self._pending.popleft().result())
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+
+        self.flush()
+        self._file.write(BGZF_EOF)
+        self._file.close()
+
+        if self._pool is not None:
+            self._pool.shutdown()
+
+        if self._index is not None:
+            self._index.finish(self.virtual_offset)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from operator import itemgetter
+
+CSQ_FORMAT_PREFIX = "Format: "
+
+class CsqSchema():
+    '''
+    Parsed VEP CSQ header. Field indices are resolved once from the header and a CSQ entry is
+    only split up to the last column that is requested, so the (often very many) trailing
+    custom annotation columns are never split when nobody reads them.
+
+        schema = CsqSchema.from_vcf(vcf, ["Allele", "Consequence"])
+        for (allele, consequence) in schema.parse(variant.INFO["CSQ"]):
+            ...
+
+    Requested fields that are not in the header are returned as empty string.
+    '''
+
+    def __init__(self, csq_description: str, fields: list = None):
+        csq_description = csq_description.strip("\"")
+        if CSQ_FORMAT_PREFIX not in csq_description:
+            raise ValueError(f"Not a valid CSQ header description - {csq_description}")
+
+        self._csq_list = [csq.strip() for csq in csq_description.split(CSQ_FORMAT_PREFIX)[1].split("|")]
+        self._csq_idx = {}
+        for index, value in enumerate(self._csq_list):
+            # keep the first occurrence as header lookups always did
+            if value not in self._csq_idx:
+                self._csq_idx[value] = index
+
+        self.set_fields(fields)
+
+    def set_fields(self, fields: list = None) -> None:
+        'Change the fields that are projected, all fields of the header if None'
+        self._fields = list(fields) if fields is not None else list(self._csq_list)
+
+        # missing fields point to an empty value appended after splitting
+        indices = [self._csq_idx.get(field, -1) for field in self._fields]
+        present = [index for index in indices if index != -1]
+        self._maxsplit = (max(present) + 1) if present else 0
+        self._pad = len(present) != len(indices)
+
+        if len(indices) == 0:
+            # e.g. none of the fields a caller wants are in the header
+            self._getter = lambda values: ()
+        elif len(indices) == 1:
+            index = indices[0]
+            self._getter = lambda values: (values[index],)
+        else:
+            self._getter = itemgetter(*indices)
+
+    @classmethod
+    def from_vcf(cls, vcf, fields: list = None) -> "CsqSchema":
+        return cls(vcf.get_header_type("CSQ")["Description"], fields)
+
+    @property
+    def fields(self) -> list:
+        return self._fields
+
+    @property
+    def csq_list(self) -> list:
+        return self._csq_list
+
+    def has(self, field: str) -> bool:
+        return field in self._csq_idx
+
+    def index(self, field: str) -> int:
+        return self._csq_idx.get(field)
+
+    def split(self, csq: str) -> list:
+        values = csq.split("|", self._maxsplit)
+        if self._pad:
+            values.append("")
+
+        return values
+
+    def project(self, csq: str) -> tuple:
+        return self._getter(self.split(csq))
+
+    def parse(self, csqs: str) -> list:
+        split = self.split
+        getter = self._getter
+
+        return [getter(split(csq)) for csq in csqs.split(",")]
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import atexit
+import sqlite3
+import datetime
+import subprocess
+from decimal import Decimal
+from collections import namedtuple
+
+try:
+    import pymysql
+    import pymysql.cursors
+except ImportError:
+    pymysql = None
+
+# Database access for the pipeline scripts. Queries use %s placeholders and their parameters are
+# passed separately; rows are returned (or yielded by iter_query) as namedtuples with the column
+# names as fields.
+#
+# The server is the dict returned by helper.parse_ini. Connections are opened once per server and
+# process and reused for every query, switching database as needed. If PyMySQL is not installed
+# the mysql client is run per query instead; its values are converted using the column types it
+# reports, so integer, float, decimal, date and datetime columns have the same types as with
+# PyMySQL (other columns are str).
+#
+# A server dict with a "sqlite" key is a directory of <database>.sqlite files, used to run the
+# scripts against a small offline copy of the tables:
+#
+#     server = {"sqlite": "/path/to/dbs"}
+
+SQLITE_SUFFIX = ".sqlite"
+
+class DatabaseError(Exception):
+    pass
+
+# open connections of this process - {server key: connection}
+_connections = {}
+_connections_pid = None
+
+def _get_process_connections() -> dict:
+    global _connections_pid
+
+    # connections cannot be shared with forked child processes
+    if _connections_pid != os.getpid():
+        _connections.clear()
+        _connections_pid = os.getpid()
+
+    return _connections
+
+def _get_connection(server: dict, database: str = None):
+    connections = _get_process_connections()
+    key = (server["host"], str(server["port"]), server["user"])
+    if key not in connections:
+        connection = pymysql.connect(
+            host = server["host"],
+            port = int(server["port"]),
+            user = server["user"],
+            password = server.get("password") or "",
+            autocommit = True
+        )
+        connections[key] = connection
+
+    connection = connections[key]
+    # a reconnect opens the connection without a database, so it is selected for every query
+    connection.ping(reconnect = True)
+    if database is not None:
+        connection.select_db(database)
+
+    return connection
+
+def _get_sqlite_connection(server: dict, database: str):
+    db_file = os.path.join(server["sqlite"], database + SQLITE_SUFFIX)
+    if not os.path.isfile(db_file):
+        raise DatabaseError(f"Unknown database '{database}'")
+
+    connections = _get_process_connections()
+    key = ("sqlite", db_file)
+    if key not in connections:
+        connections[key] = sqlite3.connect(db_file)
+
+    return connections[key]
+
+def close_connections() -> None:
+    if _connections_pid != os.getpid():
+        return
+
+    for connection in _connections.values():
+        try:
+            connection.close()
+        except Exception:
+            pass
+    _connections.clear()
+
+atexit.register(close_connections)
+
+def _row_type(columns: list):
+    return namedtuple("Row", columns, rename = True)
+
+def _iter_sqlite(server: dict, sql: str, params: tuple, database: str):
+    try:
+        cursor = _get_sqlite_connection(server, database).execute(sql.replace("%s", "?"), params)
+        Row = _row_type([column[0] for column in cursor.description or []])
+        for value in cursor:
+            yield Row(*value)
+    except sqlite3.Error as e:
+        raise DatabaseError(str(e)) from e
+
+def _escape(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def _unescape(value: str) -> str:
+    if value == "NULL":
+        return None
+
+    return re.sub(r"\\(.)", lambda m: {"t": "\t", "n": "\n", "0": "\0", "\\": "\\"}.get(m.group(1), m.group(1)), value)
+
+# mysql client column types (--column-type-info) and the type of their values, as with PyMySQL
+CLIENT_TYPES = {
+    "TINY": int,
+    "SHORT": int,
+    "LONG": int,
+    "LONGLONG": int,
+    "INT24": int,
+    "YEAR": int,
+    "FLOAT": float,
+    "DOUBLE": float,
+    "DECIMAL": Decimal,
+    "NEWDECIMAL": Decimal,
+    "DATE": datetime.date.fromisoformat,
+    "NEWDATE": datetime.date.fromisoformat,
+    "DATETIME": datetime.datetime.fromisoformat,
+    "TIMESTAMP": datetime.datetime.fromisoformat
+}
+
+CLIENT_TYPE_INFO_LINES = 11
+
+def _convert(value: str, column_type: str):
+    if value is None or column_type not in CLIENT_TYPES:
+        return value
+
+    try:
+        return CLIENT_TYPES[column_type](value)
+    except ValueError:
+        # e.g. zero dates, kept as str like PyMySQL does
+        return value
+
+_client_warned = False
+
+def _warn_client() -> None:
+    global _client_warned
+
+    if not _client_warned:
+        print("[WARNING] PyMySQL is not installed, running mysql client for each query")
+        _client_warned = True
+
+def _iter_client(server: dict, sql: str, params: tuple, database: str):
+    if params:
+        sql = sql % tuple(_escape(param) for param in params)
+
+    command = ["mysql",
+        "--host", server["host"],
+        "--port", str(server["port"]),
+        "--user", server["user"],
+        "--batch",
+        "--quick",
+        "--column-type-info",
+        "--execute", sql
+    ]
+    if database is not None:
+        command += ["--database", database]
+
+    process = subprocess.Popen(command, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+    try:
+        # a block of CLIENT_TYPE_INFO_LINES lines (Field, ..., Type, ..., Flags) for each column,
+        # then the header and rows
+        column_types = []
+        block_lines = 0
+        Row = None
+        for line in process.stdout:
+            line = line.decode().rstrip("\n")
+            if not line:
+                continue
+            if block_lines:
+                block_lines -= 1
+                if line.startswith("Type:"):
+                    column_types[-1] = line.split()[1]
+                continue
+            if Row is None:
+                if re.match(r"Field +\d+: +`", line):
+                    column_types.append(None)
+                    block_lines = CLIENT_TYPE_INFO_LINES - 1
+                else:
+                    Row = _row_type(line.split("\t"))
+                continue
+            values = [_unescape(value) for value in line.split("\t")]
+            yield Row(*[_convert(value, column_type) for (value, column_type) in zip(values, column_types)])
+
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise DatabaseError(stderr.decode().strip())
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+def _iter_pymysql(server: dict, sql: str, params: tuple, database: str):
+    try:
+        # unbuffered cursor - rows are read from the server as they are used
+        with _get_connection(server, database).cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(sql, params)
+            Row = _row_type([column[0] for column in cursor.description or []])
+            for value in cursor:
+                yield Row(*value)
+    except pymysql.MySQLError as e:
+        raise DatabaseError(str(e)) from e
+
+def iter_query(server: dict, sql: str, params: tuple = (), database: str = None):
+    '''
+    Run a query and yield its rows as they are read, without keeping them all in memory. Raises
+    DatabaseError if the query fails. The rows must be read to the end before the next query.
+
+        for row in iter_query(server, "SELECT synonym, seq_region_id FROM seq_region_synonym", (), core_db):
+            print(row.synonym)
+    '''
+
+    params = tuple(params)
+    if "sqlite" in server:
+        return _iter_sqlite(server, sql, params, database)
+
+    if pymysql is None:
+        _warn_client()
+        return _iter_client(server, sql, params, database)
+
+    return _iter_pymysql(server, sql, params, database)
+
+def query(server: dict, sql: str, params: tuple = (), database: str = None) -> list:
+    '''
+    Run a query and return all rows, raises DatabaseError if the query fails.
+
+        rows = query(server, "SELECT name, length FROM seq_region WHERE coord_system_id = %s", (1, ), core_db)
+        for row in rows:
+            print(row.name, row.length)
+    '''
+
+    return list(iter_query(server, sql, params, database))
+
+def query_column(server: dict, sql: str, params: tuple = (), database: str = None) -> list:
+    'Run a query and return the first column of all rows'
+
+    return [row[0] for row in query(server, sql, params, database)]
+
+def query_value(server: dict, sql: str, params: tuple = (), database: str = None):
+    'Run a query and return the first column of the first row, None if there is no row'
+
+    rows = query(server, sql, params, database)
+    return rows[0][0] if rows else None
+
+def like_to_regex(pattern: str) -> str:
+    regex = ""
+    for char in pattern:
+        if char == "%":
+            regex += ".*"
+        elif char == "_":
+            regex += "."
+        else:
+            regex += re.escape(char)
+
+    return regex
+
+def list_databases(server: dict, pattern: str = "%") -> list:
+    'Get database names matching a SQL LIKE pattern'
+
+    if "sqlite" in server:
+        regex = re.compile(like_to_regex(pattern), re.IGNORECASE)
+        databases = [
+            file[:-len(SQLITE_SUFFIX)] for file in os.listdir(server["sqlite"]) if file.endswith(SQLITE_SUFFIX)
+        ]
+        return sorted(database for database in databases if regex.fullmatch(database))
+
+    return query_column(server, "SHOW DATABASES LIKE %s", (pattern, ))
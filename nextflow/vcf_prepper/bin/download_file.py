@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+
+from helper import DOWNLOAD_CONNECTIONS, download_file, set_artifact_store
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="url", type=str, help="URL of the file to download")
+    parser.add_argument('-O', '--output_file', dest="output_file", type=str, help="output file, default is the file name in the URL in current directory")
+    parser.add_argument('--connections', dest="connections", type=int, default=DOWNLOAD_CONNECTIONS, help=f"number of parallel connections (default: {DOWNLOAD_CONNECTIONS})")
+    parser.add_argument('--verify_checksum', dest="verify_checksum", action="store_true", help="verify the file with the CHECKSUMS file in the URL directory, if there is one")
+    parser.add_argument('--artifact_store_dir', dest="artifact_store_dir", type=str, required = False, help="directory to store copied and downloaded files in, shared with other genomes and runs")
+    parser.add_argument('--artifact_store_max_size', dest="artifact_store_max_size", type=float, required = False, help="GB of files not in use to keep in the artifact store")
+
+    return parser.parse_args(args)
+
+def main(args = None):
+    description = '''
+    Download a file using parallel range requests. An interrupted download is resumed from the <output_file>.part file on the next run.
+    '''
+    args = parse_args(args, description)
+
+    set_artifact_store(args.artifact_store_dir, args.artifact_store_max_size)
+
+    url = args.url
+    output_file = args.output_file or os.path.basename(url)
+
+    returncode = download_file(output_file, url, args.connections, args.verify_checksum)
+    if returncode != 0:
+        print(f"[ERROR] Could not download file - {url}")
+        exit(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+import re
+import json
+import shutil
+import tarfile
+import zlib
+import threading
+import subprocess
+import http.client
+import urllib.request
+import urllib.error
+
+from helper import BsdSum, get_remote_checksum, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_RETRIES, DOWNLOAD_TIMEOUT
+
+# Extraction of a VEP cache archive (<species>_vep_<version>_<assembly>.tar.gz) into
+# <cache_dir>/<species>/<version>_<assembly>, streamed from the local FTP directory or from the
+# remote FTP without writing the archive. Every extracted file is added to a manifest in the
+# genome cache directory:
+#
+#     .extract_manifest.tsv     <member name> <size>, one line per file written
+#     .extract_complete.json    written once all files of the archive are in the manifest
+#
+# A file of the manifest that is on disk with its size is not written again, so an interrupted
+# extraction resumes (the archive is read again but only the missing files are written). The
+# manifest is created before anything is read, so a directory with a manifest and no complete
+# file is an extraction that did not finish.
+
+MANIFEST_FILE = ".extract_manifest.tsv"
+COMPLETE_FILE = ".extract_complete.json"
+# file every VEP cache has in the genome cache directory
+CACHE_INFO_FILE = "info.txt"
+
+CACHE_FILE_PATTERN = re.compile(r"^(?P<species>.+)_vep_(?P<version>\d+)_(?P<assembly>[^_]+)\.tar\.gz$")
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="source", type=str, help="VEP cache archive - local file or URL")
+    parser.add_argument('-C', '--cache_dir', dest="cache_dir", type=str, required = True, help="VEP cache directory to extract the archive in")
+    parser.add_argument('--genome_cache_dir', dest="genome_cache_dir", type=str, required = False, help="directory of the genome cache, default is <cache_dir>/<species>/<version>_<assembly> from the archive name")
+    parser.add_argument('--include', dest="include", type=str, required = False, help="comma separated chromosomes or sub-directories of the genome cache to extract, default is all")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used by pigz to decompress the archive")
+    parser.add_argument('--verify_checksum', dest="verify_checksum", action="store_true", help="verify a URL against the CHECKSUMS file of its directory")
+    parser.add_argument('--force', dest="force", action="store_true", help="extract all files again")
+
+    return parser.parse_args(args)
+
+class SourceReader():
+    '''
+    Read a local file or a URL in order, checksumming the data if checksum is given. If the
+    connection to a URL fails it is requested again from the current offset.
+    '''
+
+    def __init__(self, source: str, checksum: tuple = None):
+        self.source = source
+        self.checksum = checksum
+        self.is_url = "://" in source
+        self._offset = 0
+        self._stream = None
+        self._sum = BsdSum() if checksum is not None else None
+
+    def _open(self) -> None:
+        if not self.is_url:
+            self._stream = open(self.source, "rb")
+            return
+
+        request = urllib.request.Request(self.source)
+        if self._offset:
+            request.add_header("Range", f"bytes={self._offset}-")
+        self._stream = urllib.request.urlopen(request, timeout = DOWNLOAD_TIMEOUT)
+        if self._offset and self._stream.status != 206:
+            raise OSError(f"{self.source} does not support range requests, cannot resume reading it")
+
+    def read(self, size: int = DOWNLOAD_CHUNK_SIZE) -> bytes:
+        retries = DOWNLOAD_RETRIES
+        while True:
+            try:
+                if self._stream is None:
+                    self._open()
+                data = self._stream.read(size)
+                # a response cut short ends without an error
+                if not data and self.is_url and self._stream.length:
+                    raise http.client.IncompleteRead(b"", self._stream.length)
+                break
+            except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                if not self.is_url or retries == 0:
+                    raise
+                print(f"[WARNING] Reading {self.source} failed at byte {self._offset}, retrying - {e}")
+                retries -= 1
+                self.close_stream()
+
+        self._offset += len(data)
+        if self._sum is not None:
+            self._sum.update(data)
+
+        return data
+
+    def verify(self) -> bool:
+        'Check the checksum of the data read, True if there is no checksum'
+        if self._sum is None:
+            return True
+
+        checksum = self._sum.result()
+        if checksum != tuple(self.checksum):
+            print(f"[ERROR] Checksum of {self.source} is {checksum}, expected {tuple(self.checksum)}")
+            return False
+
+        return True
+
+    def close_stream(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def close(self) -> None:
+        self.close_stream()
+        if self._sum is not None:
+            self._sum.close()
+
+class Pump():
+    '''
+    Copy everything from reader to output in a thread, so that the source is read (and
+    checksummed) while the previous data is extracted. With decompress the gzip data is
+    decompressed on the way, and must end with a complete gzip member. Closes output at the end.
+    '''
+
+    def __init__(self, reader: SourceReader, output, decompress: bool = False):
+        self.reader = reader
+        self.output = output
+        self.decompress = decompress
+        self.error = None
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def _copy(self) -> None:
+        while True:
+            data = self.reader.read()
+            if not data:
+                break
+            self.output.write(data)
+
+    def _decompress(self) -> None:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        in_member = False
+        while True:
+            data = self.reader.read()
+            if not data:
+                break
+            # a gzip file can have several members
+            while data:
+                self.output.write(decompressor.decompress(data))
+                in_member = not decompressor.eof
+                data = decompressor.unused_data
+                if decompressor.eof:
+                    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+        if in_member:
+            raise EOFError(f"{self.reader.source} ended before the end of its compressed data")
+
+    def _run(self) -> None:
+        try:
+            if self.decompress:
+                self._decompress()
+            else:
+                self._copy()
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self.output.close()
+            except OSError:
+                pass
+
+    def join(self) -> None:
+        self._thread.join()
+
+def get_genome_cache_dir(cache_dir: str, source: str) -> str:
+    match = CACHE_FILE_PATTERN.match(source.rstrip("/").rsplit("/", 1)[-1])
+    if match is None:
+        return None
+
+    return os.path.join(cache_dir, match.group("species"), f"{match.group('version')}_{match.group('assembly')}")
+
+def read_manifest(genome_cache_dir: str) -> dict:
+    'Get {member name: size} of the files already extracted'
+    manifest = {}
+    try:
+        with open(os.path.join(genome_cache_dir, MANIFEST_FILE), "r") as file:
+            for line in file:
+                fields = line.rstrip("\n").split("\t")
+                # last line can be partly written if the extraction was killed
+                if len(fields) == 2 and fields[1].isdigit():
+                    manifest[fields[0]] = int(fields[1])
+    except FileNotFoundError:
+        pass
+
+    return manifest
+
+def read_complete(genome_cache_dir: str) -> dict:
+    try:
+        with open(os.path.join(genome_cache_dir, COMPLETE_FILE), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def covers(extracted: list, include: list) -> bool:
+    'True if the extracted selection (None for all) contains every directory of include'
+    if extracted is None:
+        return True
+    if include is None:
+        return False
+
+    return all(is_included(directory, extracted) for directory in include)
+
+def is_extracted(genome_cache_dir: str, include: list = None) -> bool:
+    '''
+    True if the genome cache has been extracted with the include directories. A directory
+    without manifest that has the cache info.txt was extracted by tar before the manifest existed
+    and is taken as complete.
+    '''
+    if not os.path.isdir(genome_cache_dir):
+        return False
+
+    complete = read_complete(genome_cache_dir)
+    if complete is not None:
+        return covers(complete["include"], include)
+
+    return not os.path.exists(os.path.join(genome_cache_dir, MANIFEST_FILE)) and \
+        os.path.isfile(os.path.join(genome_cache_dir, CACHE_INFO_FILE))
+
+def is_included(path: str, include: list) -> bool:
+    if include is None:
+        return True
+
+    return any(path == directory or path.startswith(directory + "/") for directory in include)
+
+def is_selected(name: str, include: list) -> bool:
+    '''
+    True if the archive member is to be extracted. Names are <species>/<version>_<assembly>/<path>;
+    files directly in the genome cache directory (info.txt, chr_synonyms.txt) are always extracted.
+    '''
+    parts = name.split("/")
+    if len(parts) <= 3:
+        return True
+
+    return is_included("/".join(parts[2:]), include)
+
+def is_safe(name: str) -> bool:
+    return not os.path.isabs(name) and ".." not in name.split("/")
+
+def extract_member(tar: tarfile.TarFile, member: tarfile.TarInfo, dest_file: str) -> None:
+    'Write a file of the archive to a temporary file and rename it, so no partial file has its name'
+    os.makedirs(os.path.dirname(dest_file), exist_ok = True)
+
+    temp_file = dest_file + ".part"
+    with tar.extractfile(member) as i_file, open(temp_file, "wb") as o_file:
+        shutil.copyfileobj(i_file, o_file, DOWNLOAD_CHUNK_SIZE)
+    os.chmod(temp_file, member.mode & 0o777 | 0o600)
+    os.utime(temp_file, (member.mtime, member.mtime))
+    os.replace(temp_file, dest_file)
+
+def open_archive_stream(reader: SourceReader, threads: int) -> tuple:
+    '''
+    Start decompressing the tar.gz stream of reader, returns (tar stream, pump, process). The gzip
+    data is decompressed by pigz if it is installed, else by the pump thread.
+    '''
+    pigz = shutil.which("pigz")
+    if pigz is not None:
+        process = subprocess.Popen([pigz, "-dc", "-p", str(threads)], stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+        pump = Pump(reader, process.stdin)
+        return (process.stdout, pump, process)
+
+    (read_fd, write_fd) = os.pipe()
+    pump = Pump(reader, os.fdopen(write_fd, "wb"), decompress = True)
+    return (os.fdopen(read_fd, "rb"), pump, None)
+
+def extract_archive(reader: SourceReader, cache_dir: str, genome_cache_dir: str, include: list, threads: int) -> dict:
+    '''
+    Extract the selected files of the archive that are not already in the manifest, returns
+    {member name: size} of all the selected files of the archive.
+    '''
+    manifest = read_manifest(genome_cache_dir)
+    selected = {}
+    (written, skipped) = (0, 0)
+
+    (stream, pump, process) = open_archive_stream(reader, threads)
+    tar = None
+    try:
+        # fails on an empty stream if the source could not be read (e.g. 404), see below
+        tar = tarfile.open(fileobj = stream, mode = "r|")
+        with open(os.path.join(genome_cache_dir, MANIFEST_FILE), "a+") as manifest_file:
+            # end a line left partly written by a killed extraction
+            if manifest_file.tell() > 0:
+                manifest_file.seek(manifest_file.tell() - 1)
+                if manifest_file.read(1) != "\n":
+                    manifest_file.write("\n")
+            for member in tar:
+                if not member.isfile() or not is_selected(member.name, include):
+                    continue
+                if not is_safe(member.name):
+                    print(f"[WARNING] Skipping {member.name}, it is outside of the cache directory")
+                    continue
+
+                selected[member.name] = member.size
+                dest_file = os.path.join(cache_dir, member.name)
+                if manifest.get(member.name) == member.size and \
+                    os.path.isfile(dest_file) and os.path.getsize(dest_file) == member.size:
+                    skipped += 1
+                    continue
+
+                extract_member(tar, member, dest_file)
+                manifest_file.write(f"{member.name}\t{member.size}\n")
+                manifest_file.flush()
+                written += 1
+
+        # tar stops at the end-of-archive blocks, read the padding after them so all the source is checksummed
+        while stream.read(DOWNLOAD_CHUNK_SIZE):
+            pass
+    except (OSError, EOFError, tarfile.TarError, zlib.error) as e:
+        # a failed read ends the stream early, report why it failed
+        if pump.error is not None and not isinstance(pump.error, BrokenPipeError):
+            raise pump.error from e
+        raise
+    finally:
+        if tar is not None:
+            tar.close()
+        stream.close()
+        if process is not None:
+            process.wait()
+        pump.join()
+
+    if pump.error is not None:
+        raise pump.error
+    if process is not None and process.returncode != 0:
+        raise OSError(f"pigz exited with code {process.returncode}")
+
+    print(f"[INFO] Extracted {written} files, {skipped} already extracted")
+
+    return selected
+
+def verify_manifest(cache_dir: str, genome_cache_dir: str, selected: dict) -> bool:
+    'Check that every selected file of the archive is in the manifest and on disk with its size'
+    manifest = read_manifest(genome_cache_dir)
+    for (name, size) in selected.items():
+        dest_file = os.path.join(cache_dir, name)
+        if manifest.get(name) != size or not os.path.isfile(dest_file) or os.path.getsize(dest_file) != size:
+            print(f"[ERROR] {dest_file} is missing or does not have the size in the archive ({size})")
+            return False
+
+    return True
+
+def remove_stale_files(cache_dir: str, genome_cache_dir: str) -> None:
+    'Remove files not in the manifest - from an older cache or interrupted extraction'
+    manifest = read_manifest(genome_cache_dir)
+    for (dir, _, files) in os.walk(genome_cache_dir):
+        for file in files:
+            path = os.path.join(dir, file)
+            name = os.path.relpath(path, cache_dir)
+            if name not in manifest and path not in (
+                os.path.join(genome_cache_dir, MANIFEST_FILE),
+                os.path.join(genome_cache_dir, COMPLETE_FILE)
+            ):
+                os.remove(path)
+
+def extract_cache(
+        source: str,
+        cache_dir: str,
+        genome_cache_dir: str,
+        include: list = None,
+        threads: int = 1,
+        verify_checksum: bool = False,
+        force: bool = False
+    ) -> bool:
+    '''
+    Extract the VEP cache archive source (local file or URL) into cache_dir, only the include
+    chromosomes or sub-directories of the genome cache if given. The genome cache directory is
+    marked complete once all selected files are verified against the manifest. Returns True on
+    success; on failure the files extracted so far are kept to be resumed.
+    '''
+    os.makedirs(genome_cache_dir, exist_ok = True)
+
+    complete = read_complete(genome_cache_dir)
+    if force:
+        for file in (MANIFEST_FILE, COMPLETE_FILE):
+            if os.path.isfile(os.path.join(genome_cache_dir, file)):
+                os.remove(os.path.join(genome_cache_dir, file))
+    elif complete is not None:
+        # files of the previous selection are kept with the new one
+        if complete["include"] is not None and include is not None:
+            include = sorted(set(complete["include"] + include))
+        os.remove(os.path.join(genome_cache_dir, COMPLETE_FILE))
+
+    # the directory is not complete until the end, even if the source cannot be read
+    open(os.path.join(genome_cache_dir, MANIFEST_FILE), "a").close()
+
+    checksum = None
+    if verify_checksum and "://" in source:
+        checksum = get_remote_checksum(source)
+        if checksum is None:
+            print(f"[WARNING] No checksum found for {source}, it will not be verified")
+
+    reader = SourceReader(source, checksum)
+    try:
+        selected = extract_archive(reader, cache_dir, genome_cache_dir, include, threads)
+        if not reader.verify():
+            return False
+    finally:
+        reader.close()
+
+    if not verify_manifest(cache_dir, genome_cache_dir, selected):
+        return False
+
+    # after --force this removes the files of the replaced cache
+    remove_stale_files(cache_dir, genome_cache_dir)
+
+    temp_file = os.path.join(genome_cache_dir, COMPLETE_FILE + ".tmp")
+    with open(temp_file, "w") as file:
+        json.dump({"source": source, "include": include, "files": len(selected), "size": sum(selected.values())}, file)
+    os.replace(temp_file, os.path.join(genome_cache_dir, COMPLETE_FILE))
+
+    return True
+
+def main(args = None):
+    description = '''
+    Extract a VEP cache archive, streamed from a local file or URL without writing the archive.
+    Only the --include chromosomes or sub-directories are extracted if given. The extracted files are kept in a manifest
+    in the genome cache directory, so an interrupted extraction is resumed by running it again.
+    '''
+    args = parse_args(args, description)
+
+    genome_cache_dir = args.genome_cache_dir or get_genome_cache_dir(args.cache_dir, args.source)
+    if genome_cache_dir is None:
+        print(f"[ERROR] Cannot get genome cache directory from archive name - {args.source}, use --genome_cache_dir")
+        exit(1)
+
+    include = args.include.split(",") if args.include else None
+    if not args.force and is_extracted(genome_cache_dir, include):
+        print(f"[INFO] {genome_cache_dir} is already extracted. Skipping ...")
+        return 0
+
+    try:
+        success = extract_cache(args.source, args.cache_dir, genome_cache_dir, include, args.threads, args.verify_checksum, args.force)
+    except (OSError, EOFError, tarfile.TarError, zlib.error, http.client.HTTPException) as e:
+        print(f"[ERROR] Could not extract cache file - {args.source}\n{e}")
+        exit(1)
+
+    if not success:
+        print(f"[ERROR] Could not extract cache file - {args.source}")
+        exit(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,10 +17,10 @@
 import sys
 import configparser
 import argparse
-import subprocess
 import os
 
-from helper import parse_ini, get_db_name
+from helper import parse_ini, get_db_name, set_metadata_cache
+from db import query, query_column
 
 def parse_args(args = None):
     parser = argparse.ArgumentParser()
@@ -29,6 +29,7 @@ def parse_args(args = None):
     parser.add_argument(dest="assembly", type=str, help="assembly default")
     parser.add_argument(dest="version", type=int, help="Ensembl release version")
     parser.add_argument('-I', '--ini_file', dest="ini_file", type=str, required = False, help="full path database configuration file, default - DEFAULT.ini in the same directory.")
+    parser.add_argument('--metadata_cache_dir', dest="metadata_cache_dir", type=str, required = False, help="directory to cache database name and division lookups in, shared with other tasks of the run")
     parser.add_argument('--chrom_sizes', dest="chrom_sizes", type=str, required = False, help="file with chromomsome sizes, default - <species>_<assembly>.chrom.sizes in the same directory.")
     parser.add_argument('--force', dest="force", action="store_true", help="forcefully create config even if already exists")
     
@@ -39,61 +40,22 @@ def generate_chrom_sizes(server: dict, core_db: str, chrom_sizes: str, assembly:
         print(f"[INFO] {chrom_sizes} file already exists, skipping ...")
         return
         
-    query = f"SELECT coord_system_id FROM coord_system WHERE version = '{assembly}';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", core_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    coord_ids = "(" + ",".join(
-            [id for id in process.stdout.decode().strip().split("\n")]
-        ) + ")"
+    sql = "SELECT coord_system_id FROM coord_system WHERE version = %s;"
+    coord_ids = query_column(server, sql, (assembly, ), core_db)
     
-    query = f"SELECT name, length FROM seq_region WHERE coord_system_id IN {coord_ids};"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", core_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
-    with open(chrom_sizes, "w") as file: 
-        file.write(process.stdout.decode())
+    rows = []
+    if coord_ids:
+        coord_ids_placeholder = ",".join(["%s"] * len(coord_ids))
         
-    query = f"SELECT ss.synonym, s.length FROM seq_region AS s, seq_region_synonym AS ss WHERE s.seq_region_id = ss.seq_region_id AND s.coord_system_id IN {coord_ids};"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", core_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
-    with open(chrom_sizes, "a") as file: 
-        file.write(process.stdout.decode().strip())
-    
-    # remove duplicates    
-    with open(chrom_sizes, "r") as file: 
-        lines = file.readlines()
+        sql = f"SELECT name, length FROM seq_region WHERE coord_system_id IN ({coord_ids_placeholder});"
+        rows += query(server, sql, coord_ids, core_db)
         
+        sql = f"SELECT ss.synonym, s.length FROM seq_region AS s, seq_region_synonym AS ss WHERE s.seq_region_id = ss.seq_region_id AND s.coord_system_id IN ({coord_ids_placeholder});"
+        rows += query(server, sql, coord_ids, core_db)
+    
+    # remove duplicates
     lengths = {}
-    for line in lines:
-        name, length = [col.strip() for col in line.split("\t")]  
+    for (name, length) in rows:
         if name not in lengths or int(lengths[name]) < int(length): 
             lengths[name] = length
             
@@ -105,6 +67,7 @@ def generate_chrom_sizes(server: dict, core_db: str, chrom_sizes: str, assembly:
 
 def main(args = None):
     args = parse_args(args)
+    set_metadata_cache(args.metadata_cache_dir)
     
     species = args.species
     assembly = args.assembly
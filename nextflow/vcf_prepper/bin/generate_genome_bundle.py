@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+import fcntl
+import shutil
+
+from helper import parse_ini, get_db_name, set_metadata_cache
+from db import iter_query
+from generate_synonym_file import resolve_synonyms
+from genome_lookup import write_genome_lookup
+
+# The chrom sizes, synonyms and genome lookup files of a genome are built from one query of the
+# core db into a bundle shared by runs:
+#
+#     <bundle_dir>/<core db>.<assembly>.chrom.sizes   as generate_chrom_sizes.py
+#     <bundle_dir>/<core db>.<assembly>.synonyms      as generate_synonym_file.py
+#     <bundle_dir>/<core db>.<assembly>.gcb           binary lookup of both, see genome_lookup.py
+#
+# and linked (or copied) to the files of the genome.
+BUNDLE_FILES = ("chrom.sizes", "synonyms", "gcb")
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="species", type=str, help="species production name")
+    parser.add_argument(dest="assembly", type=str, help="assembly default")
+    parser.add_argument(dest="version", type=int, help="Ensembl release version")
+    parser.add_argument('-I', '--ini_file', dest="ini_file", type=str, required = False, help="full path database configuration file, default - DEFAULT.ini in the same directory.")
+    parser.add_argument('--metadata_cache_dir', dest="metadata_cache_dir", type=str, required = False, help="directory to cache database name and division lookups in, shared with other tasks of the run")
+    parser.add_argument('--bundle_dir', dest="bundle_dir", type=str, required = False, help="directory to keep the bundles of genomes in, shared by runs, default - the current directory.")
+    parser.add_argument('--chrom_sizes', dest="chrom_sizes", type=str, required = False, help="file with chromomsome sizes, not created if not given")
+    parser.add_argument('--synonym_file', dest="synonym_file", type=str, required = False, help="file with chromomsome synonyms, not created if not given")
+    parser.add_argument('--genome_lookup', dest="genome_lookup", type=str, required = False, help="binary lookup of chromosome sizes and synonyms, default - <species>_<assembly>.gcb in the same directory.")
+    parser.add_argument('--force', dest="force", action="store_true", help="forcefully create the bundle and files even if they already exist")
+
+    return parser.parse_args(args)
+
+def get_bundle_rows(server: dict, core_db: str):
+    'Yield (name, length, coord system version, synonym) of all seq regions, a row for each synonym'
+    sql = '''
+        SELECT sr.name, sr.length, cs.version, ss.synonym
+        FROM seq_region AS sr
+        JOIN coord_system AS cs ON sr.coord_system_id = cs.coord_system_id
+        LEFT JOIN seq_region_synonym AS ss ON sr.seq_region_id = ss.seq_region_id;
+    '''
+    yield from iter_query(server, sql, (), core_db)
+
+def generate_genome_bundle(server: dict, core_db: str, bundle_prefix: str, assembly: str = "grch38") -> None:
+    '''
+    Write the files of the bundle at bundle_prefix. Chrom sizes are the names and synonyms of the
+    seq regions in the coord systems of the assembly (versions compare case-insensitively like in
+    the core db), with the longest length of a name; synonyms are of all seq regions.
+    '''
+    lengths = {}
+    synonym_lengths = {}
+    synonym_rows = []
+    for (name, length, version, synonym) in get_bundle_rows(server, core_db):
+        in_assembly = version is not None and version.lower() == assembly.lower()
+        if in_assembly and (name not in lengths or int(lengths[name]) < int(length)):
+            lengths[name] = length
+
+        if synonym is None:
+            continue
+        synonym_rows.append((synonym, name))
+        if in_assembly and (synonym not in synonym_lengths or int(synonym_lengths[synonym]) < int(length)):
+            synonym_lengths[synonym] = length
+
+    # names first, then synonyms, as generate_chrom_sizes.py
+    for (synonym, length) in synonym_lengths.items():
+        if synonym not in lengths or int(lengths[synonym]) < int(length):
+            lengths[synonym] = length
+
+    # we will keep length + 1 because bedToBigBed fails if it finds variant at boundary
+    chrom_sizes = {name: int(length) + 1 for (name, length) in lengths.items()}
+    synonyms = dict(resolve_synonyms(synonym_rows))
+
+    # written to temporary files first so that a failed run does not leave a partial bundle
+    temp_file = f"{bundle_prefix}.chrom.sizes.tmp"
+    with open(temp_file, "w") as file:
+        for (name, length) in chrom_sizes.items():
+            file.write(f"{name}\t{length}\n")
+    os.replace(temp_file, f"{bundle_prefix}.chrom.sizes")
+
+    temp_file = f"{bundle_prefix}.synonyms.tmp"
+    with open(temp_file, "w") as file:
+        for (synonym, name) in synonyms.items():
+            file.write(f"{synonym}\t{name}\n")
+    os.replace(temp_file, f"{bundle_prefix}.synonyms")
+
+    # the lookup is written last, the bundle is complete if it exists
+    write_genome_lookup(f"{bundle_prefix}.gcb", chrom_sizes, synonyms)
+
+def get_genome_bundle(server: dict, core_db: str, bundle_dir: str, assembly: str = "grch38", force: bool = False) -> str:
+    'Prefix of the bundle files of the genome in bundle_dir, generated if it does not exist'
+    os.makedirs(bundle_dir, exist_ok = True)
+    bundle_prefix = os.path.join(bundle_dir, f"{core_db}.{assembly}")
+
+    # tasks of the sources of a genome run at the same time, only one generates the bundle
+    with open(bundle_prefix + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if force or not all(os.path.isfile(f"{bundle_prefix}.{ext}") for ext in BUNDLE_FILES):
+            print(f"[INFO] Generating genome bundle {bundle_prefix} from {core_db}")
+            generate_genome_bundle(server, core_db, bundle_prefix, assembly)
+        else:
+            print(f"[INFO] Using genome bundle {bundle_prefix}")
+
+    return bundle_prefix
+
+def install_file(src: str, dest: str, force: bool = False) -> None:
+    'Link src to dest, or copy it if it is on another file system'
+    if os.path.exists(dest) and not force:
+        print(f"[INFO] {dest} file already exists, skipping ...")
+        return
+
+    temp_file = dest + ".tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    try:
+        os.link(src, temp_file)
+    except OSError:
+        shutil.copyfile(src, temp_file)
+    os.replace(temp_file, dest)
+
+def main(args = None):
+    description = '''
+    Generate the chromosome sizes, synonyms and binary genome lookup files of a genome with a single query of the core db.
+    The files are kept in --bundle_dir, keyed by core db and assembly, so later runs use them without querying.
+    '''
+    args = parse_args(args, description)
+    set_metadata_cache(args.metadata_cache_dir)
+
+    species = args.species
+    assembly = args.assembly
+    genome_lookup = args.genome_lookup or f"{species}_{assembly}.gcb"
+    ini_file = args.ini_file or "DEFAULT.ini"
+    core_server = parse_ini(ini_file, "core")
+    core_db = get_db_name(core_server, args.version, species, type = "core")
+
+    bundle_prefix = get_genome_bundle(core_server, core_db, args.bundle_dir or ".", assembly, args.force)
+
+    install_file(f"{bundle_prefix}.gcb", genome_lookup, args.force)
+    if args.chrom_sizes:
+        install_file(f"{bundle_prefix}.chrom.sizes", args.chrom_sizes, args.force)
+    if args.synonym_file:
+        install_file(f"{bundle_prefix}.synonyms", args.synonym_file, args.force)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,10 +17,13 @@
 import sys
 import configparser
 import argparse
-import subprocess
 import os
 
-from helper import parse_ini, get_db_name
+from helper import parse_ini, get_db_name, set_metadata_cache
+from db import iter_query
+
+# longer seq region names are replaced by a synonym in the synonym file
+MAX_NAME_LENGTH = 31
 
 def parse_args(args = None):
     parser = argparse.ArgumentParser()
@@ -29,71 +32,61 @@ def parse_args(args = None):
     parser.add_argument(dest="assembly", type=str, help="assembly default")
     parser.add_argument(dest="version", type=int, help="Ensembl release version")
     parser.add_argument('-I', '--ini_file', dest="ini_file", type=str, required = False, help="full path database configuration file, default - DEFAULT.ini in the same directory.")
+    parser.add_argument('--metadata_cache_dir', dest="metadata_cache_dir", type=str, required = False, help="directory to cache database name and division lookups in, shared with other tasks of the run")
     parser.add_argument('--synonym_file', dest="synonym_file", type=str, required = False, help="file with chromomsome synonyms, default - <species>_<assembly>.synonyms in the same directory.")
     parser.add_argument('--force', dest="force", action="store_true", help="forcefully create config even if already exists")
     
     return parser.parse_args(args)
 
+def resolve_synonyms(rows):
+    '''
+    Yield (synonym, name) pairs of the synonym file from the (synonym, name) rows of the core db, in
+    the order the synonyms are first seen. Each synonym gets the shortest of its names; a name
+    that is too long is replaced by a short synonym if there is one. Uses a reverse index from name
+    to short synonym, so it is linear in the number of rows.
+    '''
+    # remove duplicates and change seq region name that are longer than 31 character
+    names = {}
+    for (synonym, name) in rows:
+        if synonym not in names or len(names[synonym]) > len(name):
+            names[synonym] = name
+
+    # the last short synonym of each name
+    short_synonyms = {}
+    for (synonym, name) in names.items():
+        if len(synonym) < MAX_NAME_LENGTH:
+            short_synonyms[name] = synonym
+
+    for (synonym, name) in names.items():
+        if len(name) <= MAX_NAME_LENGTH:
+            yield (synonym, name)
+        # if the current synonym is less than 31 character we do not need to have it in the file
+        elif len(synonym) > MAX_NAME_LENGTH:
+            # if the current synonym is longer than 31 character we look for other synonym of the name
+            change_name = short_synonyms.get(synonym, synonym)
+            if len(change_name) > MAX_NAME_LENGTH:
+                print(f"[WARNING] cannot resolve {name} to a synonym which is under 31 character")
+
+            yield (synonym, change_name)
+
 def generate_synonym_file(server: dict, core_db: str, synonym_file: str, force: bool = False) -> None:
     if os.path.exists(synonym_file) and not force:
         print(f"[INFO] {synonym_file} file already exists, skipping ...")
         return
         
-    query = f"SELECT ss.synonym, sr.name FROM seq_region AS sr, seq_region_synonym AS ss WHERE sr.seq_region_id = ss.seq_region_id;"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", core_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
-    with open(synonym_file, "w") as file: 
-        file.write(process.stdout.decode().strip())
-    
-    # remove duplicates and change seq region name that are longer than 31 character    
-    with open(synonym_file, "r") as file: 
-        lines = file.readlines()
-        
-    names = {}
-    for line in lines:
-        synonym, name = [col.strip() for col in line.split("\t")]  
-        if synonym not in names or len(names[synonym]) > len(name): 
-            names[synonym] = name
-    
-    # if name is longer than 31 character we try to take a synonym
-    new_names = {}
-    for synonym in names:
-        name = names[synonym]
-        if len(name) > 31:
-            # if the current synonym is less than 31 character we do not need to have it in the file
-            if len(synonym) <= 31:
-                pass
-            # if the current synonym is longer than 31 character we look for other synonym of the name
-            else:
-                change_name = synonym
-                for alt_synonym in names:
-                    if names[alt_synonym] == synonym and len(alt_synonym) < 31:
-                        change_name = alt_synonym
-                        
-                if len(change_name) > 31:
-                    print(f"[WARNING] cannot resolve {name} to a synonym which is under 31 character")
-                            
-                new_names[synonym] = change_name        
-        else:
-            new_names[synonym] = name
-    
+    sql = "SELECT ss.synonym, sr.name FROM seq_region AS sr, seq_region_synonym AS ss WHERE sr.seq_region_id = ss.seq_region_id;"
+    rows = iter_query(server, sql, (), core_db)
     
-    with open(synonym_file, "w") as file:
-        for synonym in new_names:
-            file.write(f"{synonym}\t{new_names[synonym]}\n")
+    # written to a temporary file first so that a failed run does not leave a partial file to be skipped
+    temp_file = synonym_file + ".tmp"
+    with open(temp_file, "w") as file:
+        for (synonym, name) in resolve_synonyms(rows):
+            file.write(f"{synonym}\t{name}\n")
+    os.replace(temp_file, synonym_file)
     
 def main(args = None):
     args = parse_args(args)
+    set_metadata_cache(args.metadata_cache_dir)
     
     species = args.species
     assembly = args.assembly
@@ -22,6 +22,8 @@ import os
 import json
 import re
 import glob
+import hashlib
+import tempfile
 
 from helper import (
         parse_ini,
@@ -29,6 +31,7 @@ from helper import (
         get_division,
         get_fasta_species_name,
         get_relative_version,
+        set_metadata_cache,
         Placeholders
     )
 
@@ -71,6 +74,18 @@ PLUGINS = [
     "ClinPred"
 ]
 
+# runtime model of a runVEPonVCF task, used by tune_vep_config.py. Memory per variant and base
+# memory are the ones nextflow.config allocates the task by (96.KB * bin_size + 1.GB).
+VARIANT_MEMORY = 96 # KB per variant held by VEP
+BASE_MEMORY = 1024 # MB used by VEP itself
+FORK_MEMORY = 512 # MB each fork adds - cache regions, FASTA and plugin data handles
+FORK_MIN_VARIANTS = 2000 # with fewer variants per fork start-up costs more than the fork saves
+MIN_BUFFER_SIZE = 500
+MAX_BUFFER_SIZE = 20000
+DEFAULT_FORK = 2
+# file path in a custom or plugin line that VEP resolves per chromosome
+CHR_PATH_PATTERN = re.compile(r"[^,=\s]*##CHR##[^,\s]*")
+
 def parse_args(args = None):
     parser = argparse.ArgumentParser()
     
@@ -80,6 +95,7 @@ def parse_args(args = None):
     parser.add_argument('--genome_uuid', dest="genome_uuid", type=str, help="Genome UUID")
     parser.add_argument('--division', dest="division", type=str, required = False, help="Ensembl division the species belongs to")
     parser.add_argument('-I', '--ini_file', dest="ini_file", type=str, required = False, help="full path database configuration file, default - DEFAULT.ini in the same directory.")
+    parser.add_argument('--metadata_cache_dir', dest="metadata_cache_dir", type=str, required = False, help="directory to cache database name and division lookups and the parsed plugin config in, shared with other tasks of the run")
     parser.add_argument('--vep_config', dest="vep_config", type=str, required = False, help="VEP configuration file, default - <species>_<assembly>.ini in the same directory.")
     parser.add_argument('--cache_dir', dest="cache_dir", type=str, required = False, help="VEP cache directory, must be indexed")
     parser.add_argument('--fasta_dir', dest="fasta_dir", type=str, required = False, help="Directory containing toplevel FASTA ")
@@ -105,23 +121,25 @@ def get_frequency_args(population_data_file: str, species: str, placeholders: di
     with open(population_data_file, "r") as file:
         population_data = json.load(file)
 
+    # values are only looked up if a file location uses them, and then only once
     possible_placeholders = ["ASSEMBLY_ACC"]
-    frequencies = []
+    for placeholder in possible_placeholders:
+        placeholders.add_placeholder(placeholder)
+
+    files = []
     for species_patt in population_data:
         if re.fullmatch(species_patt, species):
             for population in population_data[species_patt]:
-                for file in population["files"]:
-                    short_name = file["short_name"]
-                    file_location = file["file_location"]
-                    fields = [field for pop in file["include_fields"] for field in list(pop["fields"].values()) ]
+                files += population["files"]
 
-                    placeholders.source_text = file_location
-                    for placeholder in possible_placeholders:
-                        placeholders.add_placeholder(placeholder)
-                    placeholders.replace()
-                    file_location = placeholders.source_text
+    file_locations = placeholders.render_all([file["file_location"] for file in files])
 
-                    frequencies.append(format_custom_args(short_name=short_name, file=file_location, fields=fields))
+    frequencies = []
+    for (file, file_location) in zip(files, file_locations):
+        short_name = file["short_name"]
+        fields = [field for pop in file["include_fields"] for field in list(pop["fields"].values()) ]
+
+        frequencies.append(format_custom_args(short_name=short_name, file=file_location, fields=fields))
 
     # Add 1kg population to be included from cache for human GRCh38 and GRCh37
     if species == "homo_sapiens" or species == "homo_sapiens_37":
@@ -255,13 +273,28 @@ def get_plugin_args(
     # some plugin do not need any arguments, for example - Downstream plugin
     return plugin
     
-def get_plugin_species(plugin: str, repo_dir: str) -> list:
-    plugin_config_file = f"{repo_dir}/VEP_plugins/plugin_config.txt"
-    
-    if not os.path.isfile(plugin_config_file):
-        print(f"[ERROR] Plugin config file does not exist - {plugin_config_file}. Exiting ...")
-        exit(1)
-    
+class PluginRegistry():
+    '''
+    Entries of VEP_plugins/plugin_config.txt by plugin key - the species a plugin is for and its
+    params, which name the data files it needs.
+    '''
+
+    def __init__(self, plugin_config: dict):
+        self._plugins = {plugin_config["key"]: plugin_config for plugin_config in plugin_config["plugins"]}
+
+    def has(self, plugin: str) -> bool:
+        return plugin in self._plugins
+
+    def species(self, plugin: str) -> list:
+        return self._plugins.get(plugin, {}).get("species", [])
+
+    def params(self, plugin: str) -> list:
+        return self._plugins.get(plugin, {}).get("params", [])
+
+# registries read by this process, by plugin config file
+_plugin_registries = {}
+
+def read_plugin_config(plugin_config_file: str) -> dict:
     cmd_generate_plugin_config_json = "use JSON;"
     cmd_generate_plugin_config_json += f"open IN, '{plugin_config_file}';"
     cmd_generate_plugin_config_json += "my @content = <IN>;"
@@ -277,12 +310,59 @@ def get_plugin_species(plugin: str, repo_dir: str) -> list:
         print(f"[ERROR] Cannot read plugin config file - {plugin_config_file}\n{process.stderr.decode()}\nExiting ...")
         exit(1)
         
-    plugin_config_json = json.loads(process.stdout)
-    for plugin_config in plugin_config_json["plugins"]:
-        if plugin_config["key"] == plugin:
-            return plugin_config["species"] if "species" in plugin_config else [] 
+    return json.loads(process.stdout)
+
+def get_plugin_registry(repo_dir: str, cache_dir: str = None) -> PluginRegistry:
+    '''
+    Get the plugin registry of the VEP_plugins repository in repo_dir. The plugin config is only
+    evaluated by Perl once: the JSON is kept in cache_dir and used as long as the config file has
+    the same mtime and SHA-1.
+    '''
+    plugin_config_file = f"{repo_dir}/VEP_plugins/plugin_config.txt"
     
-    return []
+    if not os.path.isfile(plugin_config_file):
+        print(f"[ERROR] Plugin config file does not exist - {plugin_config_file}. Exiting ...")
+        exit(1)
+
+    plugin_config_file = os.path.realpath(plugin_config_file)
+    if plugin_config_file in _plugin_registries:
+        return _plugin_registries[plugin_config_file]
+
+    mtime = os.stat(plugin_config_file).st_mtime_ns
+    with open(plugin_config_file, "rb") as file:
+        sha1 = hashlib.sha1(file.read()).hexdigest()
+
+    plugin_config = None
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, "plugin_config." + hashlib.sha1(plugin_config_file.encode()).hexdigest() + ".json")
+        try:
+            with open(cache_file, "r") as file:
+                entry = json.load(file)
+            if entry["mtime"] == mtime and entry["sha1"] == sha1:
+                plugin_config = entry["plugin_config"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    if plugin_config is None:
+        plugin_config = read_plugin_config(plugin_config_file)
+
+        if cache_file is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok = True)
+                (fd, temp_file) = tempfile.mkstemp(dir = cache_dir, suffix = ".tmp")
+                with os.fdopen(fd, "w") as file:
+                    json.dump({"mtime": mtime, "sha1": sha1, "plugin_config": plugin_config}, file)
+                os.replace(temp_file, cache_file)
+            except OSError as e:
+                print(f"[WARNING] Could not write plugin config cache - {e}")
+
+    _plugin_registries[plugin_config_file] = PluginRegistry(plugin_config)
+
+    return _plugin_registries[plugin_config_file]
+
+def get_plugin_species(plugin: str, repo_dir: str, cache_dir: str = None) -> list:
+    return get_plugin_registry(repo_dir, cache_dir).species(plugin)
     
 def get_plugins(
         species: str, 
@@ -290,12 +370,14 @@ def get_plugins(
         assembly: str, 
         repo_dir: str = REPO_DIR,
         conservation_data_dir: str = CONSERVATION_DATA_DIR,
+        plugin_config_cache_dir: str = None
     ) -> list:
 
     plugins = []
     
+    plugin_registry = get_plugin_registry(repo_dir, plugin_config_cache_dir)
     for plugin in PLUGINS:
-        plugin_species = get_plugin_species(plugin, repo_dir)
+        plugin_species = plugin_registry.species(plugin)
         if len(plugin_species) == 0 or species in plugin_species:
             plugin_args = get_plugin_args(plugin, version, species, assembly, conservation_data_dir)
             if plugin_args is not None:
@@ -303,6 +385,40 @@ def get_plugins(
             
     return plugins
         
+def tune_vep_runtime(record_count: int, cpus: int, memory: int = None, bin_size: int = None) -> dict:
+    '''
+    Choose fork and buffer_size of a VEP task that annotates a chunk of bin_size variants of an
+    input with record_count records, given the task CPUs and memory (MB):
+        - one fork per CPU, but not more than memory allows or than chunk has variants for
+        - the biggest buffer the memory left after forks can hold, up to the chunk size
+    '''
+    chunk_size = max(1, min(record_count, bin_size or record_count))
+    chunks = -(-record_count // chunk_size)
+    # same as the runVEPonVCF memory in nextflow.config
+    memory = memory or (VARIANT_MEMORY * (bin_size or chunk_size) // 1024 + BASE_MEMORY)
+
+    fork = min(
+        cpus,
+        max(1, (memory - BASE_MEMORY) // FORK_MEMORY),
+        max(1, chunk_size // FORK_MIN_VARIANTS)
+    )
+
+    buffer_memory = memory - BASE_MEMORY - fork * FORK_MEMORY
+    buffer_size = min(MAX_BUFFER_SIZE, chunk_size, max(0, buffer_memory) * 1024 // VARIANT_MEMORY)
+    # VEP splits a buffer evenly between forks
+    buffer_size = max(MIN_BUFFER_SIZE, buffer_size - buffer_size % fork)
+
+    return {
+        "records": record_count,
+        "cpus": cpus,
+        "memory": memory,
+        "bin_size": bin_size,
+        "chunks": chunks,
+        "chunk_size": chunk_size,
+        "fork": fork,
+        "buffer_size": buffer_size
+    }
+
 def generate_vep_config(
     vep_config: str,
     species: str,
@@ -315,7 +431,7 @@ def generate_vep_config(
     frequencies: list = None,
     plugins: dict = None,
     repo_dir: str = REPO_DIR,
-    fork: int = 2,
+    fork: int = DEFAULT_FORK,
     force: bool = False) -> None:
     if os.path.exists(vep_config) and not force:
         print(f"[INFO] {vep_config} file already exists, skipping ...")
@@ -354,8 +470,48 @@ def generate_vep_config(
                 file.write(f"plugin {plugin}\n")
     
     
+def get_tuned_config(vep_config_text: str, tuning: dict) -> str:
+    '''
+    Get the VEP config with fork and buffer_size of tuning (see tune_vep_runtime). The chosen
+    values and the numbers they come from are written as a comment at the top.
+    '''
+    tuned_lines = [
+        "# auto_tune " + " ".join(f"{key}={value}" for (key, value) in tuning.items()) + "\n"
+    ]
+    for line in vep_config_text.splitlines(keepends = True):
+        if line.startswith("# auto_tune ") or line.split(" ", 1)[0] == "buffer_size":
+            continue
+        if line.split(" ", 1)[0] == "fork":
+            tuned_lines.append(f"fork {tuning['fork']}\n")
+            tuned_lines.append(f"buffer_size {tuning['buffer_size']}\n")
+            continue
+        tuned_lines.append(line)
+
+    return "".join(tuned_lines)
+
+def get_shard_config(vep_config_text: str, contigs: list) -> str:
+    '''
+    Get the VEP config of a shard that only has variants on the given contigs. Custom and plugin
+    files that VEP resolves per chromosome (##CHR## in the path) are resolved to the file of the
+    shard contig when the shard is a single contig, so that VEP only opens that one. Lines are
+    never dropped - all shards must have the same CSQ fields to be merged.
+    '''
+    if len(contigs) != 1:
+        return vep_config_text
+
+    contig = contigs[0]
+    shard_lines = []
+    for line in vep_config_text.splitlines(keepends = True):
+        paths = CHR_PATH_PATTERN.findall(line)
+        if paths and all(os.path.exists(path.replace("##CHR##", contig)) for path in paths):
+            line = line.replace("##CHR##", contig)
+        shard_lines.append(line)
+
+    return "".join(shard_lines)
+    
 def main(args = None):
     args = parse_args(args)
+    set_metadata_cache(args.metadata_cache_dir)
     
     version = args.version
     species = args.species
@@ -413,8 +569,8 @@ def main(args = None):
     )
     frequencies = get_frequency_args(population_data_file, species, placeholders)
         
-    plugins = get_plugins(species, version, assembly, repo_dir, conservation_data_dir)
-    
+    plugins = get_plugins(species, version, assembly, repo_dir, conservation_data_dir, args.metadata_cache_dir)
+
     generate_vep_config(
         vep_config = vep_config,
         species = species,
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import mmap
+import struct
+from collections.abc import Mapping, Set
+
+# Binary lookup of the seq region names of a genome (see generate_genome_bundle.py): the synonym
+# each name is renamed to (as in the .synonyms file) and its length (as in the .chrom.sizes file).
+# The file is a table sorted by name that is searched through mmap, so opening it takes the same
+# time whatever the number of names:
+#
+#     header   magic, entries (u32), chromosomes (u32), synonyms (u32)
+#     entries  name offset (u32), name length (u16), synonym length (u16), synonym offset (u32),
+#              length (u64) - offsets are from the start of the strings
+#     strings  utf-8 names and synonyms
+#
+# A name with no synonym has NO_SYNONYM as synonym length, and one not in chrom.sizes NO_LENGTH.
+
+GENOME_LOOKUP_MAGIC = b"GCB\x01"
+HEADER = struct.Struct("<4sIII")
+ENTRY = struct.Struct("<IHHIQ")
+NO_SYNONYM = 0xffff
+NO_LENGTH = 0xffffffffffffffff
+
+def write_genome_lookup(lookup_file: str, chrom_sizes: dict, synonyms: dict) -> None:
+    'Write the lookup of {name: chrom.sizes length} and {name: synonym}'
+    names = sorted(set(chrom_sizes) | set(synonyms), key = lambda name: name.encode())
+
+    entries = bytearray()
+    strings = bytearray()
+    for name in names:
+        name_bytes = name.encode()
+        name_offset = len(strings)
+        strings += name_bytes
+
+        (synonym_offset, synonym_length) = (0, NO_SYNONYM)
+        if name in synonyms:
+            synonym_bytes = synonyms[name].encode()
+            (synonym_offset, synonym_length) = (len(strings), len(synonym_bytes))
+            strings += synonym_bytes
+
+        length = int(chrom_sizes[name]) if name in chrom_sizes else NO_LENGTH
+        entries += ENTRY.pack(name_offset, len(name_bytes), synonym_length, synonym_offset, length)
+
+    temp_file = lookup_file + ".tmp"
+    with open(temp_file, "wb") as file:
+        file.write(HEADER.pack(GENOME_LOOKUP_MAGIC, len(names), len(chrom_sizes), len(synonyms)))
+        file.write(entries)
+        file.write(strings)
+    os.replace(temp_file, lookup_file)
+
+class GenomeLookup():
+    '''
+    Read a genome lookup file. synonyms can be used as the dict of read_synonyms
+    (update_fields.py) and chromosomes as the set of parse_chrom_sizes (remove_variants.py).
+    Names are looked up in the file once and remembered.
+    '''
+
+    def __init__(self, lookup_file: str):
+        with open(lookup_file, "rb") as file:
+            self._data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        if len(self._data) < HEADER.size:
+            raise ValueError(f"{lookup_file} is not a genome lookup file")
+        (magic, self._entries, chromosomes, synonyms) = HEADER.unpack_from(self._data, 0)
+        if magic != GENOME_LOOKUP_MAGIC:
+            raise ValueError(f"{lookup_file} is not a genome lookup file")
+        self._strings = HEADER.size + self._entries * ENTRY.size
+        self._found = {}
+
+        self.synonyms = SynonymView(self, synonyms)
+        self.chromosomes = ChromosomeView(self, chromosomes)
+
+    def _entry(self, index: int) -> tuple:
+        return ENTRY.unpack_from(self._data, HEADER.size + index * ENTRY.size)
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings + offset
+        return self._data[start:start + length]
+
+    def _value(self, entry: tuple) -> tuple:
+        (_, _, synonym_length, synonym_offset, length) = entry
+        synonym = self._string(synonym_offset, synonym_length).decode() if synonym_length != NO_SYNONYM else None
+        return (synonym, length if length != NO_LENGTH else None)
+
+    def find(self, name: str) -> tuple:
+        'Get (synonym, length) of name, either is None if the name does not have it'
+        if name not in self._found:
+            key = name.encode()
+            (low, high) = (0, self._entries)
+            value = (None, None)
+            while low < high:
+                middle = (low + high) // 2
+                entry = self._entry(middle)
+                entry_name = self._string(entry[0], entry[1])
+                if entry_name < key:
+                    low = middle + 1
+                elif entry_name > key:
+                    high = middle
+                else:
+                    value = self._value(entry)
+                    break
+            self._found[name] = value
+
+        return self._found[name]
+
+    def items(self):
+        'Yield (name, synonym, length) of all names, sorted by name'
+        for index in range(self._entries):
+            entry = self._entry(index)
+            yield (self._string(entry[0], entry[1]).decode(), ) + self._value(entry)
+
+class SynonymView(Mapping):
+    def __init__(self, lookup: GenomeLookup, size: int):
+        self._lookup = lookup
+        self._size = size
+
+    def __getitem__(self, name: str) -> str:
+        synonym = self._lookup.find(name)[0]
+        if synonym is None:
+            raise KeyError(name)
+
+        return synonym
+
+    def __iter__(self):
+        return (name for (name, synonym, _) in self._lookup.items() if synonym is not None)
+
+    def __len__(self) -> int:
+        return self._size
+
+class ChromosomeView(Set):
+    def __init__(self, lookup: GenomeLookup, size: int):
+        self._lookup = lookup
+        self._size = size
+
+    def __contains__(self, name: str) -> bool:
+        return self._lookup.find(name)[1] is not None
+
+    def __iter__(self):
+        return (name for (name, _, length) in self._lookup.items() if length is not None)
+
+    def __len__(self) -> int:
+        return self._size
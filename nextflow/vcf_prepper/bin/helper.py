@@ -17,14 +17,64 @@
 import subprocess
 import configparser
 import os
+import re
 import json
+import gzip
+import struct
+import time
+import hashlib
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 from deprecated import deprecated
 
+from db import list_databases, query_value
+from artifact_store import ArtifactStore
+from bgzf import BgzfWriter, BGZF_EOF
+
+TABIX_MAGIC = b"TBI\x01"
+CSI_MAGIC = b"CSI\x01"
+
+# binning scheme of tabix and of bcftools index -c for bgzipped VCF
+INDEX_MIN_SHIFT = 14
+INDEX_DEPTH = {"tbi": 5, "csi": 6}
+TABIX_PSEUDO_BIN = 37450
+
+# connections, read size, retries per range and socket timeout (seconds) of download_file
+DOWNLOAD_CONNECTIONS = 4
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 60
+# seconds between journal writes of a download
+DOWNLOAD_JOURNAL_INTERVAL = 5
+
+# seconds a cached genome metadata lookup is valid
+METADATA_CACHE_TTL = 24 * 60 * 60
+
 class Placeholders():
-    def __init__(self, source_text: str = "", placeholders: dict = {}, data: dict = {}):
+    '''
+    Replace ##NAME## tokens in text. Values are resolved by the get_<name> method from data when
+    first needed and kept for that data, so a value that needs a database query is only queried
+    once however many templates use it. Tokens without a placeholder are left as they are.
+
+        placeholders = Placeholders(data = {...})
+        placeholders.add_placeholder("ASSEMBLY_ACC")
+        file_locations = placeholders.render_all(templates)
+    '''
+
+    PATTERN = re.compile(r"##([A-Za-z0-9_]+)##")
+
+    def __init__(self, source_text: str = "", placeholders: dict = None, data: dict = None):
         self._source_text = source_text
-        self._placeholders = placeholders
-        self._data = data
+        self._placeholders = placeholders if placeholders is not None else {}
+        self._data = data if data is not None else {}
+        # resolved values - {(name, data key): value}
+        self._values = {}
+        # templates split into literal text and placeholder names
+        self._templates = {}
 
     @property
     def source_text(self) -> str:
@@ -47,7 +97,7 @@ class Placeholders():
         return self._placeholders
 
     @placeholders.setter
-    def data(self, placeholders: dict):
+    def placeholders(self, placeholders: dict):
         self._placeholders = placeholders
 
     def get_data(self, name: str) -> str:
@@ -64,30 +114,76 @@ class Placeholders():
         value = None
         if name in self._placeholders:
             value = self._placeholders[name]
+            if value is None:
+                value = self.get_placeholder_value(name)
 
         return value
 
     def add_placeholder(self, name: str, value: str = None):
-        if value is None:
-            value = self.get_placeholder_value(name)
+        '''
+        Add a placeholder, if value is not given it is resolved from data when it is first used.
+        '''
         self._placeholders[name] = value
 
     def get_placeholder_value(self, name: str, data: str = None) -> str:
-        func = getattr(self, f"get_{name.lower()}")
-
         if data is None:
             data = self._data
 
-        return func(data)
+        key = (name, json.dumps(data, sort_keys = True, default = str))
+        if key not in self._values:
+            func = getattr(self, f"get_{name.lower()}")
+            self._values[key] = func(data)
 
-    def replace(self, placeholders: dict = None):
+        return self._values[key]
+
+    def _split(self, text: str) -> list:
+        if text not in self._templates:
+            # odd items are placeholder names
+            self._templates[text] = self.PATTERN.split(text)
+
+        return self._templates[text]
+
+    def _render(self, parts: list, placeholders: dict, skip: str = None) -> list:
+        rendered = list(parts)
+        for index in range(1, len(parts), 2):
+            name = parts[index]
+            if name == skip or name not in placeholders:
+                rendered[index] = f"##{name}##"
+            elif placeholders[name] is None:
+                rendered[index] = self.get_placeholder_value(name)
+            else:
+                rendered[index] = placeholders[name]
+
+        return rendered
+
+    def render(self, text: str, placeholders: dict = None) -> str:
+        '''
+        Replace the placeholder tokens of text in a single pass.
+        '''
         if placeholders is None:
             placeholders = self._placeholders
 
-        for placeholder in placeholders:
-            if placeholders[placeholder] is None:
-                self.add_placeholder(placeholder)
-            self._source_text = self._source_text.replace(f"##{placeholder}##", placeholders[placeholder])
+        return "".join(self._render(self._split(text), placeholders))
+
+    def render_all(self, texts: list, placeholders: dict = None) -> list:
+        return [self.render(text, placeholders) for text in texts]
+
+    def expand(self, text: str, name: str, values: list, placeholders: dict = None) -> list:
+        '''
+        Render text once for each value of the name placeholder, e.g. a file location with ##CHR##
+        for each chromosome. Other placeholders are only replaced once.
+        '''
+        if placeholders is None:
+            placeholders = self._placeholders
+
+        parts = self._render(self._split(text), placeholders, skip = name)
+        # rendered template split again on the placeholder to expand
+        parts = "".join(parts).split(f"##{name}##")
+
+        return [str(value).join(parts) for value in values]
+
+    def replace(self, placeholders: dict = None):
+        self._source_text = self.render(self._source_text, placeholders)
 
     def get_assembly_acc(self, data: dict) -> str:
         placeholder = "ASSEMBLY_ACC"
@@ -109,6 +205,224 @@ class Placeholders():
 
         return data["chromosomes"]
 
+def reg2bin(beg: int, end: int, min_shift: int, depth: int) -> int:
+    end -= 1
+    (shift, first) = (min_shift, ((1 << (depth * 3)) - 1) // 7)
+    for level in range(depth, 0, -1):
+        if beg >> shift == end >> shift:
+            return first + (beg >> shift)
+        shift += 3
+        first -= 1 << ((level - 1) * 3)
+
+    return 0
+
+def bin_first_window(bin: int, depth: int) -> int:
+    level = 0
+    parent = bin
+    while parent:
+        parent = (parent - 1) >> 3
+        level += 1
+
+    return (bin - ((1 << (level * 3)) - 1) // 7) << ((depth - level) * 3)
+
+class VcfIndexRef():
+    def __init__(self, name: bytes):
+        self.name = name
+        self.bins = {}
+        self.linear = []
+        self.n_records = 0
+        self.first_offset = None
+        self.last_offset = None
+
+class VcfIndex():
+    '''
+    Tabix (.tbi) or CSI (.csi) index of a bgzipped VCF, built from the record lines as they are
+    written by BgzfWriter so that the file does not need to be read again for indexing. Offsets
+    are kept as uncompressed offsets until finish() turns them into virtual offsets.
+
+    Records must be sorted; otherwise the index is dropped with a warning and write() does
+    nothing, so that the caller can fall back to bcftools index.
+    '''
+
+    def __init__(self, index_type: str):
+        if index_type not in INDEX_DEPTH:
+            print(f"[ERROR] Unknown index type - {index_type}. Exiting ...")
+            exit(1)
+
+        self.index_type = index_type
+        self._depth = INDEX_DEPTH[index_type]
+        self._max_pos = 1 << (INDEX_MIN_SHIFT + self._depth * 3)
+        self._refs = []
+        self._names = set()
+        self._ref = None
+        self._last_beg = -1
+        self._partial = b""
+        self._valid = True
+
+    @property
+    def valid(self) -> bool:
+        return self._valid
+
+    def push(self, data: bytes, offset: int) -> None:
+        if not self._valid:
+            return
+
+        if self._partial:
+            offset -= len(self._partial)
+            data = self._partial + data
+
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            end_offset = offset + len(line) + 1
+            if not line.startswith(b"#"):
+                self._add(line, offset, end_offset)
+            offset = end_offset
+
+    def _add(self, line: bytes, offset: int, end_offset: int) -> None:
+        fields = line.split(b"\t", 8)
+        (chrom, beg) = (fields[0], int(fields[1]) - 1)
+        end = beg + len(fields[3])
+        # as tabix, INFO/END gives the end of e.g. - structural variants
+        if len(fields) > 7 and b"END=" in fields[7]:
+            for item in fields[7].split(b";"):
+                if item.startswith(b"END="):
+                    end = max(end, int(item[4:]))
+                    break
+
+        ref = self._ref
+        if ref is None or ref.name != chrom:
+            if chrom in self._names:
+                return self._drop(f"chromosome {chrom.decode()} is not contiguous")
+            ref = VcfIndexRef(chrom)
+            ref.first_offset = offset
+            self._refs.append(ref)
+            self._names.add(chrom)
+            self._ref = ref
+        elif beg < self._last_beg:
+            return self._drop(f"positions are not sorted at {chrom.decode()}:{beg + 1}")
+
+        if end > self._max_pos:
+            return self._drop(f"position {chrom.decode()}:{end} is too large for {self.index_type} index")
+        self._last_beg = beg
+
+        ref.n_records += 1
+        ref.last_offset = end_offset
+
+        # join with the last chunk of the bin if the records are next to each other
+        chunks = ref.bins.setdefault(reg2bin(beg, end, INDEX_MIN_SHIFT, self._depth), [])
+        if chunks and chunks[-1][1] == offset:
+            chunks[-1][1] = end_offset
+        else:
+            chunks.append([offset, end_offset])
+
+        # linear index has the offset of the first record overlapping each 16kbp window
+        linear = ref.linear
+        (first_window, last_window) = (beg >> INDEX_MIN_SHIFT, (end - 1) >> INDEX_MIN_SHIFT)
+        if len(linear) <= last_window:
+            linear.extend([None] * (last_window + 1 - len(linear)))
+        for window in range(first_window, last_window + 1):
+            if linear[window] is None:
+                linear[window] = offset
+
+    def _drop(self, reason: str) -> None:
+        print(f"[WARNING] Cannot create {self.index_type} index, {reason}")
+        self._valid = False
+        self._refs = []
+
+    def finish(self, resolve) -> None:
+        '''
+        Turn uncompressed offsets to virtual offsets using the resolve function of the writer.
+        '''
+        for ref in self._refs:
+            for chunks in ref.bins.values():
+                for chunk in chunks:
+                    chunk[0] = resolve(chunk[0])
+                    chunk[1] = resolve(chunk[1])
+
+            # windows without a record start from the next record
+            linear = ref.linear
+            next_offset = ref.first_offset
+            for window in range(len(linear) - 1, -1, -1):
+                if linear[window] is None:
+                    linear[window] = next_offset
+                else:
+                    linear[window] = resolve(linear[window])
+                    next_offset = linear[window]
+
+            ref.first_offset = resolve(ref.first_offset)
+            ref.last_offset = resolve(ref.last_offset)
+
+    def shift(self, address: int) -> None:
+        '''
+        Move finished virtual offsets by a number of compressed bytes, e.g. - when the indexed
+        file is appended to another file.
+        '''
+        shift = address << 16
+        for ref in self._refs:
+            for chunks in ref.bins.values():
+                for chunk in chunks:
+                    chunk[0] += shift
+                    chunk[1] += shift
+            ref.linear = [offset + shift for offset in ref.linear]
+            ref.first_offset += shift
+            ref.last_offset += shift
+
+    def extend(self, index: "VcfIndex") -> None:
+        if not index.valid:
+            self._drop("a merged index is not valid")
+        if not self._valid:
+            return
+
+        for ref in index._refs:
+            if ref.name in self._names:
+                return self._drop(f"chromosome {ref.name.decode()} is not contiguous")
+            self._refs.append(ref)
+            self._names.add(ref.name)
+
+    def write(self, index_file: str) -> bool:
+        if not self._valid:
+            return False
+
+        names = b"".join(ref.name + b"\x00" for ref in self._refs)
+        # tabix config for VCF - format, sequence, begin and end columns, meta char, skip lines
+        conf = struct.pack("<7i", 2, 1, 2, 0, ord("#"), 0, len(names)) + names
+
+        if self.index_type == "tbi":
+            data = [TABIX_MAGIC, struct.pack("<i", len(self._refs)), conf]
+            pseudo_bin = TABIX_PSEUDO_BIN
+        else:
+            data = [CSI_MAGIC, struct.pack("<3i", INDEX_MIN_SHIFT, self._depth, len(conf)), conf, struct.pack("<i", len(self._refs))]
+            pseudo_bin = ((1 << ((self._depth + 1) * 3)) - 1) // 7 + 1
+
+        for ref in self._refs:
+            data.append(struct.pack("<i", len(ref.bins) + 1))
+            for bin in sorted(ref.bins):
+                chunks = ref.bins[bin]
+                if self.index_type == "tbi":
+                    data.append(struct.pack("<Ii", bin, len(chunks)))
+                else:
+                    window = bin_first_window(bin, self._depth)
+                    loff = ref.linear[window] if window < len(ref.linear) else 0
+                    data.append(struct.pack("<IQi", bin, loff, len(chunks)))
+                data.append(struct.pack(f"<{len(chunks) * 2}Q", *[offset for chunk in chunks for offset in chunk]))
+
+            # pseudo bin with the span of the chromosome and number of records
+            pseudo = struct.pack("<i4Q", 2, ref.first_offset, ref.last_offset, ref.n_records, 0)
+            if self.index_type == "tbi":
+                data.append(struct.pack("<I", pseudo_bin) + pseudo)
+                data.append(struct.pack(f"<i{len(ref.linear)}Q", len(ref.linear), *ref.linear))
+            else:
+                data.append(struct.pack("<IQ", pseudo_bin, 0) + pseudo)
+
+        # number of records without coordinate
+        data.append(struct.pack("<Q", 0))
+
+        with BgzfWriter(index_file) as file:
+            file.write(b"".join(data))
+
+        return True
+
 def parse_ini(ini_file: str, section: str = "database") -> dict:
     config = configparser.ConfigParser()
     config.read(ini_file)
@@ -127,52 +441,103 @@ def parse_ini(ini_file: str, section: str = "database") -> dict:
         "user": user
     }
 
+# lookups of genome metadata are shared by the tasks of a genome through files in this directory
+_metadata_cache_dir = None
+_metadata_cache_ttl = METADATA_CACHE_TTL
+
+def set_metadata_cache(cache_dir: str, ttl: int = METADATA_CACHE_TTL) -> None:
+    '''
+    Cache the results of get_db_name, get_division and get_assembly_accession_from_genome_uuid in
+    cache_dir for ttl seconds, so that other processes using the same directory do not query the
+    database again. Caching is off if cache_dir is None.
+    '''
+    global _metadata_cache_dir, _metadata_cache_ttl
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok = True)
+    _metadata_cache_dir = cache_dir
+    _metadata_cache_ttl = ttl
+
+def get_cached_metadata(server: dict, key: list, lookup: Callable) -> str:
+    '''
+    Get a metadata value from the cache, or from lookup() if it is not cached or the entry is
+    older than the TTL. Empty values are not cached so that a failed lookup is retried.
+    '''
+    if _metadata_cache_dir is None:
+        return lookup()
+
+    server_key = [server["sqlite"]] if "sqlite" in server else [server["host"], str(server["port"]), server["user"]]
+    cache_key = json.dumps(server_key + [str(part) for part in key])
+    cache_file = os.path.join(_metadata_cache_dir, hashlib.sha1(cache_key.encode()).hexdigest() + ".json")
+
+    try:
+        with open(cache_file, "r") as file:
+            entry = json.load(file)
+        if entry["key"] == cache_key and time.time() - entry["time"] < _metadata_cache_ttl:
+            return entry["value"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    value = lookup()
+    if not value:
+        return value
+
+    # write to a temp file and rename, readers never see a partially written entry
+    try:
+        (fd, temp_file) = tempfile.mkstemp(dir = _metadata_cache_dir, suffix = ".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump({"key": cache_key, "value": value, "time": time.time()}, file)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"[WARNING] Could not write metadata cache - {e}")
+
+    return value
+
+# store of copied and downloaded files shared by genomes and runs, see artifact_store.py
+_artifact_store = None
+
+def set_artifact_store(store_dir: str, max_size: int = None) -> None:
+    '''
+    Make copyto and download_file keep their files in the store in store_dir, limited to max_size
+    GB of files that are not in use. The store is off if store_dir is None.
+    '''
+    global _artifact_store
+
+    if store_dir is None:
+        _artifact_store = None
+        return
+
+    _artifact_store = ArtifactStore(store_dir, max_size * 1024 ** 3 if max_size is not None else None)
+
 def get_db_name(server: dict, version: str, species: str = "homo_sapiens", type: str = "core") -> str:
-    query = f"SHOW DATABASES LIKE '{species}_{type}%{version}%';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    return process.stdout.decode().strip()
+    def lookup() -> str:
+        databases = list_databases(server, f"{species}_{type}%{version}%")
+        if len(databases) > 1:
+            print(f"[WARNING] Multiple {type} database found - returning the first match only")
+
+        return databases[0] if databases else ""
+
+    return get_cached_metadata(server, ["db_name", version, species, type], lookup)
 
 def get_assembly_accession_from_genome_uuid(server: dict, metadata_db: str, genome_uuid: str) -> str:
-    query = f"SELECT a.accession FROM assembly AS a, genome AS g WHERE g.assembly_id = a.assembly_id AND g.genome_uuid = '{genome_uuid}';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", metadata_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
+    query = "SELECT a.accession FROM assembly AS a, genome AS g WHERE g.assembly_id = a.assembly_id AND g.genome_uuid = %s;"
+    return get_cached_metadata(
+        server,
+        ["assembly_accession", metadata_db, genome_uuid],
+        lambda: query_value(server, query, (genome_uuid, ), metadata_db) or ""
     )
-    return process.stdout.decode().strip()
 
 def get_division(server: dict, core_db: str) -> str:
     # TMP: this is only temp as ensemblgenome FTP had problem in 110
     if core_db.startswith("drosophila_melanogaster"):
         return "EnsemblVertebrates"
     query = "SELECT meta_value FROM meta WHERE meta_key = 'species.division';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", core_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
+    # core database name has the release version
+    return get_cached_metadata(
+        server,
+        ["division", core_db],
+        lambda: query_value(server, query, (), core_db) or ""
     )
-    return process.stdout.decode().strip()
 
 @deprecated(version='June 2025', reason="Variation database with old schema should not be used anymore")
 def dump_variant_source(server: dict, variation_db: str, dump_file: str) -> str:
@@ -213,16 +578,294 @@ def get_relative_version(version: int, division: str = "EnsemblVertebrates", sit
 
     return version
     
-def download_file(local_filename: str, url: str) -> int:
-    process = subprocess.run(["wget", url, "-O", local_filename],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
+class BsdSum():
+    '''
+    BSD checksum (as in the Ensembl FTP CHECKSUMS files) of data given in order, computed by
+    the sum command reading it from a pipe.
+    '''
 
-    if process.returncode != 0 and os.path.isfile(local_filename):
-        os.remove(local_filename)
-        
-    return process.returncode 
+    def __init__(self):
+        self._process = subprocess.Popen(["sum", "-r"], stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+
+    def update(self, data: bytes) -> None:
+        self._process.stdin.write(data)
+
+    def result(self) -> tuple:
+        (stdout, _) = self._process.communicate()
+        (checksum, blocks) = stdout.decode().split()[:2]
+
+        return (int(checksum), int(blocks))
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+def get_remote_checksum(url: str) -> tuple:
+    '''
+    Get (checksum, blocks) of a file on Ensembl FTP from the CHECKSUMS file in its directory,
+    None if there is no such file or it has no entry for the file.
+    '''
+    checksums_url = url.rsplit("/", 1)[0] + "/CHECKSUMS"
+    file_name = url.rsplit("/", 1)[1]
+    try:
+        with urllib.request.urlopen(checksums_url, timeout = DOWNLOAD_TIMEOUT) as response:
+            checksums = response.read().decode()
+    except (urllib.error.URLError, OSError):
+        return None
+
+    for line in checksums.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[2] == file_name:
+            return (int(fields[0]), int(fields[1]))
+
+    return None
+
+class Download():
+    '''
+    Download url to local_filename using HTTP range requests over several connections. Data is
+    written to <local_filename>.part and the ranges already written are kept in a journal
+    (<local_filename>.part.json), so a failed download is resumed by the next attempt. The
+    file is only renamed to local_filename when it is complete (and the checksum matches).
+
+    If checksum is given as (checksum, blocks) from a CHECKSUMS file, the contiguous start of
+    the file is checksummed while the rest is still downloading.
+
+    The connections only hold the lock to record written ranges. The journal is written at most
+    every DOWNLOAD_JOURNAL_INTERVAL seconds (and when the download stops), and the checksum is
+    caught up by one connection at a time, both outside the lock.
+    '''
+
+    def __init__(self, local_filename: str, url: str, connections: int = DOWNLOAD_CONNECTIONS, checksum: tuple = None):
+        self.local_filename = local_filename
+        self.url = url
+        self.connections = connections
+        self.checksum = checksum
+        self.part_file = local_filename + ".part"
+        self.journal_file = local_filename + ".part.json"
+
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._sum_lock = threading.Lock()
+        self._done = []
+        self._journal_saved = 0
+        self._checked = 0
+        self._sum = None
+
+    def _head(self) -> tuple:
+        request = urllib.request.Request(self.url, method = "HEAD")
+        with urllib.request.urlopen(request, timeout = DOWNLOAD_TIMEOUT) as response:
+            size = response.headers.get("Content-Length")
+            ranges = response.headers.get("Accept-Ranges", "") == "bytes"
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+        return (int(size) if size is not None else None, ranges, validator)
+
+    def _load_journal(self, size: int, validator: str) -> list:
+        try:
+            with open(self.journal_file, "r") as file:
+                journal = json.load(file)
+        except (OSError, ValueError):
+            return []
+
+        if journal.get("url") != self.url or journal.get("size") != size or journal.get("validator") != validator:
+            return []
+        if not os.path.isfile(self.part_file) or os.path.getsize(self.part_file) != size:
+            return []
+
+        return [tuple(done) for done in journal["done"]]
+
+    def _save_journal(self) -> None:
+        '''Write the journal, skipped if another connection is writing it'''
+        if not self._journal_lock.acquire(blocking = False):
+            return
+
+        try:
+            with self._lock:
+                done = list(self._done)
+                self._journal_saved = time.monotonic()
+
+            temp_file = self.journal_file + ".tmp"
+            with open(temp_file, "w") as file:
+                json.dump({"url": self.url, "size": self._size, "validator": self._validator, "done": done}, file)
+            os.replace(temp_file, self.journal_file)
+        finally:
+            self._journal_lock.release()
+
+    def _add_done(self, start: int, end: int) -> None:
+        '''Add written range, merged with the others. Must be called holding the lock'''
+        done = sorted(self._done + [(start, end)])
+        merged = [done[0]]
+        for (s, e) in done[1:]:
+            if s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        self._done = merged
+
+    def _check_prefix(self, fd: int) -> None:
+        '''Checksum the data that is contiguous from the start of file, skipped if another connection is doing it'''
+        if self._sum is None or not self._sum_lock.acquire(blocking = False):
+            return
+
+        try:
+            with self._lock:
+                end = self._done[0][1] if self._done and self._done[0][0] == 0 else 0
+
+            while self._checked < end:
+                data = os.pread(fd, min(DOWNLOAD_CHUNK_SIZE, end - self._checked), self._checked)
+                self._sum.update(data)
+                self._checked += len(data)
+        finally:
+            self._sum_lock.release()
+
+    def _missing(self) -> list:
+        missing = []
+        position = 0
+        for (start, end) in self._done:
+            if start > position:
+                missing.append((position, start))
+            position = end
+        if position < self._size:
+            missing.append((position, self._size))
+
+        return missing
+
+    def _segments(self) -> list:
+        '''Split the missing ranges so that every connection has work'''
+        missing = self._missing()
+        segment_size = max(DOWNLOAD_CHUNK_SIZE, sum(end - start for (start, end) in missing) // self.connections)
+
+        segments = []
+        for (start, end) in missing:
+            while start < end:
+                segments.append((start, min(start + segment_size, end)))
+                start += segment_size
+
+        return segments
+
+    def _fetch(self, fd: int, start: int, end: int) -> None:
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                request = urllib.request.Request(self.url, headers = {"Range": f"bytes={start}-{end - 1}"})
+                with urllib.request.urlopen(request, timeout = DOWNLOAD_TIMEOUT) as response:
+                    if response.status != 206:
+                        raise OSError(f"server did not return range {start}-{end - 1}")
+                    while start < end:
+                        data = response.read(min(DOWNLOAD_CHUNK_SIZE, end - start))
+                        if not data:
+                            raise OSError("connection closed")
+                        os.pwrite(fd, data, start)
+                        with self._lock:
+                            self._add_done(start, start + len(data))
+                            save_journal = time.monotonic() - self._journal_saved >= DOWNLOAD_JOURNAL_INTERVAL
+                        start += len(data)
+                        if save_journal:
+                            self._save_journal()
+                        self._check_prefix(fd)
+                return
+            except (urllib.error.URLError, OSError) as e:
+                if attempt == DOWNLOAD_RETRIES - 1:
+                    raise
+                print(f"[WARNING] Download of {self.url} bytes {start}-{end - 1} failed ({e}), retrying ...")
+                time.sleep(2 ** attempt)
+
+    def _fetch_all(self) -> None:
+        '''Single stream download, for servers without range requests or size'''
+        with urllib.request.urlopen(self.url, timeout = DOWNLOAD_TIMEOUT) as response, \
+                open(self.part_file, "wb") as file:
+            while True:
+                data = response.read(DOWNLOAD_CHUNK_SIZE)
+                if not data:
+                    break
+                file.write(data)
+                if self._sum is not None:
+                    self._sum.update(data)
+
+    def run(self) -> bool:
+        (self._size, ranges, self._validator) = self._head()
+        self._sum = BsdSum() if self.checksum is not None else None
+
+        try:
+            if self._size is None or not ranges:
+                self._fetch_all()
+            else:
+                self._done = self._load_journal(self._size, self._validator)
+                if self._done:
+                    print(f"[INFO] Resuming download of {self.url}")
+                else:
+                    with open(self.part_file, "wb") as file:
+                        file.truncate(self._size)
+
+                fd = os.open(self.part_file, os.O_RDWR)
+                try:
+                    self._check_prefix(fd)
+                    try:
+                        with ThreadPoolExecutor(max_workers = self.connections) as executor:
+                            futures = [executor.submit(self._fetch, fd, start, end) for (start, end) in self._segments()]
+                            for future in futures:
+                                future.result()
+                    finally:
+                        # the connections have stopped, keep everything written for a resume
+                        self._save_journal()
+                    self._check_prefix(fd)
+                finally:
+                    os.close(fd)
+
+            if self._sum is not None:
+                checksum = self._sum.result()
+                if checksum != tuple(self.checksum):
+                    print(f"[ERROR] Checksum of {self.url} is {checksum}, expected {tuple(self.checksum)}")
+                    for file in (self.part_file, self.journal_file):
+                        if os.path.isfile(file):
+                            os.remove(file)
+                    return False
+        finally:
+            if self._sum is not None:
+                self._sum.close()
+
+        os.replace(self.part_file, self.local_filename)
+        if os.path.isfile(self.journal_file):
+            os.remove(self.journal_file)
+
+        return True
+
+def _download_file(local_filename: str, url: str, connections: int, verify_checksum: bool) -> int:
+    checksum = None
+    if verify_checksum:
+        checksum = get_remote_checksum(url)
+        if checksum is None:
+            print(f"[WARNING] No checksum found for {url}, it will not be verified")
+
+    try:
+        success = Download(local_filename, url, connections, checksum).run()
+    except (urllib.error.URLError, OSError) as e:
+        print(f"[WARNING] Download of {url} failed - {e}")
+        return 1
+
+    return 0 if success else 1
+
+def download_file(
+        local_filename: str,
+        url: str,
+        connections: int = DOWNLOAD_CONNECTIONS,
+        verify_checksum: bool = False
+    ) -> int:
+    '''
+    Download url to local_filename, see Download. With verify_checksum the file is checked
+    against the CHECKSUMS file of the url directory, if there is one. Returns 0 on success. On
+    failure the partial download is kept, to be resumed by the next call for the same file.
+
+    If an artifact store is set (see set_artifact_store) the file is downloaded once into the
+    store and local_filename is linked to it.
+    '''
+    def download(path: str) -> int:
+        return _download_file(path, url, connections, verify_checksum)
+
+    if _artifact_store is None:
+        return download(local_filename)
+
+    return _artifact_store.materialise(ArtifactStore.url_key(url), local_filename, download)
     
 def get_ftp_path(
         species: str, 
@@ -276,10 +919,176 @@ def get_ftp_path(
     
     return None
     
-def copyto(src_file: str, dest_file: str) -> int:
+def _rsync(src_file: str, dest_file: str) -> int:
     process = subprocess.run(["rsync", src_file, dest_file], 
         stdout = subprocess.PIPE,
         stderr = subprocess.PIPE
     )
         
-    return process.returncode
\ No newline at end of file
+    return process.returncode
+
+def copyto(src_file: str, dest_file: str) -> int:
+    '''
+    Copy src_file to dest_file. If an artifact store is set (see set_artifact_store) the file is
+    copied once into the store and dest_file is linked to it.
+    '''
+    if _artifact_store is None:
+        return _rsync(src_file, dest_file)
+
+    try:
+        key = ArtifactStore.file_key(src_file)
+    except OSError:
+        return 1
+
+    return _artifact_store.materialise(key, dest_file, lambda path: _rsync(src_file, path))
+
+def read_vcf_index(vcf_file: str) -> bytes:
+    '''
+    Get the uncompressed tabix (.tbi) or CSI (.csi) index of a bgzipped VCF, None if there is no
+    index. vcf_file can also be a http(s) or ftp URL, then the index is fetched from there.
+    '''
+    if re.match(r"(https?|ftp)://", vcf_file):
+        for index_type in ("tbi", "csi"):
+            try:
+                with urllib.request.urlopen(f"{vcf_file}.{index_type}", timeout = DOWNLOAD_TIMEOUT) as response:
+                    return gzip.decompress(response.read())
+            except (urllib.error.URLError, OSError):
+                pass
+        return None
+
+    for index_file in (vcf_file + ".tbi", vcf_file + ".csi"):
+        if os.path.isfile(index_file):
+            with gzip.open(index_file, "rb") as file:
+                return file.read()
+
+    return None
+
+def parse_vcf_index(index: bytes) -> list:
+    '''
+    Get (contig, first virtual offset, number of records) of each indexed contig, in index order,
+    from an uncompressed tabix or CSI index. Contig is None if the index does not carry names and
+    first virtual offset is None for contigs without records. Returns None if the format is unknown.
+    '''
+    magic = index[:4]
+    if magic == TABIX_MAGIC:
+        (n_ref, l_nm) = (struct.unpack_from("<i", index, 4)[0], struct.unpack_from("<i", index, 32)[0])
+        names = index[36:36 + l_nm]
+        offset = 36 + l_nm
+        pseudo_bin = TABIX_PSEUDO_BIN
+    elif magic == CSI_MAGIC:
+        (min_shift, depth, l_aux) = struct.unpack_from("<3i", index, 4)
+        # names are only present if aux holds the tabix config, as for bgzipped VCF
+        names = None
+        if l_aux >= 28:
+            l_nm = struct.unpack_from("<i", index, 16 + 24)[0]
+            names = index[16 + 28:16 + 28 + l_nm]
+        offset = 16 + l_aux
+        n_ref = struct.unpack_from("<i", index, offset)[0]
+        offset += 4
+        pseudo_bin = ((1 << ((depth + 1) * 3)) - 1) // 7 + 1
+    else:
+        return None
+
+    contigs = [name.decode() for name in names.split(b"\x00")[:n_ref]] if names is not None else [None] * n_ref
+    parsed = []
+    for contig in contigs:
+        n_bin = struct.unpack_from("<i", index, offset)[0]
+        offset += 4
+
+        first_offset = None
+        n_records = 0
+        for _ in range(n_bin):
+            bin_id = struct.unpack_from("<I", index, offset)[0]
+            offset += 4 if magic == TABIX_MAGIC else 12
+            n_chunk = struct.unpack_from("<i", index, offset)[0]
+            offset += 4
+
+            if bin_id != pseudo_bin:
+                for (chunk_beg, ) in struct.iter_unpack("<Q8x", index[offset:offset + n_chunk * 16]):
+                    if first_offset is None or chunk_beg < first_offset:
+                        first_offset = chunk_beg
+            elif n_chunk == 2:
+                # second chunk of the pseudo-bin holds the number of mapped and unmapped records
+                n_records = struct.unpack_from("<Q", index, offset + 16)[0]
+            offset += n_chunk * 16
+
+        if magic == TABIX_MAGIC:
+            n_intv = struct.unpack_from("<i", index, offset)[0]
+            offset += 4 + n_intv * 8
+
+        parsed.append((contig, first_offset, n_records))
+
+    return parsed
+
+def get_contig_offsets(vcf_file: str) -> dict:
+    '''
+    Read the tabix (.tbi) or CSI (.csi) index of a bgzipped VCF and return the BGZF virtual
+    offset of the first record of each indexed contig, in index order. Returns empty dict if
+    there is no index or it does not carry contig names.
+    '''
+    if re.match(r"(https?|ftp)://", vcf_file):
+        return {}
+
+    index = read_vcf_index(vcf_file)
+    if index is None:
+        return {}
+
+    contigs = parse_vcf_index(index)
+    if contigs is None:
+        print(f"[WARNING] Unknown index format - {vcf_file}")
+        return {}
+
+    return {contig: first_offset for (contig, first_offset, _) in contigs if contig is not None and first_offset is not None}
+
+def get_record_count(vcf_file: str) -> int:
+    '''
+    Get the number of records of a bgzipped VCF from its index, as bcftools index --nrecords does.
+    Returns None if there is no index or it has no record counts.
+    '''
+    index = read_vcf_index(vcf_file)
+    contigs = parse_vcf_index(index) if index is not None else None
+    if not contigs:
+        return None
+
+    return sum(n_records for (_, _, n_records) in contigs)
+
+def read_vcf_header(vcf_file: str) -> bytes:
+    '''Get the header lines of a bgzipped VCF as raw bytes'''
+    header = []
+    with gzip.open(vcf_file, "rb") as file:
+        for line in file:
+            if not line.startswith(b"#"):
+                break
+            header.append(line)
+
+    return b"".join(header)
+
+def read_vcf_records(vcf_file: str, contig: str = None, contig_offsets: dict = None):
+    '''
+    Iterate over the record lines of a bgzipped VCF as raw bytes, without parsing them. If a
+    contig is given, seek to it using the virtual offsets from get_contig_offsets and stop at
+    the end of that contig.
+    '''
+    with open(vcf_file, "rb") as raw_file:
+        if contig is None:
+            with gzip.GzipFile(fileobj=raw_file) as file:
+                for line in file:
+                    if not line.startswith(b"#"):
+                        yield line
+            return
+
+        if contig_offsets is None:
+            contig_offsets = get_contig_offsets(vcf_file)
+        if contig not in contig_offsets:
+            return
+
+        # virtual offset = compressed block offset << 16 | offset inside uncompressed block
+        virtual_offset = contig_offsets[contig]
+        raw_file.seek(virtual_offset >> 16)
+        prefix = contig.encode() + b"\t"
+        with gzip.GzipFile(fileobj=raw_file) as file:
+            file.read(virtual_offset & 0xFFFF)
+            for line in file:
+                if not line.startswith(prefix):
+                    break
+                yield line
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+
+from helper import BgzfWriter, VcfIndex, read_vcf_header, read_vcf_records
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="shard_files", type=str, nargs="+", help="VEP output VCF of each shard, in shard order")
+    parser.add_argument('-O', '--output_file', dest="output_file", type=str, required=True)
+    parser.add_argument('--index_type', dest="index_type", type=str, choices=["tbi", "csi"], help="index the output while writing it")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to compress the output")
+
+    return parser.parse_args(args)
+
+def get_csq_header(header: bytes) -> bytes:
+    for line in header.split(b"\n"):
+        if line.startswith(b"##INFO=<ID=CSQ,"):
+            return line
+
+    return None
+
+def main(args = None):
+    description = '''
+    Merge the VEP output of the shards made by shard_vep_input.py into one VCF, with the header of the first shard.
+    Shards have whole contigs, so records are only concatenated.
+    '''
+    args = parse_args(args, description)
+
+    shard_files = args.shard_files
+    index_type = args.index_type
+
+    header = read_vcf_header(shard_files[0])
+    csq_header = get_csq_header(header)
+
+    index = VcfIndex(index_type) if index_type is not None else None
+    with BgzfWriter(args.output_file, threads = args.threads, index = index) as o_file:
+        o_file.write(header)
+        for shard_file in shard_files:
+            if get_csq_header(read_vcf_header(shard_file)) != csq_header:
+                print(f"[ERROR] CSQ fields of {shard_file} differ from {shard_files[0]}, cannot merge. Exiting ...")
+                exit(1)
+
+            for line in read_vcf_records(shard_file):
+                o_file.write(line)
+
+    if index is not None and not index.write(f"{args.output_file}.{index_type}"):
+        print(f"[ERROR] Could not index merged VCF - {args.output_file}. Exiting ...")
+        exit(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
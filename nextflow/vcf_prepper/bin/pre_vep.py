@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+from cyvcf2 import VCF
+import argparse
+from argparse import RawTextHelpFormatter
+from collections import namedtuple
+import os
+
+from helper import BgzfWriter, VcfIndex, get_contig_offsets
+from update_fields import META, HEADER, format_meta, read_synonyms, parse_sources, get_id_formatter, \
+    get_sources_meta, get_variant_source, format_variant
+from remove_variants import get_id, is_patch_region, get_duplicate_ids, get_unique_variants, \
+    read_valid_chroms, get_kept_variants
+
+# htslib adds it when the update_fields.py output is read by remove_variants.py
+FILTER_PASS = "##FILTER=<ID=PASS,Description=\"All filters passed\">\n"
+
+# updated record, with the fields remove_variants.py looks at
+Record = namedtuple("Record", ["CHROM", "POS", "ID", "line"])
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="input_file", type=str, help="Input VCF file")
+    parser.add_argument(dest="source", type=str, help="Input VCF file source")
+    parser.add_argument(dest="synonym_file", type=str, help="Text file with chrmosome synonyms")
+    parser.add_argument('--rename_clinvar_ids', dest="rename_clinvar_ids", action="store_true")
+    parser.add_argument('--chromosomes', dest="chromosomes", type=str, help="Comma separated list of chromosomes to put in header, default is the chromosomes in the input VCF index")
+    parser.add_argument('--sources', dest="sources", type=str, help="Comma separated list of sources if there are multiple sources")
+    parser.add_argument('--sources_meta_file', dest="sources_meta_file", type=str, required = False, help="JSON file with metadata about variant sources")
+    parser.add_argument('--chrom_sizes', dest="chrom_sizes", type=str, help="file with chromomsome sizes")
+    parser.add_argument('--genome_lookup', dest="genome_lookup", type=str, help="binary genome lookup (see generate_genome_bundle.py) to read synonyms and chromosomes from instead of the text files if it exists")
+    parser.add_argument('--remove_nonunique_ids', dest="remove_nonunique_ids", action="store_true", help="remove variants with same ids")
+    parser.add_argument('--remove_patch_regions', dest="remove_patch_regions", action="store_true", help="remove variant in patch region")
+    parser.add_argument('-O', '--output_file', dest="output_file", type=str)
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to compress the output")
+    parser.add_argument('--index_type', dest="index_type", type=str, choices=["tbi", "csi"], help="index the output while writing it")
+    parser.add_argument('--hash_memory', dest="hash_memory", type=int, default=1024, help="MB of id hashes kept in memory for remove_nonunique_ids, more is memory-mapped from temp_dir (default: 1024)")
+    parser.add_argument('--temp_dir', dest="temp_dir", type=str, help="directory for temporary files (default: output file directory)")
+
+    return parser.parse_args(args)
+
+def main(args = None):
+    description = '''
+    Runs update_fields.py and remove_variants.py in a single pass over the input VCF, without writing the intermediate VCF.
+        1) Chromosomes are renamed using the synonyms, ids are formatted and INFO is replaced by the variant SOURCE (see update_fields.py).
+        2) Variants not in the chrom_sizes chromosomes, in patch regions or with non-unique ids are removed (see remove_variants.py). Chromosome names are checked after renaming.
+    The output is the same as running both scripts one after the other.
+    '''
+    args = parse_args(args, description)
+
+    input_file = args.input_file
+    source = args.source
+    synonym_file = args.synonym_file
+    # chromosomes with variants, from the index
+    chromosomes = args.chromosomes or ",".join(get_contig_offsets(input_file)) or None
+    sources = args.sources or []
+    sources_meta_file = args.sources_meta_file or os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "../assets/source_meta.json"
+        )
+    chrom_sizes = args.chrom_sizes or None
+    remove_nonunique_ids = args.remove_nonunique_ids
+    remove_patch_regions = args.remove_patch_regions
+    output_file = args.output_file or os.path.join(os.path.dirname(input_file), "PROCESSED_" + os.path.basename(input_file))
+    threads = args.threads
+    index_type = args.index_type
+    hash_memory = args.hash_memory * 1024 * 1024
+    temp_dir = args.temp_dir or os.path.dirname(os.path.abspath(output_file))
+
+    if source == "MULTIPLE" and not sources:
+        print(f"[ERROR] {source} source type requires source list to be provided. See --sources option.")
+        exit(1)
+
+    sources = parse_sources(sources)
+    synonyms = read_synonyms(synonym_file, args.genome_lookup)
+    format_id = get_id_formatter(source, args.rename_clinvar_ids)
+
+    (fileformat, info) = META.split("\n", 1)
+    meta = format_meta(fileformat + "\n" + FILTER_PASS + info, chromosomes, synonyms)
+    meta += get_sources_meta(source, sources, sources_meta_file)
+
+    valid_chroms = None
+    if chrom_sizes is not None and os.path.isfile(chrom_sizes):
+        valid_chroms = read_valid_chroms(chrom_sizes, args.genome_lookup)
+        if len(valid_chroms) == 0:
+            print(f"[WARN] {chrom_sizes} do not have any chromsome length, should be checked.")
+
+    # chromosomes are checked by their new name
+    def is_kept_chrom(chrom: str) -> bool:
+        chrom = synonyms.get(chrom, chrom)
+        if remove_patch_regions and is_patch_region(chrom):
+            return False
+        return valid_chroms is None or chrom in valid_chroms
+
+    def get_records(variants):
+        for variant in variants:
+            chrom = synonyms.get(variant.CHROM, variant.CHROM)
+            id = format_id(variant.ID)
+            yield Record(chrom, variant.POS, id, format_variant(chrom, variant, id, get_variant_source(variant, source, sources)))
+
+    input_vcf = VCF(input_file)
+    records = get_records(get_kept_variants(input_vcf, input_file, is_kept_chrom))
+    if remove_nonunique_ids:
+        # same id can be anywhere in the file, also in removed chromosomes - need to read it fully first
+        duplicate_ids = get_duplicate_ids(input_file, hash_memory, temp_dir, format_id)
+        records = (record for record in records if get_id(record) not in duplicate_ids)
+    else:
+        records = get_unique_variants(records)
+
+    index = VcfIndex(index_type) if index_type is not None else None
+    with BgzfWriter(output_file, threads = threads, index = index) as o_file:
+        o_file.write(meta)
+        o_file.write(HEADER)
+        for record in records:
+            o_file.write(record.line)
+    input_vcf.close()
+
+    if index is not None:
+        index.write(f"{output_file}.{index_type}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+import gzip
+import struct
+import zlib
+import shutil
+
+from bgzf import BgzfWriter
+
+# bytes of uncompressed FASTA processed at a time
+READ_SIZE = 4 * 1024 * 1024
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="input_file", type=str, help="FASTA file - plain, gzipped or bgzipped")
+    parser.add_argument('-O', '--output_file', dest="output_file", type=str, help="bgzipped FASTA, default is the input file (if it is gzipped it is replaced)")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to compress the output")
+    parser.add_argument('--force', dest="force", action="store_true", help="index again even if .fai and .gzi exist")
+
+    return parser.parse_args(args)
+
+def is_bgzf(input_file: str) -> bool:
+    'True if the file starts with a BGZF block - gzip with the BC extra subfield'
+    with open(input_file, "rb") as file:
+        header = file.read(18)
+
+    return len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04" and header[12:14] == b"BC"
+
+def is_gzip(input_file: str) -> bool:
+    with open(input_file, "rb") as file:
+        return file.read(2) == b"\x1f\x8b"
+
+class FaidxBuilder():
+    '''
+    Build the .fai index of a FASTA (as samtools faidx) from its uncompressed data, given in
+    order in pieces of any size. Like htslib, all lines of a sequence but the last must have the
+    same length.
+    '''
+
+    def __init__(self):
+        self._records = []
+        self._offset = 0
+        self._partial = b""
+        self._seq = None
+
+    def update(self, data: bytes) -> None:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line, len(line) + 1)
+
+    def _add_line(self, line: bytes, width: int) -> None:
+        start = self._offset
+        self._offset += width
+
+        if line.startswith(b">"):
+            self._end_seq()
+            name = line[1:].split(None, 1)[0].decode() if line[1:].strip() else ""
+            # [name, length, offset, linebases, linewidth, short line seen]
+            self._seq = [name, 0, self._offset, None, None, False]
+            return
+
+        seq = self._seq
+        if seq is None:
+            if line.strip():
+                raise ValueError("FASTA does not start with a sequence name")
+            return
+
+        bases = len(line.rstrip(b"\r"))
+        if seq[3] is None:
+            if bases == 0:
+                return
+            (seq[3], seq[4]) = (bases, width)
+        elif seq[5]:
+            if bases > 0:
+                raise ValueError(f"different line length in sequence {seq[0]}")
+            return
+        elif bases != seq[3] or width != seq[4]:
+            if bases > seq[3]:
+                raise ValueError(f"different line length in sequence {seq[0]}")
+            seq[5] = True
+        seq[1] += bases
+
+    def _end_seq(self) -> None:
+        seq = self._seq
+        if seq is None:
+            return
+
+        (name, length, offset, linebases, linewidth, _) = seq
+        self._records.append(f"{name}\t{length}\t{offset}\t{linebases or 0}\t{linewidth or 0}\n")
+        self._seq = None
+
+    def finish(self) -> list:
+        'Returns the .fai lines'
+        if self._partial:
+            self._add_line(self._partial, len(self._partial))
+            self._partial = b""
+        self._end_seq()
+
+        return self._records
+
+def write_gzi(gzi_file: str, block_offsets: list) -> None:
+    '''
+    Write the .gzi index of a BGZF file (as bgzip -i) from the (compressed, uncompressed) start
+    offsets of its blocks. The first block, which starts at 0, is implicit.
+    '''
+    entries = [offsets for offsets in block_offsets if offsets != (0, 0)]
+    with open(gzi_file, "wb") as file:
+        file.write(struct.pack("<Q", len(entries)))
+        for (compressed, uncompressed) in entries:
+            file.write(struct.pack("<2Q", compressed, uncompressed))
+
+def write_fai(fai_file: str, records: list) -> None:
+    with open(fai_file, "w") as file:
+        file.writelines(records)
+
+def read_bgzf_blocks(input_file: str):
+    'Iterate over (compressed offset, uncompressed data) of every block of a BGZF file'
+    with open(input_file, "rb") as file:
+        address = 0
+        while True:
+            header = file.read(18)
+            if not header:
+                return
+            if len(header) < 18 or header[12:14] != b"BC":
+                raise ValueError(f"not a BGZF block at {address}")
+
+            block_size = struct.unpack_from("<H", header, 16)[0] + 1
+            block = file.read(block_size - 18)
+            yield (address, zlib.decompress(block[:-8], -15))
+            address += block_size
+
+def index_bgzf_fasta(fasta_file: str) -> None:
+    'Write .fai and .gzi of a bgzipped FASTA, reading it once'
+    faidx = FaidxBuilder()
+    block_offsets = []
+    offset = 0
+    for (address, data) in read_bgzf_blocks(fasta_file):
+        # empty blocks (as the EOF marker) do not start data
+        if data:
+            block_offsets.append((address, offset))
+            faidx.update(data)
+            offset += len(data)
+
+    write_fai(fasta_file + ".fai", faidx.finish())
+    write_gzi(fasta_file + ".gzi", block_offsets)
+
+def compress_fasta(input_file: str, output_file: str, threads: int = 1) -> None:
+    '''
+    Stream a plain or gzipped FASTA into a bgzipped one, writing its .fai and .gzi at the same
+    time. The output is written to a temporary file first, so it can replace the input.
+    '''
+    temp_file = output_file + ".tmp"
+    faidx = FaidxBuilder()
+
+    opener = gzip.open if is_gzip(input_file) else open
+    with opener(input_file, "rb") as i_file, BgzfWriter(temp_file, threads = threads) as o_file:
+        while True:
+            data = i_file.read(READ_SIZE)
+            if not data:
+                break
+            o_file.write(data)
+            faidx.update(data)
+
+    block_offsets = o_file.block_offsets()
+    os.replace(temp_file, output_file)
+
+    write_fai(output_file + ".fai", faidx.finish())
+    write_gzi(output_file + ".gzi", block_offsets)
+
+def prepare_fasta(input_file: str, output_file: str = None, threads: int = 1, force: bool = False) -> str:
+    '''
+    Make a bgzipped and indexed (.fai and .gzi) FASTA from input_file in a single pass. A BGZF
+    input is only indexed (copied to output_file first if that is another file). Returns the
+    bgzipped FASTA.
+    '''
+    output_file = output_file or input_file
+
+    if is_bgzf(input_file):
+        if os.path.abspath(output_file) != os.path.abspath(input_file):
+            shutil.copyfile(input_file, output_file)
+        if not force and os.path.isfile(output_file + ".fai") and os.path.isfile(output_file + ".gzi"):
+            print(f"[INFO] both .fai and .gzi file exist. Skipping ...")
+            return output_file
+
+        index_bgzf_fasta(output_file)
+        return output_file
+
+    compress_fasta(input_file, output_file, threads)
+    return output_file
+
+def main(args = None):
+    description = '''
+    Bgzip and index a FASTA file in a single pass, without an uncompressed temporary file.
+    Writes <output_file>.fai (as samtools faidx) and <output_file>.gzi (as bgzip -i). A bgzipped input is only indexed.
+    '''
+    args = parse_args(args, description)
+
+    try:
+        prepare_fasta(args.input_file, args.output_file, args.threads, args.force)
+    except (OSError, ValueError, zlib.error) as e:
+        print(f"[ERROR] Cannot prepare fasta file - {args.input_file}\n{e}\nExiting ...")
+        exit(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,12 +17,14 @@
 import sys
 import configparser
 import argparse
-import subprocess
 import os
 import requests
-import shutil
+import tarfile
+import zlib
+import http.client
 
 from helper import *
+from extract_cache import extract_cache, is_extracted
 
 CACHE_DIR = "/nfs/production/flicek/ensembl/variation/data/VEP/tabixconverted"
 
@@ -34,23 +36,17 @@ def parse_args(args = None):
     parser.add_argument(dest="version", type=int, help="Ensembl release version")
     parser.add_argument('--division', dest="division", type=str, required = False, help="Ensembl division the species belongs to")
     parser.add_argument('-I', '--ini_file', dest="ini_file", type=str, required = False, help="full path database configuration file, default - DEFAULT.ini in the same directory.")
+    parser.add_argument('--metadata_cache_dir', dest="metadata_cache_dir", type=str, required = False, help="directory to cache database name and division lookups in, shared with other tasks of the run")
     parser.add_argument('--cache_dir', dest="cache_dir", type=str, required = False, help="VEP cache directory")
+    parser.add_argument('--include', dest="include", type=str, required = False, help="comma separated chromosomes or sub-directories of the genome cache to extract, default is all")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to decompress the cache")
     parser.add_argument('--force', dest="force", action="store_true")
     
     return parser.parse_args(args)
     
-def uncompress_cache(cache_dir: str, compressed_cache: str) -> None:
-    process = subprocess.run(["tar", "-xvzf", compressed_cache, "-C", cache_dir],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
-    if process.returncode != 0:
-        print(f"[ERROR] Could not uncompress cache file - {compressed_cache}")
-        exit(1)
-    
 def main(args = None):
     args = parse_args(args)
+    set_metadata_cache(args.metadata_cache_dir)
     
     species = args.species
     assembly = args.assembly
@@ -65,29 +61,38 @@ def main(args = None):
     
     cache_dir = args.cache_dir or CACHE_DIR
     rl_version = get_relative_version(version, division)
-    genome_cache_dir = os.path.join(cache_dir, cachedir_species_name, f"{rl_version}_{assembly}")         
-    if os.path.exists(genome_cache_dir):
+    genome_cache_dir = os.path.join(cache_dir, cachedir_species_name, f"{rl_version}_{assembly}")
+    include = args.include.split(",") if args.include else None
+    if is_extracted(genome_cache_dir, include):
         if not args.force:
             print(f"[INFO] {genome_cache_dir} directory exists. Skipping ...")
             exit(0)
         else:
             print(f"[INFO] {genome_cache_dir} directory exists. Will be overwritten ...")
-            shutil.rmtree(genome_cache_dir)
+    elif os.path.exists(genome_cache_dir):
+        print(f"[INFO] {genome_cache_dir} directory is not complete. Resuming ...")
         
     compressed_cache = get_ftp_path(species, assembly, division, rl_version, "cache")
     
     if compressed_cache is None:
         print(f"[INFO] Could not find cache in local ftp directory, will retry using remote FTP")
         
-        compressed_cache_url = get_ftp_path(species, assembly, division, rl_version, "cache", "remote")
-        
-        compressed_cache = os.path.join(cache_dir, compressed_cache_url.split('/')[-1])
-        returncode = download_file(compressed_cache, compressed_cache_url)
-        if returncode != 0:
-            print(f"[ERROR] Could not download cache file - {compressed_cache_url}")
-            exit(1)
+        # the remote cache is extracted while it is downloading
+        compressed_cache = get_ftp_path(species, assembly, division, rl_version, "cache", "remote")
     
-    uncompress_cache(cache_dir, compressed_cache)   
+    try:
+        success = extract_cache(compressed_cache, cache_dir, genome_cache_dir, include,
+            threads = args.threads,
+            verify_checksum = True,
+            force = args.force
+        )
+    except (OSError, EOFError, tarfile.TarError, zlib.error, http.client.HTTPException) as e:
+        print(f"[ERROR] Could not uncompress cache file - {compressed_cache}\n{e}")
+        exit(1)
+    
+    if not success:
+        print(f"[ERROR] Could not uncompress cache file - {compressed_cache}")
+        exit(1)
     
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
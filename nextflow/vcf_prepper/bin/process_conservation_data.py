@@ -35,13 +35,18 @@ def parse_args(args = None):
     parser.add_argument(dest="version", type=int, help="Ensembl release version")
     parser.add_argument('--division', dest="division", type=str, required = False, help="Ensembl division the species belongs to")
     parser.add_argument('-I', '--ini_file', dest="ini_file", type=str, required = False, help="full path database configuration file, default - DEFAULT.ini in the same directory.")
+    parser.add_argument('--metadata_cache_dir', dest="metadata_cache_dir", type=str, required = False, help="directory to cache database name and division lookups in, shared with other tasks of the run")
     parser.add_argument('--conservation_data_dir', dest="conservation_data_dir", type=str, required = False, help="Conservation bigwigs directory")
+    parser.add_argument('--artifact_store_dir', dest="artifact_store_dir", type=str, required = False, help="directory to store copied and downloaded files in, shared with other genomes and runs")
+    parser.add_argument('--artifact_store_max_size', dest="artifact_store_max_size", type=float, required = False, help="GB of files not in use to keep in the artifact store")
     parser.add_argument('--force', dest="force", action="store_true")
     
     return parser.parse_args(args)
         
 def main(args = None):
     args = parse_args(args)
+    set_metadata_cache(args.metadata_cache_dir)
+    set_artifact_store(args.artifact_store_dir, args.artifact_store_max_size)
     
     species = args.species
     assembly = args.assembly
@@ -73,7 +78,7 @@ def main(args = None):
         source_conservation_bw_url = get_ftp_path(species, assembly, division, version, "conservation", "remote")
         
         conservation_bw = os.path.join(conservation_data_dir, source_conservation_bw_url.split('/')[-1])
-        returncode = download_file(conservation_bw, source_conservation_bw_url)
+        returncode = download_file(conservation_bw, source_conservation_bw_url, verify_checksum = True)
         if returncode != 0:
             print(f"[INFO] Could not download conservation bw file - {source_conservation_bw_url}, Skipping ...")
         
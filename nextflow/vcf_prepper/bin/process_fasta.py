@@ -17,12 +17,13 @@
 import sys
 import configparser
 import argparse
-import subprocess
 import os
 import requests
 import glob
+import zlib
 
 from helper import *
+from prepare_fasta import prepare_fasta
 
 FASTA_DIR = "/nfs/production/flicek/ensembl/variation/data/VEP/fasta"
 
@@ -34,76 +35,31 @@ def parse_args(args = None):
     parser.add_argument(dest="version", type=int, help="Ensembl release version")
     parser.add_argument('--division', dest="division", type=str, required = False, help="Ensembl division the species belongs to")
     parser.add_argument('-I', '--ini_file', dest="ini_file", type=str, required = False, help="full path database configuration file, default - DEFAULT.ini in the same directory.")
+    parser.add_argument('--metadata_cache_dir', dest="metadata_cache_dir", type=str, required = False, help="directory to cache database name and division lookups in, shared with other tasks of the run")
     parser.add_argument('--fasta_dir', dest="fasta_dir", type=str, required = False, help="FASTA directory")
+    parser.add_argument('--artifact_store_dir', dest="artifact_store_dir", type=str, required = False, help="directory to store copied and downloaded files in, shared with other genomes and runs")
+    parser.add_argument('--artifact_store_max_size', dest="artifact_store_max_size", type=float, required = False, help="GB of files not in use to keep in the artifact store")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to bgzip the FASTA")
     parser.add_argument('--force', dest="force", action="store_true")
     
     return parser.parse_args(args)
     
-def ungzip_fasta(fasta_dir: str, compressed_fasta: str) -> str:
-    if os.path.dirname(compressed_fasta) != fasta_dir:
-        print(f"[ERROR] Fasta file {fasta_dir} in wrong directory; should be in - {fasta_dir}")
-        exit(1)
-        
-    process = subprocess.run(["gzip", "-df", compressed_fasta],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
-    if process.returncode != 0:
-        print(f"[ERROR] Could not uncompress fasta file - {compressed_fasta}")
-        exit(1)
-        
-    return compressed_fasta[:-3]
-    
-def bgzip_fasta(fasta_dir: str, unzipped_fasta: str) -> str:
-    if os.path.dirname(unzipped_fasta) != fasta_dir:
-        print(f"[ERROR] Fasta file {fasta_dir} in wrong directory; should be in - {fasta_dir}")
-        exit(1)
-        
-    process = subprocess.run(["bgzip", "-f", unzipped_fasta],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
-    if process.returncode != 0:
-        print(f"[ERROR] Could not bgzip fasta file - {unzipped_fasta}")
-        exit(1)
-
-    return unzipped_fasta + ".gz"
-
-def index_fasta(zipped_fasta: str, force: str = False) -> None:
+def index_fasta(zipped_fasta: str, force: str = False, threads: int = 1) -> None:
     if not os.path.isfile(zipped_fasta):
-        print(f"[ERROR] Cannot index fasta - {fasta} - does not exist. Exiting ...")
+        print(f"[ERROR] Cannot index fasta - {zipped_fasta} - does not exist. Exiting ...")
         exit(1)
 
-    fai = zipped_fasta + ".fai"
-    gzi = zipped_fasta + ".gzi"
-
-    if os.path.isfile(fai) and os.path.isfile(gzi) and not force:
-        print(f"[INFO] both .fai and .gzi file exist. Skipping ...")
-        return
-
-    if os.path.isfile(fai):
-        print(f"[INFO] {fai} exist. Deleting ...")
-        os.remove(fai)
-    
-    if os.path.isfile(gzi):
-        print(f"[INFO] {gzi} exist. Deleting ...")
-        os.remove(gzi)
-    
-    cmd_index_fasta = "use Bio::DB::HTS::Faidx;"
-    cmd_index_fasta += f"Bio::DB::HTS::Faidx->new('{zipped_fasta}');"
-    
-    process = subprocess.run(["perl", "-e", cmd_index_fasta],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    if process.returncode != 0:
-        print(f"[ERROR] Cannot index fasta file - {zipped_fasta}\n{process.stderr.decode()}\nExiting ...")
+    # only indexes it if already bgzipped, else it is bgzipped in the same pass
+    try:
+        prepare_fasta(zipped_fasta, threads = threads, force = force)
+    except (OSError, ValueError, zlib.error) as e:
+        print(f"[ERROR] Cannot index fasta file - {zipped_fasta}\n{e}\nExiting ...")
         exit(1)
     
 def main(args = None):
     args = parse_args(args)
+    set_metadata_cache(args.metadata_cache_dir)
+    set_artifact_store(args.artifact_store_dir, args.artifact_store_max_size)
     
     species = args.species
     assembly = args.assembly
@@ -150,16 +106,20 @@ def main(args = None):
             compressed_fasta_url = get_ftp_path(species, assembly, division, rl_version, "fasta", "remote", fasta_species_name)
         
             compressed_fasta = os.path.join(fasta_dir, compressed_fasta_url.split('/')[-1])
-            returncode = download_file(compressed_fasta, compressed_fasta_url)
+            returncode = download_file(compressed_fasta, compressed_fasta_url, verify_checksum = True)
             if returncode != 0:
                 print(f"[ERROR] Could not download fasta file - {compressed_fasta_url}")
                 exit(1)
     
-        unzipped_fasta = ungzip_fasta(fasta_dir, compressed_fasta)
-        fasta = bgzip_fasta(fasta_dir, unzipped_fasta)
+        if os.path.dirname(compressed_fasta) != fasta_dir:
+            print(f"[ERROR] Fasta file {compressed_fasta} in wrong directory; should be in - {fasta_dir}")
+            exit(1)
+
+        # gzipped FASTA is bgzipped and indexed in a single pass, replacing the download
+        fasta = compressed_fasta
     
     if fasta is not None:
-        index_fasta(fasta, force=args.force)
+        index_fasta(fasta, force=args.force, threads=args.threads)
         
 if __name__ == "__main__":
     sys.exit(main())
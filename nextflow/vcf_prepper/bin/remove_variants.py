@@ -15,21 +15,31 @@
 # limitations under the License.
 
 import sys
-from cyvcf2 import VCF, Writer
+from cyvcf2 import VCF
 from cyvcf2.cyvcf2 import Variant
 import argparse
 from argparse import RawTextHelpFormatter
 from typing import Callable
 import os
+import tempfile
+import numpy as np
+
+from helper import BgzfWriter, VcfIndex, get_contig_offsets
+from genome_lookup import GenomeLookup
 
 def parse_args(args = None, description: bool = None):
     parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
     
     parser.add_argument(dest="input_file", type=str, help="input VCF file")
     parser.add_argument('--chrom_sizes', dest="chrom_sizes", type=str, help="file with chromomsome sizes")
+    parser.add_argument('--genome_lookup', dest="genome_lookup", type=str, help="binary genome lookup (see generate_genome_bundle.py) to read the chromosomes from instead of chrom_sizes if it exists")
     parser.add_argument('--remove_nonunique_ids', dest="remove_nonunique_ids", action="store_true", help="remove variants with same ids")
     parser.add_argument('--remove_patch_regions', dest="remove_patch_regions", action="store_true", help="remove variant in patch region")
     parser.add_argument('-O', '--output_file', dest="output_file", type=str)
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to compress the output")
+    parser.add_argument('--index_type', dest="index_type", type=str, choices=["tbi", "csi"], help="index the output while writing it")
+    parser.add_argument('--hash_memory', dest="hash_memory", type=int, default=1024, help="MB of id hashes kept in memory for remove_nonunique_ids, more is memory-mapped from temp_dir (default: 1024)")
+    parser.add_argument('--temp_dir', dest="temp_dir", type=str, help="directory for temporary files (default: output file directory)")
     
     return parser.parse_args(args)
  
@@ -44,21 +54,151 @@ def get_positioned_id(variant: Variant) -> str:
     id = variant.ID or "unknown"
     return variant.CHROM + ":" + str(variant.POS) + ":" + id
 
-def generate_removal_status(vcf_file: str, get_identifier: Callable, remove_patch_regions: bool = True) -> dict:
-    'Generate hash against variant about its removal status'
-    
-    removal_status = {}
+def is_patch_region(chr: str) -> bool:
+    'Check if chromosome is a patch region'
+
+    return ("CTG" in chr) or ("PATCH" in chr) or ("TEST" in chr)
+
+class HashArray():
+    '''
+    Growable array of 64-bit hashes. It is kept in memory up to max_memory bytes, after which it
+    is moved to a memory-mapped file in temp_dir.
+    '''
+
+    def __init__(self, max_memory: int, temp_dir: str = None):
+        self._max_memory = max_memory
+        self._temp_dir = temp_dir
+        self._file = None
+        self._array = np.empty(1 << 16, dtype=np.int64)
+        self._size = 0
+
+    def extend(self, values: list) -> None:
+        size = self._size + len(values)
+        if size > len(self._array):
+            self._resize(max(size, len(self._array) * 2))
+
+        self._array[self._size:size] = values
+        self._size = size
+
+    def _resize(self, capacity: int) -> None:
+        if capacity * 8 <= self._max_memory:
+            array = np.empty(capacity, dtype=np.int64)
+            array[:self._size] = self._array[:self._size]
+            self._array = array
+            return
+
+        if self._file is None:
+            print(f"[INFO] More than {self._max_memory} bytes of id hashes, moving them to disk")
+            self._file = tempfile.NamedTemporaryFile(dir = self._temp_dir, suffix = ".hashes")
+            self._file.truncate(capacity * 8)
+            array = np.memmap(self._file, dtype=np.int64, mode="r+", shape=(capacity, ))
+            array[:self._size] = self._array[:self._size]
+        else:
+            # file keeps the values, only the mapping needs to grow
+            self._array.flush()
+            self._file.truncate(capacity * 8)
+            array = np.memmap(self._file, dtype=np.int64, mode="r+", shape=(capacity, ))
+        self._array = array
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._array[:self._size]
+
+    def close(self) -> None:
+        self._array = None
+        if self._file is not None:
+            self._file.close()
+
+def get_duplicate_hashes(hashes: np.ndarray, chunk_size: int = 1 << 24) -> set:
+    'Sort hashes in place and get the ones that occur more than once'
+
+    hashes.sort()
+    duplicates = set()
+    # chunks overlap by one so that duplicates across chunk boundary are found
+    for start in range(0, len(hashes) - 1, chunk_size):
+        chunk = hashes[start:start + chunk_size + 1]
+        duplicates.update(chunk[1:][chunk[1:] == chunk[:-1]].tolist())
+
+    return duplicates
+
+def get_duplicate_ids(vcf_file: str, max_memory: int, temp_dir: str = None, format_id: Callable = None) -> set:
+    '''
+    Get variant ids used by more than one record anywhere in the VCF. A 64-bit hash of every id
+    is collected (8 bytes per record, instead of a dict entry per id) and sorted to find the
+    duplicated hashes. Only ids with a duplicated hash are then counted as strings, so that a hash
+    collision never removes a variant. If given, format_id is applied to the ids first.
+    '''
+
+    format_id = format_id or (lambda x : x)
+
+    hash_array = HashArray(max_memory, temp_dir)
+    hashes = []
     input_vcf = VCF(vcf_file)
     for variant in input_vcf:
-        variant_identifier = get_identifier(variant)
-        # Order is important here. Check for uniqueness is based on existance - we should check it first
-        removal_status[variant_identifier] = variant_identifier in removal_status
-        if remove_patch_regions:
-            chr = variant.CHROM
-            removal_status[variant_identifier] = removal_status[variant_identifier] or ("CTG" in chr) or ("PATCH" in chr) or ("TEST" in chr)
+        hashes.append(hash(format_id(variant.ID)))
+        if len(hashes) == 1 << 20:
+            hash_array.extend(hashes)
+            hashes = []
+    hash_array.extend(hashes)
     input_vcf.close()
-    
-    return removal_status
+
+    duplicate_hashes = get_duplicate_hashes(hash_array.values)
+    hash_array.close()
+    if not duplicate_hashes:
+        return set()
+
+    # exact check of the few ids that share a hash
+    id_counts = {}
+    input_vcf = VCF(vcf_file)
+    for variant in input_vcf:
+        id = format_id(variant.ID)
+        if hash(id) in duplicate_hashes:
+            id_counts[id] = id_counts.get(id, 0) + 1
+    input_vcf.close()
+
+    return {id for (id, count) in id_counts.items() if count > 1}
+
+def get_position_groups(variants):
+    'Group consecutive variant records at the same position, the VCF must be sorted'
+
+    group = []
+    seen_chroms = set()
+    for variant in variants:
+        if group and (variant.CHROM != group[0].CHROM or variant.POS != group[0].POS):
+            if variant.CHROM != group[0].CHROM:
+                seen_chroms.add(group[0].CHROM)
+            if variant.CHROM in seen_chroms or \
+                (variant.CHROM == group[0].CHROM and variant.POS < group[0].POS):
+                print(f"[ERROR] VCF is not sorted at {variant.CHROM}:{variant.POS}, cannot remove duplicates by position. Exiting ...")
+                exit(1)
+
+            yield group
+            group = []
+        group.append(variant)
+
+    if group:
+        yield group
+
+def get_unique_variants(variants):
+    '''
+    Stream variant records that are not removed when positioned identifier is used. Records with
+    the same positioned identifier can only be at the same position, so only one position is
+    kept in memory at a time instead of an entry for every record of the VCF.
+    '''
+
+    for group in get_position_groups(variants):
+        if len(group) == 1:
+            yield group[0]
+            continue
+
+        identifiers = [get_positioned_id(variant) for variant in group]
+        counts = {}
+        for variant_identifier in identifiers:
+            counts[variant_identifier] = counts.get(variant_identifier, 0) + 1
+
+        for variant, variant_identifier in zip(group, identifiers):
+            if counts[variant_identifier] == 1:
+                yield variant
 
 def parse_chrom_sizes(chrom_sizes: str) -> list:
     'Parse chrom_sizes file to get list of valid chromosomes'
@@ -71,10 +211,38 @@ def parse_chrom_sizes(chrom_sizes: str) -> list:
 
     return valid_chroms
 
+def read_valid_chroms(chrom_sizes: str, genome_lookup: str = None):
+    'Set of valid chromosomes, from the genome lookup if it exists'
+    if genome_lookup is not None and os.path.isfile(genome_lookup):
+        return GenomeLookup(genome_lookup).chromosomes
+
+    return set(parse_chrom_sizes(chrom_sizes))
+
+def get_kept_variants(input_vcf: VCF, input_file: str, is_kept_chrom: Callable):
+    '''
+    Stream variant records of the chromosomes that are kept. If the VCF is indexed the decision is
+    made once per chromosome from the index and removed chromosomes are not read at all,
+    otherwise every record is checked.
+    '''
+
+    chroms = list(get_contig_offsets(input_file))
+    if not chroms:
+        for variant in input_vcf:
+            if is_kept_chrom(variant.CHROM):
+                yield variant
+        return
+
+    for chrom in chroms:
+        if not is_kept_chrom(chrom):
+            continue
+
+        for variant in input_vcf(chrom):
+            yield variant
+
 def main(args = None):
     description = '''
     Removes variant based on uniqueness and sequence region. 
-        1) By default, variant is discarded if the positioned identifier (chrom:position:id) is same for multiple variant record. The assumption is that the variants will be multi-allelic if needed be instead of bi-allelic in the source VCF file.
+        1) By default, variant is discarded if the positioned identifier (chrom:position:id) is same for multiple variant record. The assumption is that the variants will be multi-allelic if needed be instead of bi-allelic in the source VCF file. The VCF must be sorted, it is processed one position at a time.
         2) Optionally, we can ask to remove variant with same ids even if they are in different location (using the remove_nonunique_ids argument).
         3) When removed, all the variant record is removed. For example, if there is two variant record with same positioned id then both of them will be removed.
     '''
@@ -85,36 +253,41 @@ def main(args = None):
     remove_nonunique_ids = args.remove_nonunique_ids
     remove_patch_regions = args.remove_patch_regions
     output_file = args.output_file or input_file.replace("renamed", "processed")
+    threads = args.threads
+    index_type = args.index_type
+    hash_memory = args.hash_memory * 1024 * 1024
+    temp_dir = args.temp_dir or os.path.dirname(os.path.abspath(output_file))
     
-    if remove_nonunique_ids:
-        get_identifier = get_id
-    else:
-        get_identifier = get_positioned_id
-        
-    removal_status = generate_removal_status(input_file, get_identifier, remove_patch_regions)
-    
-    check_chrom = False
+    valid_chroms = None
     if chrom_sizes is not None and os.path.isfile(chrom_sizes):
-        valid_chroms = parse_chrom_sizes(chrom_sizes)
+        valid_chroms = read_valid_chroms(chrom_sizes, args.genome_lookup)
         if len(valid_chroms) == 0:
             print(f"[WARN] {chrom_sizes} do not have any chromsome length, should be checked.")
-        check_chrom = True
+
+    def is_kept_chrom(chrom: str) -> bool:
+        if remove_patch_regions and is_patch_region(chrom):
+            return False
+        return valid_chroms is None or chrom in valid_chroms
         
-    # Remove variant based on removal status
     input_vcf = VCF(input_file)
-    output_vcf_writer = Writer(output_file, input_vcf, mode="wz")
-    for variant in input_vcf:
-        
-        variant_identifier = get_identifier(variant)
-        if removal_status[variant_identifier]:
-            continue
+    variants = get_kept_variants(input_vcf, input_file, is_kept_chrom)
+    if remove_nonunique_ids:
+        # same id can be anywhere in the file, also in removed chromosomes - need to read it fully first
+        duplicate_ids = get_duplicate_ids(input_file, hash_memory, temp_dir)
+        variants = (variant for variant in variants if get_id(variant) not in duplicate_ids)
+    else:
+        variants = get_unique_variants(variants)
 
-        if check_chrom and variant.CHROM not in valid_chroms:
-            continue
-                
-        output_vcf_writer.write_record(variant)
+    index = VcfIndex(index_type) if index_type is not None else None
+    output_vcf_writer = BgzfWriter(output_file, threads = threads, index = index)
+    output_vcf_writer.write(input_vcf.raw_header)
+    for variant in variants:
+        output_vcf_writer.write(str(variant))
     output_vcf_writer.close()
     input_vcf.close()
+
+    if index is not None:
+        index.write(f"{output_file}.{index_type}")
     
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+
+from helper import BgzfWriter, VcfIndex, read_vcf_index, parse_vcf_index, read_vcf_header, read_vcf_records
+from generate_vep_config import get_shard_config
+
+MANIFEST_FILE = "shards.tsv"
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="input_file", type=str, help="Input VCF file, must be indexed")
+    parser.add_argument(dest="vep_config", type=str, help="VEP config of the genome")
+    parser.add_argument('--shard_dir', dest="shard_dir", type=str, help="directory to write the shards in (default: input file directory)")
+    parser.add_argument('--shard_size', dest="shard_size", type=int, default=10000000, help="contigs with fewer records are put together up to this many records (default: 10000000)")
+    parser.add_argument('--index_type', dest="index_type", type=str, choices=["tbi", "csi"], default="tbi", help="index type of the shard VCFs (default: tbi)")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to compress the shards")
+
+    return parser.parse_args(args)
+
+def get_shards(contigs: list, shard_size: int) -> list:
+    '''
+    Group (contig, number of records) into shards, in input order. A contig with at least
+    shard_size records is a shard on its own, smaller ones are put together up to shard_size.
+    '''
+    shards = []
+    shard = []
+    shard_records = 0
+    for (contig, n_records) in contigs:
+        if shard and shard_records + n_records > shard_size:
+            shards.append(shard)
+            (shard, shard_records) = ([], 0)
+        shard.append(contig)
+        shard_records += n_records
+
+    if shard:
+        shards.append(shard)
+
+    return shards
+
+def main(args = None):
+    description = '''
+    Split an indexed VCF into shards of whole contigs and write a VEP config for each shard (see generate_vep_config.get_shard_config).
+    The shards are listed in order in <shard_dir>/shards.tsv, one line per shard - VCF, index and VEP config - so that the VEP outputs can be merged back in input order.
+    '''
+    args = parse_args(args, description)
+
+    input_file = args.input_file
+    shard_dir = os.path.abspath(args.shard_dir or os.path.dirname(input_file))
+    index_type = args.index_type
+    # the VEP output is named after the first part of the input file name
+    prefix = os.path.basename(input_file).split(".")[0]
+
+    index = read_vcf_index(input_file)
+    indexed_contigs = parse_vcf_index(index) if index is not None else None
+    if indexed_contigs is None or any(contig is None for (contig, _, _) in indexed_contigs):
+        print(f"[ERROR] Cannot get contigs from the index of {input_file}. Exiting ...")
+        exit(1)
+
+    contig_offsets = {contig: first_offset for (contig, first_offset, _) in indexed_contigs if first_offset is not None}
+    contigs = [(contig, n_records) for (contig, first_offset, n_records) in indexed_contigs if first_offset is not None]
+    # an input without records is still annotated once, as without shards
+    shards = get_shards(contigs, args.shard_size) or [[]]
+
+    with open(args.vep_config, "r") as file:
+        vep_config_text = file.read()
+    header = read_vcf_header(input_file)
+
+    os.makedirs(shard_dir, exist_ok = True)
+    manifest = []
+    for (idx, shard) in enumerate(shards):
+        shard_file = os.path.join(shard_dir, f"{prefix}_shard{idx}.vcf.gz")
+        shard_index_file = f"{shard_file}.{index_type}"
+        shard_config = os.path.join(shard_dir, f"{prefix}_shard{idx}.ini")
+
+        shard_index = VcfIndex(index_type)
+        with BgzfWriter(shard_file, threads = args.threads, index = shard_index) as o_file:
+            o_file.write(header)
+            for contig in shard:
+                for line in read_vcf_records(input_file, contig, contig_offsets):
+                    o_file.write(line)
+        if not shard_index.write(shard_index_file):
+            print(f"[ERROR] Could not index shard - {shard_file}. Exiting ...")
+            exit(1)
+
+        with open(shard_config, "w") as file:
+            file.write(get_shard_config(vep_config_text, shard))
+
+        manifest.append(f"{shard_file}\t{shard_index_file}\t{shard_config}\n")
+
+    with open(os.path.join(shard_dir, MANIFEST_FILE), "w") as file:
+        file.writelines(manifest)
+
+    print(f"[INFO] Split {input_file} into {len(shards)} shards")
+
+if __name__ == "__main__":
+    sys.exit(main())
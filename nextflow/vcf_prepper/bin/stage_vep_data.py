@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+import glob
+import time
+import shutil
+import subprocess
+
+from artifact_store import ArtifactStore
+
+# Staging of the data files a VEP config points to (cache, FASTA, plugin and custom files, mostly
+# on NFS) onto node-local scratch, run in the VEP task before VEP starts. The VEP config in the
+# task directory is rewritten to the staged copies, so the forked VEP workers do their random
+# tabix reads locally. Staged copies are kept in a store on the node (see artifact_store.py):
+#
+#     <stage_dir>/objects/<digest>/        a data file with its index files, or a genome cache
+#     <stage_dir>/objects/<digest>.json    key, size, last use and the tasks using it (refs)
+#
+# so the next task on the node - for the same or another genome - uses them without copying. A
+# task is a ref until it is released after VEP, or for REF_TTL if it never is (the task was
+# killed). Staged data not used by any task is removed, least recently used first, when the store
+# is larger than its maximum size or the scratch file system is full.
+
+# longer than a VEP task can run
+REF_TTL = 48 * 60 * 60
+
+# settings of the VEP config with files to stage
+CACHE_SETTINGS = ("cache", "dir_cache")
+FILE_SETTINGS = ("fasta", )
+ARGS_SETTINGS = ("plugin", "custom")
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="vep_configs", type=str, nargs="*", help="VEP configs in the task directory to rewrite with the staged files")
+    parser.add_argument('--stage_dir', dest="stage_dir", type=str, required = True, help="node-local directory to stage the files in")
+    parser.add_argument('--max_size', dest="max_size", type=float, required = False, help="GB of staged files to keep on the node")
+    parser.add_argument('--holder', dest="holder", type=str, required = False, help="id of the task using the staged files, default is the current directory")
+    parser.add_argument('--release', dest="release", action="store_true", help="release the files staged for the holder")
+
+    return parser.parse_args(args)
+
+class StagingCache(ArtifactStore):
+    '''
+    ArtifactStore whose stored objects are directories of staged data, used in place (VEP config
+    paths point into them). Refs are the holders (tasks) using a directory and when they staged it.
+    '''
+
+    def __init__(self, stage_dir: str, max_size: int = None, ref_ttl: int = REF_TTL):
+        super().__init__(stage_dir, max_size)
+        self.ref_ttl = ref_ttl
+
+    @staticmethod
+    def items_key(items: list) -> list:
+        'Key of [(source file or directory, path in the staged directory)] - source paths, sizes and mtimes'
+        key = ["stage"]
+        for (src, dest) in items:
+            if os.path.isdir(src):
+                files = [os.path.join(dir, file) for (dir, _, dir_files) in os.walk(src) for file in dir_files]
+                stats = [os.stat(file) for file in files]
+                key.append([os.path.realpath(src), dest, len(stats), sum(stat.st_size for stat in stats),
+                    max((stat.st_mtime_ns for stat in stats), default = 0)])
+            else:
+                stat = os.stat(src)
+                key.append([os.path.realpath(src), dest, stat.st_size, stat.st_mtime_ns])
+
+        return key
+
+    @staticmethod
+    def key_size(key: list) -> int:
+        return sum(item[-2] if len(item) == 5 else item[2] for item in key[1:])
+
+    def _remove_object(self, object_file: str) -> None:
+        shutil.rmtree(object_file)
+
+    def _has_room(self, total_size: int, reserve: int) -> bool:
+        return super()._has_room(total_size, reserve) and shutil.disk_usage(self.store_dir).free >= reserve
+
+    def _is_live(self, ref: dict) -> bool:
+        return time.time() - ref["time"] < self.ref_ttl
+
+    def _copy(self, items: list, object_dir: str) -> None:
+        temp_dir = object_dir + ".new"
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+
+        for (src, dest) in items:
+            dest = os.path.join(temp_dir, dest)
+            os.makedirs(os.path.dirname(dest), exist_ok = True)
+            # a reflink if the scratch is on the same file system, else a copy
+            process = subprocess.run(["cp", "-R", "--reflink=auto", "--preserve=timestamps", src, dest],
+                stdout = subprocess.PIPE,
+                stderr = subprocess.PIPE
+            )
+            if process.returncode != 0:
+                shutil.rmtree(temp_dir, ignore_errors = True)
+                raise OSError(process.stderr.decode().strip())
+
+        if os.path.exists(object_dir):
+            shutil.rmtree(object_dir)
+        os.replace(temp_dir, object_dir)
+
+    def stage(self, items: list, holder: str) -> str:
+        '''
+        Copy items [(source file or directory, path in the staged directory)] into a staged
+        directory, or reuse it if it is already staged, and add holder to its refs. Returns the
+        staged directory, None if there is no room for it on the node.
+        '''
+        key = self.items_key(items)
+        object_dir = self._object_file(key)
+
+        lock = self._lock(object_dir + ".lock")
+        try:
+            meta = self._read_meta(object_dir)
+            if meta is None or meta["key"] != key or not os.path.isdir(object_dir):
+                size = self.key_size(key)
+                self.collect_garbage(reserve = size)
+                if not self._has_room(self._total_size(), size):
+                    print(f"[WARNING] No room to stage {items[0][0]} ({size} bytes) in {self.store_dir}")
+                    return None
+
+                self._copy(items, object_dir)
+                meta = {"key": key, "size": size, "refs": []}
+                print(f"[INFO] Staged {items[0][0]} in {object_dir}")
+            else:
+                print(f"[INFO] Using staged {items[0][0]}")
+
+            refs = [ref for ref in meta["refs"] if ref["holder"] != holder and self._is_live(ref)]
+            refs.append({"holder": holder, "time": time.time()})
+            meta["refs"] = refs
+            meta["last_used"] = time.time()
+            self._write_meta(object_dir, meta)
+        finally:
+            lock.close()
+
+        return object_dir
+
+    def _total_size(self) -> int:
+        total_size = 0
+        for file in os.listdir(self.objects_dir):
+            if file.endswith(".json"):
+                meta = self._read_meta(os.path.join(self.objects_dir, file[:-len(".json")]))
+                total_size += meta["size"] if meta is not None else 0
+
+        return total_size
+
+    def release(self, holder: str) -> None:
+        'Remove holder from the refs of all staged directories'
+        for file in os.listdir(self.objects_dir):
+            if not file.endswith(".json"):
+                continue
+
+            object_dir = os.path.join(self.objects_dir, file[:-len(".json")])
+            meta = self._read_meta(object_dir)
+            if meta is None or not any(ref["holder"] == holder for ref in meta["refs"]):
+                continue
+
+            lock = self._lock(object_dir + ".lock")
+            try:
+                meta = self._read_meta(object_dir)
+                if meta is not None and any(ref["holder"] == holder for ref in meta["refs"]):
+                    meta["refs"] = [ref for ref in meta["refs"] if ref["holder"] != holder]
+                    self._write_meta(object_dir, meta)
+            finally:
+                lock.close()
+
+        if self.max_size is not None:
+            self.collect_garbage()
+
+def get_file_items(path: str) -> list:
+    '''
+    Items to stage for a data file - the file and its index files (<file>.tbi, .csi, .fai, .gzi ...).
+    A path with ##CHR## gives the files of all chromosomes.
+    '''
+    pattern = glob.escape(path).replace("##CHR##", "*")
+    files = sorted(glob.glob(pattern)) if "##CHR##" in path else [path]
+
+    items = []
+    for file in files:
+        dir = os.path.dirname(file)
+        name = os.path.basename(file)
+        items.append((file, name))
+        items += [(os.path.join(dir, sibling), sibling) for sibling in sorted(os.listdir(dir)) if sibling.startswith(name + ".")]
+
+    return items
+
+def stage_vep_config(vep_config_text: str, cache: StagingCache, holder: str) -> str:
+    '''
+    Stage the data files of a VEP config and return the config with their staged paths. Files that
+    cannot be staged keep their path.
+    '''
+    settings = {}
+    for line in vep_config_text.splitlines():
+        (name, _, value) = line.strip().partition(" ")
+        settings[name] = value.strip()
+
+    def stage_file(path: str) -> str:
+        if not os.path.isabs(path) or not (os.path.isfile(path) or "##CHR##" in path):
+            return path
+        items = get_file_items(path)
+        if not items:
+            return path
+        object_dir = cache.stage(items, holder)
+
+        return os.path.join(object_dir, os.path.basename(path)) if object_dir is not None else path
+
+    staged_lines = []
+    for line in vep_config_text.splitlines(keepends = True):
+        (name, _, value) = line.strip().partition(" ")
+        value = value.strip()
+        try:
+            if name in CACHE_SETTINGS and all(settings.get(setting) for setting in ("species", "assembly", "cache_version")):
+                # VEP reads <cache>/<species>/<cache_version>_<assembly>
+                genome_dir = os.path.join(settings["species"], f"{settings['cache_version']}_{settings['assembly']}")
+                if os.path.isdir(os.path.join(value, genome_dir)):
+                    object_dir = cache.stage([(os.path.join(value, genome_dir), genome_dir)], holder)
+                    if object_dir is not None:
+                        line = f"{name} {object_dir}\n"
+            elif name in FILE_SETTINGS:
+                line = f"{name} {stage_file(value)}\n"
+            elif name in ARGS_SETTINGS:
+                # comma separated arguments, files given alone or as key=file
+                args = []
+                for arg in value.split(","):
+                    (key, equal, path) = arg.rpartition("=")
+                    args.append(key + equal + stage_file(path))
+                line = f"{name} {','.join(args)}\n"
+        except OSError as e:
+            print(f"[WARNING] Could not stage files of '{line.strip()}' - {e}")
+
+        staged_lines.append(line)
+
+    return "".join(staged_lines)
+
+def main(args = None):
+    description = '''
+    Stage the data files of VEP configs onto node-local scratch and rewrite the configs to use them. Run in the VEP task
+    directory before VEP (the configs must be in it, they are replaced), and with --release after VEP.
+    Staged files are shared by the tasks on the node and removed least recently used first when they are not used.
+    '''
+    args = parse_args(args, description)
+
+    holder = args.holder or os.getcwd()
+    max_size = int(args.max_size * 1024 ** 3) if args.max_size is not None else None
+
+    # VEP runs with the data where it is if staging fails
+    try:
+        cache = StagingCache(args.stage_dir, max_size)
+        if args.release:
+            cache.release(holder)
+            return 0
+
+        for vep_config in args.vep_configs:
+            # the config is an input link to the genome config, which other tasks use
+            if os.path.dirname(os.path.abspath(vep_config)) != os.getcwd():
+                print(f"[WARNING] {vep_config} is not in the task directory, it will not be rewritten")
+                continue
+
+            with open(vep_config, "r") as file:
+                vep_config_text = file.read()
+            staged_text = stage_vep_config(vep_config_text, cache, holder)
+
+            temp_file = vep_config + ".staged"
+            with open(temp_file, "w") as file:
+                file.write(f"# staged in {args.stage_dir}\n")
+                file.write(staged_text)
+            os.replace(temp_file, vep_config)
+    except OSError as e:
+        print(f"[WARNING] Could not stage VEP data files in {args.stage_dir} - {e}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
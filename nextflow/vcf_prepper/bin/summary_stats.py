@@ -17,10 +17,16 @@
 import sys
 import os
 from cyvcf2 import VCF, Writer
-from Bio import bgzf
 import argparse
 import json
 import re
+import multiprocessing
+import shutil
+from operator import itemgetter
+
+from csq_schema import CsqSchema
+from helper import get_contig_offsets, read_vcf_records, BgzfWriter, VcfIndex, BGZF_EOF
+from track_bed import TrackBed
 
 HEADERS = [
     {'ID': 'RAF', 'Description': 'Allele frequencies from representative population', 'Type':'Float', 'Number': 'A'},
@@ -46,6 +52,24 @@ PER_VARIANT_FIELDS = {
 
 FREQUENCY_FIELD = "RAF"
 
+# consequences are counted per distinct (feature, consequences) pair, the other pairs of a feature
+# than its first are kept in these per allele sets, see CsqSummary._get_scratch
+CONSEQUENCE_PAIR_FIELDS = {
+    "transcipt_consequence": "transcipt_consequence_pairs",
+    "regulatory_consequence": "regulatory_consequence_pairs"
+}
+
+# CSQ fields read for every entry, the representative frequency fields are appended per species
+CSQ_FIELDS = ["Allele", "Consequence", "Feature", "Gene", "PHENOTYPES", "PUBMED", "VARIANT_CLASS"]
+CONSEQUENCE_IDX = CSQ_FIELDS.index("Consequence")
+VARIANT_CLASS_IDX = CSQ_FIELDS.index("VARIANT_CLASS")
+
+# in order of preference, as used to be picked by create_metadata_payload.py
+VARIANT_EXAMPLE_TYPES = ["rs699", "missense_variant", "any"]
+
+# variant metrics sidecar, written next to the output VCF and read by create_metadata_payload.py
+METRICS_FILE_NAME = "variation.stats.json"
+
 SKIP_CONSEQUENCE = [
     "downstream_gene_variant",
     "upstream_gene_variant",
@@ -63,6 +87,12 @@ def parse_args(args = None, description: bool = None):
     parser.add_argument(dest="input_file", type=str, help="input VCF file")
     parser.add_argument('-O', '--output_file', dest="output_file", type=str)
     parser.add_argument('--population_data_file', dest="population_data_file", type=str, help="A JSON file containing population information for all species.")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of worker processes, each worker process one chromosome at a time (requires tabix/CSI index)")
+    parser.add_argument('--bed_file', dest="bed_file", type=str, help="also write variant track bed file (unsorted) to this path, requires --rank_file")
+    parser.add_argument('--rank_file', dest="rank_file", type=str, help="consequence rank JSON file, as used by vcf_to_bed")
+    parser.add_argument('--metrics_file', dest="metrics_file", type=str, help=f"JSON file to write variant counts and an example variant to; Default is '{METRICS_FILE_NAME}' in the output file directory")
+    parser.add_argument('--engine', dest="engine", type=str, choices=["cyvcf2", "bytes"], default="cyvcf2", help="cyvcf2 - parse records through htslib, bytes - work on raw record lines; Default is 'cyvcf2'")
+    parser.add_argument('--index_type', dest="index_type", type=str, choices=["tbi", "csi"], help="index the output while writing it, only with bytes engine")
     
     return parser.parse_args(args)
 
@@ -91,21 +121,10 @@ def minimise_allele(ref: str, alts: list) -> str:
 
     return (ref, alts)
 
-def main(args = None):
-    args = parse_args(args)
-
-    species = args.species
-    assembly = args.assembly
-    input_file = os.path.realpath(args.input_file)
-    output_file = args.output_file or os.path.join(os.path.dirname(input_file), "UPDATED_SS_" + os.path.basename(input_file))
-    population_data_file = args.population_data_file or os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            "../assets/population_data.json"
-        )
-    
-    # get representative population and respective INFO fields
+def get_representative_population(population_data_file: str, species: str) -> tuple:
     with open(population_data_file, "r") as file:
         population_data = json.load(file)
+
     (population_name, freq_csq_fields, freq_info_display) = ("", [], "")
     for species_patt in population_data:
         if re.fullmatch(species_patt, species):
@@ -117,144 +136,180 @@ def main(args = None):
                     for file in population["files"]:
                         freq_csq_fields.append(file["short_name"] + "_" + file["representative_af_field"])
 
-    # add to header and write header to output vcf
-    if freq_info_display != "":
-        HEADERS[0]['Description'] = HEADERS[0]['Description'] + f" ({freq_info_display})"
-    
-    input_vcf = VCF(input_file)
+    return (population_name, freq_csq_fields, freq_info_display)
 
+def get_output_header(input_vcf: VCF, headers: list) -> str:
     use_input_vcf_for_h = True
-    for header in HEADERS:
+    for header in headers:
         h_id = header['ID']
         if input_vcf.contains(h_id) and not header_match(header, input_vcf.get_header_type(key=h_id)):
             use_input_vcf_for_h = False
 
     if use_input_vcf_for_h:
-        for header in HEADERS:
+        for header in headers:
             input_vcf.add_info_to_header(header)
 
-        output_vcf = Writer(output_file, input_vcf, mode="wz")
-    else:
-        h_vcf_file = "header.vcf"
-        raw_h = input_vcf.raw_header
-        header_hash = {info['ID']: info for info in HEADERS}
-
-        with open(h_vcf_file, "w") as file:
-            for line in raw_h.split("\n"):
-                for iid in header_hash:
-                    if f"ID={ iid }" in line:
-                        line = f"##INFO=<ID={ iid },Number={ header_hash[iid]['Number'] },Type={ header_hash[iid]['Type'] },Description=\"{ header_hash[iid]['Description'] }\">"
-                        break
-                file.write(line + "\n")
-
-        h_vcf = VCF(h_vcf_file)
-        output_vcf = Writer(output_file, h_vcf, mode="w")
-
-        h_vcf.close()
-        os.remove(h_vcf_file)
-
-    # parse csq header and get index of each field
-    csq_list = input_vcf.get_header_type("CSQ")['Description'].split("Format: ")[1].split("|")
-    csq_header_idx = {}
-    for index, value in enumerate(csq_list):
-        csq_header_idx[value] = index
-    
-    # iterate through the file
-    for variant in input_vcf:
-        # create minimalized allele order
-        (ref, allele_order) = minimise_allele(variant.REF, variant.ALT)
-
+        return input_vcf.raw_header
+
+    header_hash = {info['ID']: info for info in headers}
+    output_header = []
+    for line in input_vcf.raw_header.split("\n"):
+        for iid in header_hash:
+            if f"ID={ iid }" in line:
+                line = f"##INFO=<ID={ iid },Number={ header_hash[iid]['Number'] },Type={ header_hash[iid]['Type'] },Description=\"{ header_hash[iid]['Description'] }\">"
+                break
+        output_header.append(line)
+
+    return "\n".join(output_header)
+
+def create_output_vcf(output_file: str, header: str) -> Writer:
+    return Writer.from_string(output_file, header, mode="wz")
+
+class CsqSummary():
+    '''
+    Summary counts of the CSQ entries of a variant, independent of how the record is read and
+    written. summarise returns the INFO (key, value) pairs to add, in the order they are set.
+    '''
+
+    def __init__(self, csq_description: str, species: str, population_name: str = "", freq_csq_fields: list = None):
+        freq_csq_fields = freq_csq_fields or []
+        self._species = species
+        self._population_name = population_name
+        self._freq_csq_fields = freq_csq_fields
+
+        # parse csq header once and only project the fields we need
+        self._csq_schema = CsqSchema(csq_description)
+
+        self._af_csq_fields = [field for field in freq_csq_fields if self._csq_schema.has(field)]
+        (ac_csq_fields, an_csq_fields) = ([], [])
+        if freq_csq_fields and not self._af_csq_fields:
+            # try finding AC and AN INFO fields and calculate representative AF
+            for freq_csq_field in freq_csq_fields:
+                ac_csq_field = freq_csq_field.replace("AF", "AC")
+                an_csq_field = freq_csq_field.replace("AF", "AN")
+                if self._csq_schema.has(ac_csq_field) and self._csq_schema.has(an_csq_field):
+                    ac_csq_fields.append(ac_csq_field)
+                    an_csq_fields.append(an_csq_field)
+
+        self._csq_schema.set_fields(CSQ_FIELDS + self._af_csq_fields + ac_csq_fields + an_csq_fields)
+        self._has_phenotypes = self._csq_schema.has("PHENOTYPES")
+        self._has_pubmed = self._csq_schema.has("PUBMED")
+        self._no_ac_csq_fields = len(ac_csq_fields)
+
+        self._feature_types = {}
+        self._scratch = []
+
+    def _get_feature_types(self, consequences: str) -> tuple:
+        # if all consequence in the skipped list do not add that feature in the count
+        add_transcript_feature = False
+        add_regulatory_feature = False
+        for csq in consequences.split("&"):
+            if csq not in SKIP_CONSEQUENCE:
+                if csq.startswith("regulatory"):
+                    add_regulatory_feature = True
+                else:
+                    add_transcript_feature = True
+
+        self._feature_types[consequences] = (add_transcript_feature, add_regulatory_feature)
+        return (add_transcript_feature, add_regulatory_feature)
+
+    def _get_scratch(self, idx: int) -> dict:
+        # per allele sets are cleared and reused between variants. A feature mostly has a single
+        # consequences per allele, so consequences are a dict of feature to its first consequences
+        # and only the other pairs of a feature are built as tuples
+        if idx == len(self._scratch):
+            items = {item: ({} if item in CONSEQUENCE_PAIR_FIELDS else set()) for item in PER_ALLELE_FIELDS}
+            items.update({pair_field: set() for pair_field in CONSEQUENCE_PAIR_FIELDS.values()})
+            self._scratch.append(items)
+            return items
+
+        items = self._scratch[idx]
+        items.pop("frequency", None)
+        for item in PER_ALLELE_FIELDS:
+            items[item].clear()
+        for pair_field in CONSEQUENCE_PAIR_FIELDS.values():
+            items[pair_field].clear()
+
+        return items
+
+    @property
+    def csq_schema(self) -> CsqSchema:
+        return self._csq_schema
+
+    def parse(self, csqs: str) -> list:
+        return self._csq_schema.parse(csqs)
+
+    def summarise(self, csq_entries: list, allele_order: list) -> list:
         items_per_variant = {item: set() for item in PER_VARIANT_FIELDS}
         items_per_allele = {}
+        feature_types = self._feature_types
 
         # travers through each csq entry
-        csqs = variant.INFO["CSQ"]
-        for csq in csqs.split(","):
-            csq_values = csq.split("|")
-            
-            allele = csq_values[csq_header_idx["Allele"]]
-            if allele not in items_per_allele:
-                items_per_allele[allele] = {item: set() for item in PER_ALLELE_FIELDS}
-                
-            consequences = csq_values[csq_header_idx["Consequence"]]
-            feature_stable_id = csq_values[csq_header_idx["Feature"]]
-            
-            # if all consequence in the skipped list do not add that feature in the count
-            add_regulatory_feature = False
-            add_transcript_feature = False
-            for csq in consequences.split("&"):
-                if csq not in SKIP_CONSEQUENCE:
-                    if csq.startswith("regulatory"):
-                        add_regulatory_feature = True
-                    else:
-                        add_transcript_feature = True
-            
+        for csq_values in csq_entries:
+            (allele, consequences, feature_stable_id, gene, phenotypes, citations, variant_class, *freq_values) = csq_values
+
+            items = items_per_allele.get(allele)
+            if items is None:
+                items = items_per_allele[allele] = self._get_scratch(len(items_per_allele))
+
+            # consequence combinations are few, classify each only once
+            (add_transcript_feature, add_regulatory_feature) = \
+                feature_types.get(consequences) or self._get_feature_types(consequences)
+
+            # consequences are counted per (feature, consequences) pair without formatting a string
+            # for every entry, a tuple is only built for a feature with different consequences
             if add_transcript_feature:
                 # genes
-                gene = csq_values[csq_header_idx["Gene"]]               
-                items_per_allele[allele]["gene"].add(gene)
+                items["gene"].add(gene)
 
                 # transcipt consequences
-                items_per_allele[allele]["transcipt_consequence"].add(f"{feature_stable_id}:{consequences}")
+                if items["transcipt_consequence"].setdefault(feature_stable_id, consequences) != consequences:
+                    items["transcipt_consequence_pairs"].add((feature_stable_id, consequences))
 
             # regualtory consequences
             if add_regulatory_feature:
-                items_per_allele[allele]["regulatory_consequence"].add(f"{feature_stable_id}:{consequences}")
+                if items["regulatory_consequence"].setdefault(feature_stable_id, consequences) != consequences:
+                    items["regulatory_consequence_pairs"].add((feature_stable_id, consequences))
 
-            # phenotype
-            if "PHENOTYPES" in csq_header_idx:
-                phenotype_csq_idx = csq_header_idx["PHENOTYPES"]
-                phenotypes = csq_values[phenotype_csq_idx]
+            # phenotype - name+source+feature is already a unique key for the phenotype
+            if self._has_phenotypes and phenotypes:
                 for phenotype in phenotypes.split("&"):
-                    pheno_per_allele_fields = phenotype.split("+")
-                    if len(pheno_per_allele_fields) != 3:
+                    if phenotype.count("+") != 2:
                         continue
                     
-                    (name, source, feature) = pheno_per_allele_fields
-                    if feature.startswith("ENS"):
-                        items_per_allele[allele]["gene_phenotype"].add(f"{name}:{source}:{feature}")
+                    if phenotype.startswith("ENS", phenotype.rfind("+") + 1):
+                        items["gene_phenotype"].add(phenotype)
                     else:
-                        items_per_allele[allele]["variant_phenotype"].add(f"{name}:{source}:{feature}")
+                        items["variant_phenotype"].add(phenotype)
 
             # citations
-            if "PUBMED" in csq_header_idx:
-                pubmed_csq_idx = csq_header_idx["PUBMED"]
-                citations = csq_values[pubmed_csq_idx]
+            if self._has_pubmed and citations:
                 for citation in citations.split("&"):
                     if citation != "":
                         items_per_variant["citation"].add(citation)
 
             # frequency
-            if freq_csq_fields:
-                af_csq_idc = [csq_header_idx[freq_csq_field] for freq_csq_field in freq_csq_fields if freq_csq_field in csq_header_idx]
-
-                if af_csq_idc:
-                    frequencies = [csq_values[af_csq_idx] for af_csq_idx in af_csq_idc if csq_values[af_csq_idx]]
+            if self._freq_csq_fields:
+                if self._af_csq_fields:
+                    frequencies = [frequency for frequency in freq_values if frequency]
                 else:
-                    # try finding AC and AN INFO fields and calculate representative AF
-                    ac_csq_idc = [csq_header_idx.get(freq_csq_field.replace("AF", "AC")) for freq_csq_field in freq_csq_fields]
-                    an_csq_idc = [csq_header_idx.get(freq_csq_field.replace("AF", "AN")) for freq_csq_field in freq_csq_fields]
-
-                    if len(ac_csq_idc) !=  len(ac_csq_idc):
-                        print("[ERROR] Attempt to calculate frequency from AC and AN failed.")
-                        print(f"{ac_csq_idc} number of AC field compared to {an_csq_idc} number of AN fields in CSQ. Exiting...")
-                        exit(1)
-
                     frequencies = []
-                    for idx, _ in enumerate(ac_csq_idc):
-                        ac_csq_idx = ac_csq_idc[idx]
-                        an_csq_idx = an_csq_idc[idx]
+                    for idx in range(self._no_ac_csq_fields):
+                        ac = freq_values[idx]
+                        an = freq_values[self._no_ac_csq_fields + idx]
                         
-                        if csq_values[ac_csq_idx] and csq_values[an_csq_idx]:
-                            frequency = str(int(csq_values[ac_csq_idx]) / int(csq_values[an_csq_idx]))
+                        if ac and an:
+                            frequency = str(int(ac) / int(an))
                             frequencies.append(frequency)
 
                 if len(frequencies) > 1:
-                    print(f"[ERROR] More than 1 representative allele frequencies for {species} population - {population_name}. Exiting ...")
+                    print(f"[ERROR] More than 1 representative allele frequencies for {self._species} population - {self._population_name}. Exiting ...")
                     exit(1)
 
                 if len(frequencies) == 1:
-                    items_per_allele[allele]["frequency"] = frequencies[0]
+                    items["frequency"] = frequencies[0]
+
+        summary_info = []
 
         # create summary info for per allele fields
         for field in PER_ALLELE_FIELDS:
@@ -262,11 +317,13 @@ def main(args = None):
             for allele in allele_order:
                 if allele in items_per_allele and field in items_per_allele[allele]:
                     field_len = len(items_per_allele[allele][field])
+                    if field in CONSEQUENCE_PAIR_FIELDS:
+                        field_len += len(items_per_allele[allele][CONSEQUENCE_PAIR_FIELDS[field]])
                     if field_len > 0:
                         field_nums.append(str(field_len)) 
 
             if field_nums:
-                variant.INFO[PER_ALLELE_FIELDS[field]] = ",".join(field_nums)
+                summary_info.append((PER_ALLELE_FIELDS[field], ",".join(field_nums)))
 
         # create summary info for frequency
         field_vals = []
@@ -276,19 +333,402 @@ def main(args = None):
             else:
                 field_vals.append(".")
 
-            if not all(freq == "." for freq in field_vals):
-                variant.INFO[FREQUENCY_FIELD] = ",".join(field_vals)
+        if not all(freq == "." for freq in field_vals):
+            summary_info.append((FREQUENCY_FIELD, ",".join(field_vals)))
 
         # create summary info for per variant fields
         for field in PER_VARIANT_FIELDS:
             field_len = len(items_per_variant[field])
             if field_len > 0:
-                variant.INFO[PER_VARIANT_FIELDS[field]] = str(field_len) 
+                summary_info.append((PER_VARIANT_FIELDS[field], str(field_len)))
+
+        return summary_info
+
+class VariantMetrics():
+    '''
+    Variant counts and an example variant, collected while the VCF is summarised so that no
+    later step has to scan the VCF again for them.
+    '''
+
+    def __init__(self, csq_schema: CsqSchema, species: str):
+        self._is_human = species.startswith("homo_sapiens")
+        self._get_consequence = itemgetter(CONSEQUENCE_IDX)
+        self._get_phenotypes = itemgetter(CSQ_FIELDS.index("PHENOTYPES")) if csq_schema.has("PHENOTYPES") else None
+        self._get_citations = itemgetter(CSQ_FIELDS.index("PUBMED")) if csq_schema.has("PUBMED") else None
+
+        self._variant_count = 0
+        self._phenotype_variant_count = 0 if self._get_phenotypes else None
+        self._citation_variant_count = 0 if self._get_citations else None
+        self._chromosome_variant_count = {}
+        self._variant_examples = {example_type: None for example_type in VARIANT_EXAMPLE_TYPES}
+        self._first_chrom = None
+
+    def add(self, chrom: str, pos: int, id: str, ref: str, csq_entries: list) -> None:
+        self._variant_count += 1
+        self._chromosome_variant_count[chrom] = self._chromosome_variant_count.get(chrom, 0) + 1
+
+        if self._get_phenotypes and any(map(self._get_phenotypes, csq_entries)):
+            self._phenotype_variant_count += 1
+        if self._get_citations and any(map(self._get_citations, csq_entries)):
+            self._citation_variant_count += 1
+
+        variant_examples = self._variant_examples
+        # if human, rs699 in 400kbp range
+        if self._is_human and id == "rs699" and chrom == "1" and 230500000 <= pos <= 230900000:
+            variant_examples["rs699"] = f"{chrom}:{pos}:{id}"
+
+        # a missense_variant
+        if variant_examples["missense_variant"] is None and \
+            "missense_variant" in map(self._get_consequence, csq_entries):
+            variant_examples["missense_variant"] = f"{chrom}:{pos}:{id}"
+
+        # some random variant from the first chromosome
+        if variant_examples["any"] is None:
+            if self._first_chrom is None:
+                self._first_chrom = chrom
+            if chrom == self._first_chrom and pos + len(ref) > 1000:
+                variant_examples["any"] = f"{chrom}:{pos}:{id}"
+
+    def to_dict(self) -> dict:
+        return {
+            "variant_count": self._variant_count,
+            "phenotype_variant_count": self._phenotype_variant_count,
+            "citation_variant_count": self._citation_variant_count,
+            "chromosome_variant_count": self._chromosome_variant_count,
+            "variant_example": get_variant_example(self._variant_examples),
+            "variant_examples": self._variant_examples
+        }
+
+def get_variant_example(variant_examples: dict) -> str:
+    for example_type in VARIANT_EXAMPLE_TYPES:
+        if variant_examples[example_type] is not None:
+            return variant_examples[example_type]
+
+    return None
+
+def merge_metrics(metrics_list: list) -> dict:
+    '''
+    Merge metrics of output segments, must be given in the order of the segments.
+    '''
+    metrics = {
+        "variant_count": 0,
+        "phenotype_variant_count": 0 if metrics_list[0]["phenotype_variant_count"] is not None else None,
+        "citation_variant_count": 0 if metrics_list[0]["citation_variant_count"] is not None else None,
+        "chromosome_variant_count": {},
+        "variant_example": None,
+        "variant_examples": {example_type: None for example_type in VARIANT_EXAMPLE_TYPES}
+    }
+
+    for segment_metrics in metrics_list:
+        metrics["variant_count"] += segment_metrics["variant_count"]
+        for count_type in ["phenotype_variant_count", "citation_variant_count"]:
+            if metrics[count_type] is not None:
+                metrics[count_type] += segment_metrics[count_type]
+        metrics["chromosome_variant_count"].update(segment_metrics["chromosome_variant_count"])
+
+        for example_type in VARIANT_EXAMPLE_TYPES:
+            if metrics["variant_examples"][example_type] is None:
+                metrics["variant_examples"][example_type] = segment_metrics["variant_examples"][example_type]
+
+    metrics["variant_example"] = get_variant_example(metrics["variant_examples"])
+
+    return metrics
+
+def create_track_bed(csq_schema: CsqSchema, bed_file: str, rank_file: str) -> TrackBed:
+    if bed_file is None:
+        return None
+
+    if not csq_schema.has("VARIANT_CLASS"):
+        print("[ERROR] VARIANT_CLASS not found in CSQ header, cannot create track bed. Exiting ...")
+        exit(1)
+
+    return TrackBed(bed_file, rank_file)
+
+def summarise_vcf(
+        input_file: str,
+        output_file: str,
+        species: str,
+        headers: list,
+        population_name: str = "",
+        freq_csq_fields: list = None,
+        region: str = None,
+        bed_file: str = None,
+        rank_file: str = None,
+        metrics: bool = False,
+        index_type: str = None
+    ) -> tuple:
+    input_vcf = VCF(input_file)
+    output_vcf = create_output_vcf(output_file, get_output_header(input_vcf, headers))
+
+    csq_summary = CsqSummary(input_vcf.get_header_type("CSQ")['Description'], species, population_name, freq_csq_fields)
+    track_bed = create_track_bed(csq_summary.csq_schema, bed_file, rank_file)
+    variant_metrics = VariantMetrics(csq_summary.csq_schema, species) if metrics else None
+    
+    # iterate through the file, or only the given region
+    variants = input_vcf(region) if region is not None else input_vcf
+    for variant in variants:
+        # create minimalized allele order
+        (ref, allele_order) = minimise_allele(variant.REF, variant.ALT)
+
+        csq_entries = csq_summary.parse(variant.INFO["CSQ"])
+        for (key, value) in csq_summary.summarise(csq_entries, allele_order):
+            variant.INFO[key] = value
 
         output_vcf.write_record(variant)
+
+        if track_bed is not None:
+            ids = variant.ID.split(";") if variant.ID is not None else []
+            track_bed.add(variant.CHROM, variant.POS, ids, variant.REF, variant.ALT, [entry[CONSEQUENCE_IDX] for entry in csq_entries], csq_entries[0][VARIANT_CLASS_IDX])
+        if variant_metrics is not None:
+            variant_metrics.add(variant.CHROM, variant.POS, variant.ID or ".", variant.REF, csq_entries)
         
     input_vcf.close()
     output_vcf.close()
+    if track_bed is not None:
+        track_bed.close()
+
+    # htslib writer cannot give the record offsets, the output needs to be indexed afterwards
+    return (variant_metrics.to_dict() if variant_metrics is not None else None, None)
+
+def create_output_bgzf(output_file: str, header: str, index: VcfIndex = None) -> BgzfWriter:
+    output_bgzf = BgzfWriter(output_file, index = index)
+    output_bgzf.write(header.encode())
+    # header in its own blocks so that segments can be merged as in the cyvcf2 engine
+    output_bgzf.flush()
+
+    return output_bgzf
+
+def update_info(info: bytes, summary_info: list, replace: bool = False) -> bytes:
+    if not summary_info:
+        return info
+
+    if info == b".":
+        info = b""
+        
+    if replace:
+        # input already had summary fields, update them in place as htslib does
+        info_items = info.split(b";") if info else []
+        info_keys = [item.split(b"=", 1)[0] for item in info_items]
+        for (key, value) in summary_info:
+            key = key.encode()
+            item = key + b"=" + value.encode()
+            if key in info_keys:
+                info_items[info_keys.index(key)] = item
+            else:
+                info_items.append(item)
+                info_keys.append(key)
+
+        return b";".join(info_items)
+
+    new_info = ";".join([f"{key}={value}" for (key, value) in summary_info]).encode()
+
+    return (info + b";" + new_info) if info else new_info
+
+def summarise_vcf_bytes(
+        input_file: str,
+        output_file: str,
+        species: str,
+        headers: list,
+        population_name: str = "",
+        freq_csq_fields: list = None,
+        region: str = None,
+        bed_file: str = None,
+        rank_file: str = None,
+        metrics: bool = False,
+        index_type: str = None
+    ) -> tuple:
+    '''
+    Same as summarise_vcf but works on the raw record lines instead of cyvcf2 Variant objects.
+    Only the INFO column is touched, other columns are written back as they were read. The
+    output is also indexed while it is written if index_type is given.
+    '''
+    input_vcf = VCF(input_file)
+    index = VcfIndex(index_type) if index_type is not None else None
+    output_bgzf = create_output_bgzf(output_file, get_output_header(input_vcf, headers), index)
+
+    csq_summary = CsqSummary(input_vcf.get_header_type("CSQ")['Description'], species, population_name, freq_csq_fields)
+    replace_info = any(input_vcf.contains(header['ID']) for header in headers)
+    track_bed = create_track_bed(csq_summary.csq_schema, bed_file, rank_file)
+    variant_metrics = VariantMetrics(csq_summary.csq_schema, species) if metrics else None
+    input_vcf.close()
+
+    # write lines in batches, the writer has a per call overhead
+    batch = []
+    for line in read_vcf_records(input_file, region):
+        fields = line.rstrip(b"\n").split(b"\t", 8)
+        info = fields[7]
+
+        if info.startswith(b"CSQ="):
+            csq_start = 4
+        else:
+            csq_start = info.find(b";CSQ=") + 5
+            if csq_start == 4:
+                print(f"[ERROR] No CSQ found for variant - {fields[2].decode()} at {fields[0].decode()}:{fields[1].decode()}. Exiting ...")
+                exit(1)
+        csq_end = info.find(b";", csq_start)
+        csqs = info[csq_start:] if csq_end == -1 else info[csq_start:csq_end]
+
+        # create minimalized allele order
+        ref = fields[3].decode()
+        alts = fields[4].decode()
+        alts = alts.split(",") if alts != "." else []
+        (_, allele_order) = minimise_allele(ref, alts)
+
+        csq_entries = csq_summary.parse(csqs.decode())
+        summary_info = csq_summary.summarise(csq_entries, allele_order)
+        fields[7] = update_info(info, summary_info, replace_info)
+
+        if track_bed is not None or variant_metrics is not None:
+            (chrom, pos, id) = (fields[0].decode(), int(fields[1]), fields[2].decode())
+            if track_bed is not None:
+                ids = id.split(";") if id != "." else []
+                track_bed.add(chrom, pos, ids, ref, alts, [entry[CONSEQUENCE_IDX] for entry in csq_entries], csq_entries[0][VARIANT_CLASS_IDX])
+            if variant_metrics is not None:
+                variant_metrics.add(chrom, pos, id, ref, csq_entries)
+
+        batch.append(b"\t".join(fields) + b"\n")
+        if len(batch) == 1000:
+            output_bgzf.write(b"".join(batch))
+            batch = []
+
+    output_bgzf.write(b"".join(batch))
+    output_bgzf.close()
+    if track_bed is not None:
+        track_bed.close()
+
+    return (variant_metrics.to_dict() if variant_metrics is not None else None, index)
+
+ENGINES = {
+    "cyvcf2": summarise_vcf,
+    "bytes": summarise_vcf_bytes
+}
+
+def get_regions(input_file: str) -> list:
+    return list(get_contig_offsets(input_file))
+
+def merge_segments(header_file: str, segment_files: list, output_file: str, segment_indexes: list = None) -> VcfIndex:
+    '''
+    Join output segments without recompression. Every segment starts with the same header as
+    header_file (both engines flush the header in its own BGZF blocks) and ends with the BGZF EOF
+    marker. We keep the header once, drop the EOF marker from every segment, and write it
+    once at the very end.
+
+    If segment indexes are given they are moved to where the segment lands in the output and
+    joined to an index of the output.
+    '''
+    with open(header_file, "rb") as file:
+        header = file.read()
+
+    eof = BGZF_EOF if header.endswith(BGZF_EOF) else b""
+    header = header[:len(header) - len(eof)]
+
+    index = None
+    with open(output_file, "wb") as o_file:
+        o_file.write(header)
+
+        for idx, segment_file in enumerate(segment_files):
+            if segment_indexes is not None and segment_indexes[idx] is not None:
+                # the segment header is dropped, so the segment records move by what was written before them
+                segment_indexes[idx].shift(o_file.tell() - len(header))
+                if index is None:
+                    index = segment_indexes[idx]
+                else:
+                    index.extend(segment_indexes[idx])
+
+            segment_size = os.path.getsize(segment_file) - len(eof)
+            with open(segment_file, "rb") as file:
+                if file.read(len(header)) != header:
+                    print(f"[ERROR] Header mismatch in output segment - {segment_file}. Exiting ...")
+                    exit(1)
+
+                remaining = segment_size - len(header)
+                while remaining > 0:
+                    chunk = file.read(min(remaining, 4 * 1024 * 1024))
+                    o_file.write(chunk)
+                    remaining -= len(chunk)
+
+        o_file.write(eof)
+
+    return index
+
+def main(args = None):
+    args = parse_args(args)
+
+    species = args.species
+    assembly = args.assembly
+    input_file = os.path.realpath(args.input_file)
+    output_file = args.output_file or os.path.join(os.path.dirname(input_file), "UPDATED_SS_" + os.path.basename(input_file))
+    population_data_file = args.population_data_file or os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "../assets/population_data.json"
+        )
+    threads = args.threads
+    summarise = ENGINES[args.engine]
+    bed_file = args.bed_file
+    rank_file = args.rank_file
+    metrics_file = args.metrics_file or os.path.join(os.path.dirname(output_file), METRICS_FILE_NAME)
+    index_type = args.index_type
+
+    if bed_file is not None and rank_file is None:
+        print("[ERROR] --rank_file is required to create track bed file. Exiting ...")
+        exit(1)
+    
+    # get representative population and respective INFO fields
+    (population_name, freq_csq_fields, freq_info_display) = get_representative_population(population_data_file, species)
+
+    # add to header
+    headers = [dict(header) for header in HEADERS]
+    if freq_info_display != "":
+        headers[0]['Description'] = headers[0]['Description'] + f" ({freq_info_display})"
+
+    regions = []
+    if threads > 1:
+        regions = get_regions(input_file)
+        if not regions:
+            print(f"[WARNING] Cannot get chromosomes from index of {input_file}, running with single thread.")
+
+    if not regions:
+        (metrics, index) = summarise(input_file, output_file, species, headers, population_name, freq_csq_fields,
+            bed_file = bed_file, rank_file = rank_file, metrics = True, index_type = index_type)
+    else:
+        # each worker process one chromosome and write its own segment
+        header_file = output_file + ".header.part"
+        input_vcf = VCF(input_file)
+        header = get_output_header(input_vcf, headers)
+        input_vcf.close()
+        if summarise is summarise_vcf_bytes:
+            create_output_bgzf(header_file, header).close()
+        else:
+            create_output_vcf(header_file, header).close()
+
+        segment_files = [f"{output_file}.{idx}.part" for idx, _ in enumerate(regions)]
+        bed_segment_files = [f"{bed_file}.{idx}.part" if bed_file is not None else None for idx, _ in enumerate(regions)]
+        with multiprocessing.Pool(min(threads, len(regions))) as pool:
+            segment_results = pool.starmap(summarise, [
+                (input_file, segment_file, species, headers, population_name, freq_csq_fields, region,
+                    bed_segment_file, rank_file, True, index_type)
+                for (segment_file, bed_segment_file, region) in zip(segment_files, bed_segment_files, regions)
+            ])
+        (segment_metrics, segment_indexes) = zip(*segment_results)
+
+        index = merge_segments(header_file, segment_files, output_file, list(segment_indexes))
+        for part_file in [header_file] + segment_files:
+            os.remove(part_file)
+
+        if bed_file is not None:
+            with open(bed_file, "wb") as o_file:
+                for bed_segment_file in bed_segment_files:
+                    with open(bed_segment_file, "rb") as file:
+                        shutil.copyfileobj(file, o_file)
+                    os.remove(bed_segment_file)
+
+        metrics = merge_metrics(list(segment_metrics))
+
+    with open(metrics_file, "w") as file:
+        json.dump(metrics, file, indent = 4)
+
+    if index is not None:
+        index.write(f"{output_file}.{index_type}")
     
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+# same as in src/rust/ensembl/vcf_to_bed
+VARIANT_GROUPS = {
+    "frameshift_variant": 1,
+    "inframe_deletion": 1,
+    "inframe_insertion": 1,
+    "missense_variant": 1,
+    "protein_altering_variant": 1,
+    "start_lost": 1,
+    "stop_gained": 1,
+    "stop_lost": 1,
+    "splice_acceptor_variant": 2,
+    "splice_donor_5th_base_variant": 2,
+    "splice_donor_region_variant": 2,
+    "splice_donor_variant": 2,
+    "splice_polypyrimidine_tract_variant": 2,
+    "splice_region_variant": 2,
+    "3_prime_UTR_variant": 3,
+    "5_prime_UTR_variant": 3,
+    "coding_sequence_variant": 3,
+    "incomplete_terminal_codon_variant": 3,
+    "intron_variant": 3,
+    "mature_miRNA_variant": 3,
+    "NMD_transcript_variant": 3,
+    "non_coding_transcript_exon_variant": 3,
+    "non_coding_transcript_variant": 3,
+    "start_retained_variant": 3,
+    "stop_retained_variant": 3,
+    "synonymous_variant": 3,
+    "feature_elongation": 3,
+    "feature_truncation": 3,
+    "transcript_ablation": 3,
+    "transcript_amplification": 3,
+    "transcript_fusion": 3,
+    "transcript_translocation": 3,
+    "regulatory_region_variant": 4,
+    "TF_binding_site_variant": 4,
+    "regulatory_region_ablation": 4,
+    "regulatory_region_amplification": 4,
+    "regulatory_region_fusion": 4,
+    "regulatory_region_translocation": 4,
+    "TFBS_ablation": 4,
+    "TFBS_amplification": 4,
+    "TFBS_fusion": 4,
+    "TFBS_translocation": 4,
+    "upstream_gene_variant": 5,
+    "downstream_gene_variant": 5,
+    "intergenic_variant": 5
+}
+
+def read_rank_file(rank_file: str) -> dict:
+    with open(rank_file, "r") as file:
+        ranks = json.load(file)
+
+    return {csq: int(rank) for (csq, rank) in ranks.items()}
+
+class BedLine():
+    def __init__(
+            self,
+            chromosome: str,
+            start: int,
+            end: int,
+            id: str,
+            variety: str,
+            reference: str,
+            alts: list,
+            group: int,
+            severity: str,
+            severity_rank: int
+        ):
+        self.chromosome = chromosome
+        self.start = start
+        self.end = end
+        self.id = id
+        self.variety = variety
+        self.reference = reference
+        # dict keeps the alts unique and in the order they were seen
+        self.alts = dict.fromkeys(alts)
+        self.group = group
+        self.severity = severity
+        self.severity_rank = severity_rank
+
+    def compatible(self, other: "BedLine") -> bool:
+        return self.chromosome == other.chromosome and \
+            self.id == other.id and \
+            self.start == other.start and \
+            self.reference == other.reference and \
+            self.variety == other.variety
+
+    def redundant(self, other: "BedLine") -> bool:
+        return self.id == other.id and self.variety != other.variety
+
+    def to_bed(self) -> str:
+        return f"{self.chromosome} {self.start} {self.end} {self.id} {self.variety} {self.reference} " + \
+            f"{','.join(self.alts)} {self.group} {self.severity}\n"
+
+class TrackBed():
+    '''
+    Python port of the vcf_to_bed tool, so that the track BED can be written from a VCF that
+    is already being read. Records must be added in VCF order; compatible records of the same
+    variant are merged and written when a new variant starts or on close.
+    '''
+
+    def __init__(self, output_file: str, rank_file: str):
+        self._severity = read_rank_file(rank_file)
+        self._file = open(output_file, "w")
+        self._line = None
+        self._chromosome = None
+
+    def add(self, chrom: str, pos: int, ids: list, ref: str, alts: list, consequences: list, variant_class: str) -> None:
+        # if csq is empty we won't have most severe consequence
+        if not consequences:
+            return
+
+        # the Rust tool ran per chromosome, so do not merge across chromosome boundary
+        if chrom != self._chromosome:
+            self.flush()
+            self._chromosome = chrom
+
+        # variety should always be same for each variant allele - VEP puts variant class at variant level
+        # if cannot be deduced the default value is - sequence_alteration
+        variety = variant_class
+
+        # if sequence_alteration we check if we can convert it to indel (the condition is that all the variant allele is eiter insertion or deletion or indel)
+        if variety == "sequence_alteration":
+            variety = "indel"
+            for alt in alts:
+                # note that we are not minimilizing the variant alleles here
+                if len(alt) == len(ref):
+                    calc_variety = "SNV" if len(alt) < 2 else "substitute"
+                    print(f"[WARNING] sequence_alteration variant ({','.join(ids)} {chrom}:{pos}) contain variant allele of type {calc_variety}")
+
+                    variety = "sequence_alteration"
+                    break
+
+        # calculate most severe consequence and variant group of that consequence
+        (variant_group, most_severe_csq, most_severe_csq_rank) = (0, "", 255)
+        for consequence in consequences:
+            for csq in consequence.split("&"):
+                csq_rank = self._severity.get(csq, 0)
+                if csq_rank < most_severe_csq_rank:
+                    variant_group = VARIANT_GROUPS.get(csq, 0)
+                    most_severe_csq = csq
+                    most_severe_csq_rank = csq_rank
+
+        # start position in bed is 0-indexed, end is exclusive
+        start = pos - 1
+        end = start + len(ref)
+        if variety == "insertion":
+            start += 1
+            end = start
+
+        for id in ids:
+            self._merge(BedLine(chrom, start, end, id, variety, ref, alts, variant_group, most_severe_csq, most_severe_csq_rank))
+
+    def _merge(self, line: BedLine) -> None:
+        current = self._line
+        if current is not None and line is not None:
+            if current.compatible(line):
+                current.alts.update(line.alts)
+                if line.severity_rank < current.severity_rank:
+                    if line.end > current.end:
+                        current.end = line.end
+                        current.variety = line.variety
+                    current.group = line.group
+                    current.severity = line.severity
+                    current.severity_rank = line.severity_rank
+                return
+
+            # if somehow with same rs id we have different variety of variant we skip the later ones
+            if current.redundant(line):
+                return
+
+        # if new line is not compatible with the current one it is a new variant
+        if current is not None and current.alts:
+            self._file.write(current.to_bed())
+
+        self._line = line
+
+    def flush(self) -> None:
+        self._merge(None)
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+
+from helper import get_record_count
+from generate_vep_config import tune_vep_runtime, get_tuned_config, DEFAULT_FORK
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument(dest="input_file", type=str, help="VEP input VCF file, must be indexed")
+    parser.add_argument(dest="vep_config", type=str, help="VEP config of the genome")
+    parser.add_argument('-O', '--output_config', dest="output_config", type=str, required = True, help="VEP config to write for the input file")
+    parser.add_argument('--cpus', dest="cpus", type=int, default=DEFAULT_FORK, help=f"CPUs of a VEP task (default: {DEFAULT_FORK})")
+    parser.add_argument('--memory', dest="memory", type=int, required = False, help="MB of memory of a VEP task, default - worked out from --bin_size as in nextflow.config")
+    parser.add_argument('--bin_size', dest="bin_size", type=int, required = False, help="number of variants per VEP task")
+
+    return parser.parse_args(args)
+
+def main(args = None):
+    description = '''
+    Write the VEP config of an input VCF - the VEP config of the genome with fork and buffer_size chosen from the number of records of the input (read from its index) and the VEP task resources (see generate_vep_config.tune_vep_runtime).
+    The sources of a genome share its VEP config, so each is tuned to its own size.
+    '''
+    args = parse_args(args, description)
+
+    with open(args.vep_config, "r") as file:
+        vep_config_text = file.read()
+
+    record_count = get_record_count(args.input_file)
+    if record_count is None:
+        print(f"[WARNING] Cannot get record count of input VCF - {args.input_file}, using VEP config of the genome as it is")
+    else:
+        tuning = tune_vep_runtime(record_count, args.cpus, args.memory, args.bin_size)
+        vep_config_text = get_tuned_config(vep_config_text, tuning)
+        print(f"[INFO] VEP runtime for {record_count} records - fork {tuning['fork']}, buffer_size {tuning['buffer_size']}")
+
+    temp_file = args.output_config + ".tmp"
+    with open(temp_file, "w") as file:
+        file.write(vep_config_text)
+    os.replace(temp_file, args.output_config)
+
+if __name__ == "__main__":
+    sys.exit(main())
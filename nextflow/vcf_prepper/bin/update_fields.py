@@ -15,12 +15,14 @@
 # limitations under the License.
 
 import sys
-from cyvcf2 import VCF, Writer
-from Bio import bgzf
+from cyvcf2 import VCF
+from cyvcf2.cyvcf2 import Variant
 import argparse
+from typing import Callable
 import gc
 
 from helper import *
+from genome_lookup import GenomeLookup
 
 META = """##fileformat=VCFv4.2
 ##INFO=<ID=SOURCE,Number=1,Type=String,Description="Source of the variation data">
@@ -36,11 +38,14 @@ def parse_args(args = None, description: bool = None):
     parser.add_argument(dest="input_file", type=str, help="Input VCF file")
     parser.add_argument(dest="source", type=str, help="Input VCF file source")
     parser.add_argument(dest="synonym_file", type=str, help="Text file with chrmosome synonyms")
+    parser.add_argument('--genome_lookup', dest="genome_lookup", type=str, help="binary genome lookup (see generate_genome_bundle.py) to read the synonyms from instead of synonym_file if it exists")
     parser.add_argument('--rename_clinvar_ids', dest="rename_clinvar_ids", action="store_true")
-    parser.add_argument('--chromosomes', dest="chromosomes", type=str, help="Comma separated list of chromosomes to put in header")
+    parser.add_argument('--chromosomes', dest="chromosomes", type=str, help="Comma separated list of chromosomes to put in header, default is the chromosomes in the input VCF index")
     parser.add_argument('-O', '--output_file', dest="output_file", type=str)
     parser.add_argument('--sources', dest="sources", type=str, help="Comma separated list of sources if there are multiple sources")
     parser.add_argument('--sources_meta_file', dest="sources_meta_file", type=str, required = False, help="JSON file with metadata about variant sources")
+    parser.add_argument('--threads', dest="threads", type=int, default=1, help="number of threads used to compress the output")
+    parser.add_argument('--index_type', dest="index_type", type=str, choices=["tbi", "csi"], help="index the output while writing it")
     
     return parser.parse_args(args)
 
@@ -60,34 +65,10 @@ def format_meta(meta: str, chromosomes: str = None, synonyms: list = None) -> st
         meta += f"##contig=<ID={chr_syn}>\n"
     return meta
 
-def process_variant_source() -> dict:
-    variant_source = {}
-    with open(VARIATION_SOURCE_DUMP_FILENAME, "r") as file:
-        for line in file:
-            (variant_name, source) = [val.strip() for val in line.split("\t")]
-            variant_source[variant_name] = source
-
-    return variant_source
-
-def main(args = None):
-    args = parse_args(args)
-
-    input_file = args.input_file
-    source = args.source
-    synonym_file = args.synonym_file
-    chromosomes = args.chromosomes or None
-    output_file = args.output_file or os.path.join(os.path.dirname(input_file), "UPDATED_S_" + os.path.basename(input_file))
-    sources = args.sources or []
-    sources_meta_file = args.sources_meta_file or os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            "../assets/source_meta.json"
-        )
-
-    if source == "MULTIPLE" and not sources:
-        print("[ERROR] {source} source type requires source list to be provided. See --sources option.")
-        exit(1)
-
-    sources = [s.replace("%20", " ") for s in sources.split(",")]
+def read_synonyms(synonym_file: str, genome_lookup: str = None) -> dict:
+    # the lookup is searched for the names that are used instead of reading all synonyms
+    if genome_lookup is not None and os.path.isfile(genome_lookup):
+        return GenomeLookup(genome_lookup).synonyms
 
     synonyms = {}
     with open(synonym_file) as file:
@@ -97,14 +78,23 @@ def main(args = None):
 
             synonyms[chr] = synonym
 
-    if args.rename_clinvar_ids and source == "ClinVar":
-        format_id = format_clinvar_id
-    else:
-        format_id = lambda x : x
-    
-    meta = format_meta(META, chromosomes, synonyms)
+    return synonyms
+
+def parse_sources(sources: str) -> list:
+    if not sources:
+        return []
+
+    return [s.replace("%20", " ") for s in sources.split(",")]
+
+def get_id_formatter(source: str, rename_clinvar_ids: bool) -> Callable:
+    if rename_clinvar_ids and source == "ClinVar":
+        return format_clinvar_id
 
+    return lambda x : x
+
+def get_sources_meta(source: str, sources: list, sources_meta_file: str) -> str:
     # get metadata information for all sources and dump that to a dictionary
+    meta = ""
     sources_meta = get_sources_meta_info(sources_meta_file)
     for source_meta in sources_meta:
         if source_meta["name"] != source and source_meta["name"] not in sources:
@@ -127,47 +117,97 @@ def main(args = None):
 
         meta += meta_line + "\n"
 
-    with bgzf.open(output_file, "wt") as o_file:
+    return meta
+
+def get_variant_source(variant: Variant, source: str, sources: list) -> str:
+    if source != "MULTIPLE":
+        return source
+
+    variant_source = "."
+
+    # 1st attempt:
+    # try to extract source from INFO/SOURCE
+    source_from_info = variant.INFO.get("SOURCE")
+    if isinstance(source_from_info, str):
+        variant_source = source_from_info
+
+    # 2nd attempt:
+    # VCF dump of Ensembl database contains the source in the INFO
+    # But it does not have key-value format, rather only key, e.g - 
+    # 1A      539     1A_539  ACGGGA  GCGGGA,GCGGAG   .       .       Watkins-exome-capture;TSA=substitution
+    # we are supporting them for now; so try to extract that information
+    if not source_from_info:
+        for (key, _) in variant.INFO:
+            if key in sources:
+                variant_source = key
+            break
+
+    return variant_source
+
+def format_variant(chrom: str, variant: Variant, id: str, variant_source: str) -> str:
+    return "\t".join([
+            chrom,
+            str(variant.POS),
+            id,
+            variant.REF,
+            ",".join(variant.ALT),
+            ".",
+            ".",
+            f"SOURCE={variant_source}"
+        ]) + "\n"
+
+def process_variant_source() -> dict:
+    variant_source = {}
+    with open(VARIATION_SOURCE_DUMP_FILENAME, "r") as file:
+        for line in file:
+            (variant_name, source) = [val.strip() for val in line.split("\t")]
+            variant_source[variant_name] = source
+
+    return variant_source
+
+def main(args = None):
+    args = parse_args(args)
+
+    input_file = args.input_file
+    source = args.source
+    synonym_file = args.synonym_file
+    # chromosomes with variants, from the index
+    chromosomes = args.chromosomes or ",".join(get_contig_offsets(input_file)) or None
+    output_file = args.output_file or os.path.join(os.path.dirname(input_file), "UPDATED_S_" + os.path.basename(input_file))
+    sources = args.sources or []
+    sources_meta_file = args.sources_meta_file or os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "../assets/source_meta.json"
+        )
+    threads = args.threads
+    index_type = args.index_type
+
+    if source == "MULTIPLE" and not sources:
+        print("[ERROR] {source} source type requires source list to be provided. See --sources option.")
+        exit(1)
+
+    sources = parse_sources(sources)
+    synonyms = read_synonyms(synonym_file, args.genome_lookup)
+    format_id = get_id_formatter(source, args.rename_clinvar_ids)
+    
+    meta = format_meta(META, chromosomes, synonyms)
+    meta += get_sources_meta(source, sources, sources_meta_file)
+
+    index = VcfIndex(index_type) if index_type is not None else None
+    with BgzfWriter(output_file, threads = threads, index = index) as o_file:
         o_file.write(meta)
         o_file.write(HEADER)
 
         input_vcf = VCF(input_file)
         for variant in input_vcf:
-
-            variant_source = source
-            if source == "MULTIPLE":
-                variant_source = "."
-
-                # 1st attempt:
-                # try to extract source from INFO/SOURCE
-                source_from_info = variant.INFO.get("SOURCE")
-                if isinstance(source_from_info, str):
-                    variant_source = source_from_info
-
-                # 2nd attempt:
-                # VCF dump of Ensembl database contains the source in the INFO
-                # But it does not have key-value format, rather only key, e.g - 
-                # 1A      539     1A_539  ACGGGA  GCGGGA,GCGGAG   .       .       Watkins-exome-capture;TSA=substitution
-                # we are supporting them for now; so try to extract that information
-                if not source_from_info:
-                    for (key, _) in variant.INFO:
-                        if key in sources:
-                            variant_source = key
-                        break
-
-            o_file.write("\t".join([
-                    synonyms[variant.CHROM] if variant.CHROM in synonyms else variant.CHROM,
-                    str(variant.POS),
-                    format_id(variant.ID),
-                    variant.REF,
-                    ",".join(variant.ALT),
-                    ".",
-                    ".",
-                    f"SOURCE={variant_source}"
-                ]) + "\n"
-            )
+            variant_source = get_variant_source(variant, source, sources)
+            chrom = synonyms[variant.CHROM] if variant.CHROM in synonyms else variant.CHROM
+            o_file.write(format_variant(chrom, variant, format_id(variant.ID), variant_source))
         input_vcf.close()
 
+    if index is not None:
+        index.write(f"{output_file}.{index_type}")
+
     try:
         del variant_source
         gc.collect()
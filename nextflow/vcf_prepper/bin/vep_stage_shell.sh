@@ -0,0 +1,38 @@
+#!/usr/bin/env bash
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Shell of the VEP task (runVEPonVCF) when vep_stage_dir is set, see nextflow.config. Nextflow
+# runs the task script with it once the task inputs are in the task directory, so the VEP config
+# input (*.ini) is there to be rewritten by stage_vep_data.py. The script is then run with the
+# shell given after the stage directory and maximum size:
+#
+#     vep_stage_shell.sh <stage_dir> <max_size> /bin/bash -ue .command.sh
+
+stage_dir=$1
+max_size=$2
+shift 2
+
+shopt -s nullglob
+vep_configs=(*.ini)
+shopt -u nullglob
+
+# VEP runs with the data where it is if the files cannot be staged
+if [[ ${#vep_configs[@]} -gt 0 ]]; then
+  "$(dirname "$0")/stage_vep_data.py" "${vep_configs[@]}" --stage_dir "${stage_dir}" --max_size "${max_size}" >&2 || \
+    echo "[WARNING] Could not stage VEP data files in ${stage_dir}" >&2
+fi
+
+exec "$@"
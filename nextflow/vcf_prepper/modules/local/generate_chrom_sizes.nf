@@ -32,6 +32,7 @@ process GENERATE_CHROM_SIZES {
   assembly = meta.assembly
   version = params.version
   ini_file = params.ini_file
+  metadata_cache_dir = params.temp_dir + "/metadata_cache"
   chrom_sizes = meta.chrom_sizes
   force_create_config = params.force_create_config ? "--force" : ""
   
@@ -41,6 +42,7 @@ process GENERATE_CHROM_SIZES {
     !{assembly} \
     !{version} \
     --ini_file !{ini_file} \
+    --metadata_cache_dir !{metadata_cache_dir} \
     --chrom_sizes !{chrom_sizes} \
     !{force_create_config}
   '''
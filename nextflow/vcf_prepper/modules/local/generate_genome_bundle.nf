@@ -0,0 +1,56 @@
+#!/usr/bin/env nextflow
+
+/*
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+ 
+process GENERATE_GENOME_BUNDLE {
+  label 'process_low'
+  cache false
+  
+  input:
+  val meta
+
+  output:
+  val genome
+  
+  shell:
+  genome = meta.genome
+  species = meta.species
+  assembly = meta.assembly
+  version = params.version
+  ini_file = params.ini_file
+  metadata_cache_dir = params.temp_dir + "/metadata_cache"
+  bundle_dir = params.genome_bundle_dir
+  genome_lookup = meta.genome_lookup
+  // text files are only created for the steps that use them, as the scripts this replaces
+  chrom_sizes = params.skip_tracks ? "" : "--chrom_sizes " + meta.chrom_sizes
+  synonym_file = params.skip_vep ? "" : "--synonym_file " + meta.synonym_file
+  force_create_config = params.force_create_config ? "--force" : ""
+  
+  '''
+  generate_genome_bundle.py \
+    !{species} \
+    !{assembly} \
+    !{version} \
+    --ini_file !{ini_file} \
+    --metadata_cache_dir !{metadata_cache_dir} \
+    --bundle_dir !{bundle_dir} \
+    --genome_lookup !{genome_lookup} \
+    !{chrom_sizes} \
+    !{synonym_file} \
+    !{force_create_config}
+  '''
+}
@@ -32,6 +32,7 @@ process GENERATE_SYNONYM_FILE {
   assembly = meta.assembly
   version = params.version
   ini_file = params.ini_file
+  metadata_cache_dir = params.temp_dir + "/metadata_cache"
   synonym_file = meta.synonym_file
   force_create_config = params.force_create_config ? "--force" : ""
   
@@ -41,6 +42,7 @@ process GENERATE_SYNONYM_FILE {
     !{assembly} \
     !{version} \
     --ini_file !{ini_file} \
+    --metadata_cache_dir !{metadata_cache_dir} \
     --synonym_file !{synonym_file} \
     !{force_create_config}
   '''
@@ -33,6 +33,7 @@ process GENERATE_VEP_CONFIG {
   assembly = meta.assembly
   genome_uuid = meta.genome_uuid
   ini_file = params.ini_file
+  metadata_cache_dir = params.temp_dir + "/metadata_cache"
   vep_config = meta.vep_config
   cache_dir = meta.cache_dir
   fasta_dir = meta.fasta_dir
@@ -48,6 +49,7 @@ process GENERATE_VEP_CONFIG {
       !{assembly} \
       --genome_uuid !{genome_uuid} \
       --ini_file !{ini_file} \
+      --metadata_cache_dir !{metadata_cache_dir} \
       --vep_config !{vep_config} \
       --cache_dir !{cache_dir} \
       --fasta_dir !{fasta_dir} \
@@ -20,19 +20,19 @@ process INDEX_VCF {
   label 'bcftools'
   
   input:
-  tuple val(meta), path(vcf)
+  tuple val(meta), path(vcf), path(index)
   
   output:
   tuple val(meta), path(new_vcf), path(vcf_index)
   
   shell:
   index_type = meta.index_type
-  flag_index = (index_type == "tbi" ? "-t" : "-c")
   new_vcf = "${meta.genome}-${meta.source}.vcf.gz"
   vcf_index = new_vcf + ".${index_type}"
   
   '''
   ln -sf !{vcf} !{new_vcf}
-  bcftools index !{flag_index} !{new_vcf}
+  # REMOVE_VARIANTS and PRE_VEP index their output while writing it
+  ln -sf !{index} !{vcf_index}
   '''
 }
@@ -0,0 +1,39 @@
+#!/usr/bin/env nextflow
+
+/*
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+ 
+process MERGE_VEP_SHARDS {
+  label 'process_medium'
+
+  input:
+  tuple val(meta), val(shard_vcfs), val(output_vcf)
+
+  output:
+  tuple val(meta), val(output_vcf), val(vcf_index)
+
+  shell:
+  index_type = meta.index_type
+  vcf_index = "${output_vcf}.${index_type}"
+  shard_files = shard_vcfs.join(" ")
+
+  '''
+  merge_vep_shards.py !{shard_files} \
+    -O !{output_vcf} \
+    --index_type !{index_type} \
+    --threads !{task.cpus}
+  '''
+}
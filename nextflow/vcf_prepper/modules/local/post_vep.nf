@@ -0,0 +1,69 @@
+#!/usr/bin/env nextflow
+
+/*
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+ 
+process POST_VEP {
+  input:
+  path rank_file
+  tuple val(meta), path(vcf), path(vcf_index)
+
+  output:
+  tuple val(meta), path(output_file), path(vcf_index), path(stats_file), emit: vcf
+  tuple val(meta), path(output_bed), emit: bed
+
+  cpus    { params.summary_stats_threads }
+  memory  { ((vcf.size() * 1.25 * 1.B) + 2.GB) * task.attempt }
+  afterScript 'rm -f unsorted.bed'
+
+  shell:
+  species = meta.species
+  assembly = meta.assembly
+  output_file =  "UPDATED_SS_" + file(vcf).getName()
+  output_bed = "variant-${meta.source}.bed"
+  index_type = meta.index_type
+  flag_index = (index_type == "tbi" ? "-t" : "-c")
+  vcf_index = output_file + ".${index_type}"
+  stats_file = "variation.stats.json"
+  temp_dir = "tmp"
+
+  '''
+  # summary stats VCF, track bed and variant metrics in one pass over the VEP output
+  summary_stats.py \
+    !{species} \
+    !{assembly} \
+    !{vcf} \
+    -O !{output_file} \
+    --threads !{task.cpus} \
+    --engine !{params.summary_stats_engine} \
+    --index_type !{index_type} \
+    --metrics_file !{stats_file} \
+    --bed_file unsorted.bed \
+    --rank_file !{rank_file}
+  
+  # bytes engine indexes the output while writing it
+  if [ ! -f !{vcf_index} ]; then
+    bcftools index !{flag_index} !{output_file}
+  fi
+
+  # tmp directory for sorting big files
+  mkdir -p !{temp_dir}
+
+  LC_COLLATE=C sort -T !{temp_dir} -S1G -k1,1 -k2,2n unsorted.bed > !{output_bed}
+
+  rm -r !{temp_dir}
+  '''
+}
@@ -0,0 +1,66 @@
+#!/usr/bin/env nextflow
+
+/*
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+ 
+process PRE_VEP {
+  label 'process_medium'
+
+  input: 
+  tuple val(meta), path(vcf), path(vcf_index)
+  
+  output:
+  tuple val(meta), path(output_file), path(vcf_index)
+
+  // same as REMOVE_VARIANTS, see there
+  memory { ((params.remove_nonunique_ids ? 1.GB : 0.B) + 2.GB) * task.attempt }
+  
+  shell:
+  output_file = "PROCESSED_" + file(vcf).getName()
+  source = meta.source
+  synonym_file = meta.synonym_file
+  chrom_sizes = meta.chrom_sizes
+  genome_lookup = params.genome_bundle && meta.genome_lookup ? "--genome_lookup " + meta.genome_lookup : ""
+  rename_clinvar_ids = params.rename_clinvar_ids ? "--rename_clinvar_ids" : ""
+  remove_nonunique_ids = params.remove_nonunique_ids ? "--remove_nonunique_ids --hash_memory 512" : ""
+  remove_patch_regions = params.remove_patch_regions ? "--remove_patch_regions" : ""
+  sources = params.sources
+  sources_meta_file = params.sources_meta_file
+  index_type = meta.index_type
+  flag_index = (index_type == "tbi" ? "-t" : "-c")
+  vcf_index = output_file + ".${index_type}"
+
+  '''
+  pyenv local variation-eva
+  # UPDATE_FIELDS and REMOVE_VARIANTS in one pass, without the intermediate VCF
+  pre_vep.py !{vcf} !{source} !{synonym_file} \
+    !{rename_clinvar_ids} \
+    --sources !{sources} \
+    --sources_meta_file !{sources_meta_file} \
+    --chrom_sizes !{chrom_sizes} \
+    !{genome_lookup} \
+    !{remove_nonunique_ids} \
+    !{remove_patch_regions} \
+    --threads !{task.cpus} \
+    --index_type !{index_type} \
+    -O !{output_file}
+
+  # index is written with the output unless the records were not sorted
+  if [ ! -f !{vcf_index} ]; then
+    bcftools index !{flag_index} !{output_file}
+  fi
+  '''
+}
@@ -31,7 +31,9 @@ process PROCESS_CACHE {
   assembly = meta.assembly
   version = params.version
   ini_file = params.ini_file
+  metadata_cache_dir = params.temp_dir + "/metadata_cache"
   cache_dir = meta.cache_dir
+  include = params.cache_include ? "--include " + params.cache_include : ""
   force_create_config = params.force_create_config ? "--force" : ""
   
   '''
@@ -40,7 +42,10 @@ process PROCESS_CACHE {
     !{assembly} \
     !{version} \
     --ini_file !{ini_file} \
+    --metadata_cache_dir !{metadata_cache_dir} \
     --cache_dir !{cache_dir} \
+    --threads !{task.cpus} \
+    !{include} \
     !{force_create_config}
   '''
 }
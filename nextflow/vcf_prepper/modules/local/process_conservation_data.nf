@@ -31,6 +31,9 @@ process PROCESS_CONSERVATION_DATA {
   assembly = meta.assembly
   version = params.version
   ini_file = params.ini_file
+  metadata_cache_dir = params.temp_dir + "/metadata_cache"
+  artifact_store_dir = params.artifact_store_dir
+  artifact_store_max_size = params.artifact_store_max_size
   conservation_data_dir = meta.conservation_data_dir
   force_create_config = params.force_create_config ? "--force" : ""
   
@@ -40,6 +43,9 @@ process PROCESS_CONSERVATION_DATA {
     !{assembly} \
     !{version} \
     --ini_file !{ini_file} \
+    --metadata_cache_dir !{metadata_cache_dir} \
+    --artifact_store_dir !{artifact_store_dir} \
+    --artifact_store_max_size !{artifact_store_max_size} \
     --conservation_data_dir !{conservation_data_dir} \
     !{force_create_config}
   '''
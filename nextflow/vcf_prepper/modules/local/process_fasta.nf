@@ -32,6 +32,9 @@ process PROCESS_FASTA {
   assembly = meta.assembly
   version = params.version
   ini_file = params.ini_file
+  metadata_cache_dir = params.temp_dir + "/metadata_cache"
+  artifact_store_dir = params.artifact_store_dir
+  artifact_store_max_size = params.artifact_store_max_size
   fasta_dir = meta.fasta_dir
   force_create_config = params.force_create_config ? "--force" : ""
   
@@ -41,7 +44,11 @@ process PROCESS_FASTA {
     !{assembly} \
     !{version} \
     --ini_file !{ini_file} \
+    --metadata_cache_dir !{metadata_cache_dir} \
+    --artifact_store_dir !{artifact_store_dir} \
+    --artifact_store_max_size !{artifact_store_max_size} \
     --fasta_dir !{fasta_dir} \
+    --threads !{task.cpus} \
     !{force_create_config}
   '''
 }
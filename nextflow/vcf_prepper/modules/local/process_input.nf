@@ -52,11 +52,17 @@ process PROCESS_INPUT {
     index_type = file(vcf + ".tbi").exists() ? "tbi" : "csi"
   }
   meta.index_type = index_type
+  artifact_store_dir = params.artifact_store_dir
+  artifact_store_max_size = params.artifact_store_max_size
   
   '''
   if [[ !{file_type} == "remote" ]]; then
-    wget !{vcf} -O !{output_vcf}
-    wget !{vcf}.!{index_type} -O !{output_vcf}.!{index_type}
+    download_file.py !{vcf} -O !{output_vcf} \
+      --artifact_store_dir !{artifact_store_dir} \
+      --artifact_store_max_size !{artifact_store_max_size}
+    download_file.py !{vcf}.!{index_type} -O !{output_vcf}.!{index_type} \
+      --artifact_store_dir !{artifact_store_dir} \
+      --artifact_store_max_size !{artifact_store_max_size}
   fi
   '''
 }
@@ -18,26 +18,41 @@
  
 process REMOVE_VARIANTS {
   input:
-  tuple val(meta), path(vcf)
+  tuple val(meta), path(vcf), path(vcf_index)
   
   output:
-  tuple val(meta), path(output_file)
+  tuple val(meta), path(output_file), path(vcf_index)
 
-  memory { (vcf.size() * 16.B + 2.GB) * task.attempt }
+  // without remove_nonunique_ids duplicates are removed one position at a time, with it id
+  // hashes over --hash_memory are memory-mapped from work dir. The in-memory hash array holds
+  // 1.5x --hash_memory while it doubles, so 512MB of hashes stay within the extra 1GB
+  memory { ((params.remove_nonunique_ids ? 1.GB : 0.B) + 2.GB) * task.attempt }
   
   shell:
   output_file =  "REMOVED_" + file(vcf).getName()
   chrom_sizes = meta.chrom_sizes
-  remove_nonunique_ids = params.remove_nonunique_ids ? "--remove_nonunique_ids" : ""
+  genome_lookup = params.genome_bundle && meta.genome_lookup ? "--genome_lookup " + meta.genome_lookup : ""
+  remove_nonunique_ids = params.remove_nonunique_ids ? "--remove_nonunique_ids --hash_memory 512" : ""
   remove_patch_regions = params.remove_patch_regions ? "--remove_patch_regions" : ""
+  index_type = meta.index_type
+  flag_index = (index_type == "tbi" ? "-t" : "-c")
+  vcf_index = output_file + ".${index_type}"
   
   '''
   pyenv local variation-eva
   remove_variants.py \
     !{vcf} \
     --chrom_sizes !{chrom_sizes} \
+    !{genome_lookup} \
     !{remove_nonunique_ids} \
     !{remove_patch_regions} \
+    --threads !{task.cpus} \
+    --index_type !{index_type} \
     -O !{output_file}
+
+  # index is written with the output unless the records were not sorted
+  if [ ! -f !{vcf_index} ]; then
+    bcftools index !{flag_index} !{output_file}
+  fi
   '''
 }
\ No newline at end of file
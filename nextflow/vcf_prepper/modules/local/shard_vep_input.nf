@@ -0,0 +1,42 @@
+#!/usr/bin/env nextflow
+
+/*
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+ 
+process SHARD_VEP_INPUT {
+  label 'process_medium'
+
+  input:
+  tuple val(meta), path(vcf), path(vcf_index)
+
+  output:
+  tuple val(meta), val(manifest)
+
+  shell:
+  vep_config = meta.vep_config
+  shard_dir = "${meta.genome_temp_dir}/shards/${meta.genome}-${meta.source}"
+  manifest = "${shard_dir}/shards.tsv"
+  index_type = meta.index_type
+
+  '''
+  # one VCF and VEP config per shard of whole contigs, listed in shards.tsv
+  shard_vep_input.py !{vcf} !{vep_config} \
+    --shard_dir !{shard_dir} \
+    --shard_size !{params.vep_shard_size} \
+    --index_type !{index_type} \
+    --threads !{task.cpus}
+  '''
+}
@@ -21,8 +21,9 @@ process SUMMARY_STATS {
   tuple val(meta), path(vcf), path(vcf_index)
 
   output:
-  tuple val(meta), path(output_file), path(vcf_index)
+  tuple val(meta), path(output_file), path(vcf_index), path(stats_file)
 
+  cpus    { params.summary_stats_threads }
   memory  { ((vcf.size() * 1.25 * 1.B) + 2.GB) * task.attempt }
 
   shell:
@@ -32,14 +33,22 @@ process SUMMARY_STATS {
   index_type = meta.index_type
   flag_index = (index_type == "tbi" ? "-t" : "-c")
   vcf_index = output_file + ".${index_type}"
+  stats_file = "variation.stats.json"
 
   '''
   summary_stats.py \
     !{species} \
     !{assembly} \
     !{vcf} \
-    -O !{output_file}
+    -O !{output_file} \
+    --threads !{task.cpus} \
+    --engine !{params.summary_stats_engine} \
+    --index_type !{index_type} \
+    --metrics_file !{stats_file}
   
-  bcftools index !{flag_index} !{output_file}
+  # bytes engine indexes the output while writing it
+  if [ ! -f !{vcf_index} ]; then
+    bcftools index !{flag_index} !{output_file}
+  fi
   '''
 }
@@ -0,0 +1,41 @@
+#!/usr/bin/env nextflow
+
+/*
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+process TUNE_VEP_CONFIG {
+  cache false
+
+  input:
+  tuple val(meta), val(vcf), val(vcf_index)
+
+  output:
+  tuple val(source_meta), val(vcf), val(vcf_index)
+
+  shell:
+  // the VEP config of the genome is shared by its sources, each gets its own tuned copy
+  vep_config = meta.vep_config
+  source_vep_config = "${meta.genome_temp_dir}/${meta.genome}-${meta.source}.ini"
+  source_meta = meta + [vep_config: source_vep_config]
+
+  '''
+  # memory of the VEP task is worked out from bin_size the same way as in nextflow.config
+  tune_vep_config.py !{vcf} !{vep_config} \
+    --output_config !{source_vep_config} \
+    --cpus !{params.vep_cpus} \
+    --bin_size !{params.bin_size}
+  '''
+}
@@ -23,23 +23,34 @@ process UPDATE_FIELDS {
   tuple val(meta), path(vcf), path(vcf_index)
   
   output:
-  tuple val(meta), path(output_file)
+  tuple val(meta), path(output_file), path(vcf_index)
   
   shell:
   output_file = "UPDATED_S_" + file(vcf).getName()
   source = meta.source
   synonym_file = meta.synonym_file
+  genome_lookup = params.genome_bundle && meta.genome_lookup ? "--genome_lookup " + meta.genome_lookup : ""
   rename_clinvar_ids = params.rename_clinvar_ids ? "--rename_clinvar_ids" : ""
   sources = params.sources
   sources_meta_file = params.sources_meta_file
+  index_type = meta.index_type
+  vcf_index = output_file + ".${index_type}"
+  flag_index = (index_type == "tbi" ? "-t" : "-c")
 
   '''
-  chrs=$(tabix !{vcf} -l | xargs | tr ' ' ',')
+  # chromosomes for the header are read from the input index
   update_fields.py !{vcf} !{source} !{synonym_file} \
+    !{genome_lookup} \
     !{rename_clinvar_ids} \
     -O !{output_file} \
-    --chromosomes ${chrs} \
     --sources !{sources} \
-    --sources_meta_file !{sources_meta_file}
+    --sources_meta_file !{sources_meta_file} \
+    --threads !{task.cpus} \
+    --index_type !{index_type}
+
+  # index is written with the output unless the records were not sorted
+  if [ ! -f !{vcf_index} ]; then
+    bcftools index !{flag_index} !{output_file}
+  fi
   '''
 }
\ No newline at end of file
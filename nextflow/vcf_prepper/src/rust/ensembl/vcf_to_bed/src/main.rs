@@ -15,7 +15,7 @@
  */
  
 use std::{io::{BufReader,Write}, fs::File, env, collections::HashMap, collections::HashSet};
-use vcf::{VCFError, VCFReader};
+use vcf::{VCFError, VCFHeader, VCFReader};
 use flate2::read::MultiGzDecoder;
 
 const VARIANTGROUP : [(&str, u8); 45] = [
@@ -66,6 +66,27 @@ const VARIANTGROUP : [(&str, u8); 45] = [
     ("intergenic_variant", 5)
 ];
 
+// return the position of a field in the CSQ Format declared in the VCF header
+// default position (as in VEP output) is used if the header does not declare CSQ
+fn csq_field_index(header: &VCFHeader, field: &str, default: usize) -> usize {
+    match header.info(b"CSQ") {
+        Some(csq_header) => csq_format_index(&String::from_utf8_lossy(csq_header.line()), field),
+        None => default
+    }
+}
+
+// return the position of a field in the Format of a CSQ INFO header line
+// the line can end with the closing quote and bracket and a line ending
+fn csq_format_index(line: &str, field: &str) -> usize {
+    let format = line.split("Format: ").nth(1)
+        .expect("[ERROR] CSQ header does not declare a Format");
+
+    format.trim_end_matches(|c: char| c == '>' || c == '"' || c.is_whitespace())
+        .split("|")
+        .position(|csq_field| csq_field.trim() == field)
+        .expect(&format!("[ERROR] {} field not found in CSQ header", field))
+}
+
 struct Line {
     chromosome: String,
     start: u64,
@@ -153,6 +174,10 @@ fn main() -> Result<(), VCFError> {
         variant_groups.insert(csq.to_string(), *value);
     }
     
+    // resolve CSQ field positions from header instead of assuming VEP output layout
+    let consequence_idx = csq_field_index(reader.header(), "Consequence", 1);
+    let variant_class_idx = csq_field_index(reader.header(), "VARIANT_CLASS", 21);
+    
     let mut record = reader.empty_record();
     // dummy initial value for the object to read line from vcf
     // this line is guranteed to not get printed as alt.len == 0
@@ -189,7 +214,7 @@ fn main() -> Result<(), VCFError> {
         let csq = record.info(b"CSQ").map(|csqs| {
             csqs.iter().map(|csq| {
                 let s = String::from_utf8_lossy(csq);
-                s.split("|").nth(1).unwrap_or("").to_string()
+                s.split("|").nth(consequence_idx).unwrap_or("").to_string()
             }).collect::<Vec<String>>()
         }).unwrap_or(vec![]);
         // if csq is empty we won't have most severe consequence
@@ -198,7 +223,7 @@ fn main() -> Result<(), VCFError> {
         let class = record.info(b"CSQ").map(|csqs| {
             csqs.iter().map(|csq| {
                 let s = String::from_utf8_lossy(csq);
-                s.split("|").nth(21).unwrap_or("").to_string()
+                s.split("|").nth(variant_class_idx).unwrap_or("").to_string()
             }).collect::<Vec<String>>()
         }).unwrap_or(vec![]);
         
@@ -287,4 +312,30 @@ fn main() -> Result<(), VCFError> {
     
     lines.merge(None, &mut out);
     Ok(())
-}
\ No newline at end of file
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    const CSQ_LINE: &str = "##INFO=<ID=CSQ,Number=.,Type=String,Description=\"Consequence annotations from Ensembl VEP. Format: Allele|Consequence|IMPACT|VARIANT_CLASS\">";
+
+    #[test]
+    fn csq_format_index_finds_fields() {
+        assert_eq!(csq_format_index(CSQ_LINE, "Allele"), 0);
+        assert_eq!(csq_format_index(CSQ_LINE, "Consequence"), 1);
+    }
+
+    #[test]
+    fn csq_format_index_finds_last_field_before_line_ending() {
+        assert_eq!(csq_format_index(CSQ_LINE, "VARIANT_CLASS"), 3);
+        assert_eq!(csq_format_index(&format!("{}\n", CSQ_LINE), "VARIANT_CLASS"), 3);
+        assert_eq!(csq_format_index(&format!("{}\r\n", CSQ_LINE), "VARIANT_CLASS"), 3);
+    }
+
+    #[test]
+    #[should_panic(expected = "PUBMED field not found in CSQ header")]
+    fn csq_format_index_fails_on_missing_field() {
+        csq_format_index(CSQ_LINE, "PUBMED");
+    }
+}
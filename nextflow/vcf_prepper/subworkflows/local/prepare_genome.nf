@@ -19,6 +19,7 @@
 //
 
 include { GENERATE_CHROM_SIZES } from "../../modules/local/generate_chrom_sizes.nf"
+include { GENERATE_GENOME_BUNDLE } from "../../modules/local/generate_genome_bundle.nf"
 include { GENERATE_VEP_CONFIG } from "../../modules/local/generate_vep_config.nf"
 include { GENERATE_SYNONYM_FILE } from "../../modules/local/generate_synonym_file.nf"
 include { PROCESS_CACHE } from "../../modules/local/process_cache.nf"
@@ -40,6 +41,7 @@ workflow PREPARE_GENOME {
         synonym_file = "${genome_temp_dir}/${meta.genome}.synonyms"
         vep_config = "${genome_temp_dir}/${meta.genome}.ini"
         chrom_sizes = "${genome_temp_dir}/${meta.genome}.chrom.sizes"
+        genome_lookup = "${genome_temp_dir}/${meta.genome}.gcb"
         
         genome_api_outdir = "${params.output_dir}/api/${meta.genome_uuid}"
         file(genome_api_outdir).mkdirs()
@@ -54,6 +56,7 @@ workflow PREPARE_GENOME {
             synonym_file: synonym_file,
             vep_config: vep_config,
             chrom_sizes: chrom_sizes,
+            genome_lookup: genome_lookup,
             genome_temp_dir: genome_temp_dir,
             genome_api_outdir: genome_api_outdir,
             genome_tracks_outdir: genome_tracks_outdir,
@@ -79,10 +82,15 @@ workflow PREPARE_GENOME {
     }
     .set { ch_skip }
     
+    // chrom sizes and synonyms from a single query, for both api and tracks files
+    if (params.genome_bundle && !(params.skip_vep && params.skip_tracks)) {
+      ch_genome_bundle_done = GENERATE_GENOME_BUNDLE( ch_prepare_genome_meta )
+    }
+
     // TODO: run this only once per genome when we have multiple source (not DOWNLOAD_SOURCE)
     // prepare for api files
     if (!params.skip_vep) {
-      ch_synonym_file_done = GENERATE_SYNONYM_FILE( ch_prepare_genome_meta )
+      ch_synonym_file_done = params.genome_bundle ? ch_genome_bundle_done : GENERATE_SYNONYM_FILE( ch_prepare_genome_meta )
     
       ch_processed_cache = PROCESS_CACHE( ch_prepare_genome_meta )
       ch_processed_fasta = PROCESS_FASTA( ch_prepare_genome_meta )
@@ -113,7 +121,12 @@ workflow PREPARE_GENOME {
     }
 
     // prepare for tracks files
-    ch_prepared_track = params.skip_tracks ? ch_skip : GENERATE_CHROM_SIZES( ch_prepare_genome_meta )
+    if (params.skip_tracks) {
+      ch_prepared_track = ch_skip
+    }
+    else {
+      ch_prepared_track = params.genome_bundle ? ch_genome_bundle_done : GENERATE_CHROM_SIZES( ch_prepare_genome_meta )
+    }
 
     // we join channels to only create DAG edges
     ch_prepare_genome
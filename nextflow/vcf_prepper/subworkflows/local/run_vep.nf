@@ -21,6 +21,9 @@
 repo_dir = params.repo_dir
 
 include { INDEX_VCF } from "../../modules/local/index_vcf.nf"
+include { TUNE_VEP_CONFIG } from "../../modules/local/tune_vep_config.nf"
+include { SHARD_VEP_INPUT } from "../../modules/local/shard_vep_input.nf"
+include { MERGE_VEP_SHARDS } from "../../modules/local/merge_vep_shards.nf"
 include { vep } from "${repo_dir}/ensembl-vep/nextflow/workflows/run_vep.nf"
 
 workflow RUN_VEP {
@@ -31,37 +34,105 @@ workflow RUN_VEP {
   // create index file at the exact location where input vcf file is as nextflow-vep requires as such
   input
   .map {
-    meta, vcf ->
+    meta, vcf, vcf_index ->
       // vcf_fullpath = vcf.toString()
-      [meta, vcf]
+      [meta, vcf, vcf_index]
   }
   .set { ch_index_vcf }
   INDEX_VCF( ch_index_vcf )
+
+  // fork and buffer_size of each source are tuned to its own number of records
+  ch_indexed_vcf = params.vep_auto_tune ? TUNE_VEP_CONFIG( INDEX_VCF.out ) : INDEX_VCF.out
   
-  INDEX_VCF.out
-  .map {
-    meta, vcf, vcf_index ->
-      vep_meta = [:]
-      vep_meta.output_dir = meta.genome_temp_dir
-      vep_meta.one_to_many = 0
-      vep_meta.index_type = meta.index_type
-      vep_meta.filters = "amino_acids not match X[A-Za-z*]?\\/"
+  if (params.vep_shard_size) {
+    // annotate each shard of contigs with its own VEP config and merge them back
+    SHARD_VEP_INPUT( ch_indexed_vcf )
+
+    SHARD_VEP_INPUT.out
+    .flatMap {
+      meta, manifest ->
+        def shards = file(manifest).readLines()
+        shards.withIndex().collect {
+          shard, shard_idx ->
+            def (shard_vcf, shard_index, shard_config) = shard.split("\t")
+            def shard_dir = file(shard_vcf).getParent().toString()
+
+            def vep_meta = [:]
+            vep_meta.output_dir = shard_dir
+            vep_meta.one_to_many = 0
+            vep_meta.index_type = meta.index_type
+            vep_meta.filters = "amino_acids not match X[A-Za-z*]?\\/"
+
+            // tag here is the output vcf file from nextflow-vep for the shard
+            def tag = "${shard_dir}/" + file(shard_vcf).getSimpleName() + "_VEP.vcf.gz"
+
+            [tag, meta, shard_idx, shards.size(), [meta: vep_meta, file: shard_vcf, index: shard_index, vep_config: shard_config]]
+        }
+    }
+    .set { ch_shards }
 
-      [meta: vep_meta, file: vcf, index: vcf_index, vep_config: meta.vep_config]
+    vep( ch_shards.map { tag, meta, shard_idx, n_shards, vep_input -> vep_input } )
+
+    ch_shards
+    .map {
+      tag, meta, shard_idx, n_shards, vep_input ->
+        [tag, meta, shard_idx, n_shards]
+    }
+    .join ( vep.out, failOnDuplicate: true )
+    .map {
+      tag, meta, shard_idx, n_shards ->
+        key = "${meta.genome}-${meta.source}"
+        [groupKey(key, n_shards), meta, shard_idx, tag]
+    }
+    .groupTuple()
+    .map {
+      key, metas, shard_idxs, tags ->
+        // same file name as nextflow-vep gives the output without shards
+        filename = file("${metas[0].genome}-${metas[0].source}").getSimpleName() + "_VEP.vcf.gz"
+        output_vcf = "${metas[0].genome_temp_dir}/${filename}"
+        shard_vcfs = [shard_idxs, tags].transpose().sort { it[0] }.collect { it[1] }
+
+        [metas[0], shard_vcfs, output_vcf]
+    }
+    .set { ch_merge_shards }
+    MERGE_VEP_SHARDS( ch_merge_shards )
+
+    MERGE_VEP_SHARDS.out
+    .map {
+      meta, vcf, vcf_index ->
+        [vcf, meta]
+    }
+    .set { ch_vep_output }
   }
-  .set { ch_vep }
-  vep( ch_vep )
-  
-  input
-  .map {
-    meta, vcf ->
-      // tag here is the output vcf file from nextflow-vep
-      filename = file("${meta.genome}-${meta.source}").getSimpleName() + "_VEP.vcf.gz"
-      tag = "${meta.genome_temp_dir}/${filename}"
+  else {
+    ch_indexed_vcf
+    .map {
+      meta, vcf, vcf_index ->
+        vep_meta = [:]
+        vep_meta.output_dir = meta.genome_temp_dir
+        vep_meta.one_to_many = 0
+        vep_meta.index_type = meta.index_type
+        vep_meta.filters = "amino_acids not match X[A-Za-z*]?\\/"
+
+        [meta: vep_meta, file: vcf, index: vcf_index, vep_config: meta.vep_config]
+    }
+    .set { ch_vep }
+    vep( ch_vep )
+    
+    input
+    .map {
+      meta, vcf, vcf_index ->
+        // tag here is the output vcf file from nextflow-vep
+        filename = file("${meta.genome}-${meta.source}").getSimpleName() + "_VEP.vcf.gz"
+        tag = "${meta.genome_temp_dir}/${filename}"
 
-      [tag, meta]
+        [tag, meta]
+    }
+    .join ( vep.out, failOnDuplicate: true )
+    .set { ch_vep_output }
   }
-  .join ( vep.out, failOnDuplicate: true )
+
+  ch_vep_output
   .map {
     tag, meta ->
       vcf = tag
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+
+from summary_stats import CsqSummary, PER_ALLELE_FIELDS, PER_VARIANT_FIELDS, SKIP_CONSEQUENCE
+
+CSQ_DESCRIPTION = "Consequence annotations from Ensembl VEP. Format: Allele|Consequence|IMPACT|SYMBOL|Gene|Feature_type|Feature|BIOTYPE|PHENOTYPES|PUBMED|VARIANT_CLASS"
+
+CONSEQUENCES = [
+    "missense_variant",
+    "synonymous_variant",
+    "intron_variant",
+    "splice_region_variant&intron_variant",
+    "3_prime_UTR_variant",
+    "5_prime_UTR_variant",
+    "non_coding_transcript_exon_variant",
+    "intron_variant&NMD_transcript_variant",
+    "upstream_gene_variant",
+    "downstream_gene_variant"
+]
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument('--variants', dest="variants", type=int, default=2000, help="number of variants on the synthetic chromosome (default: 2000)")
+    parser.add_argument('--memory_variants', dest="memory_variants", type=int, default=200, help="number of variants traced for memory (default: 200)")
+    parser.add_argument('--repeat', dest="repeat", type=int, default=3, help="number of timed runs, the best is reported (default: 3)")
+
+    return parser.parse_args(args)
+
+def get_csqs(rng: random.Random) -> tuple:
+    '''
+    CSQ of a variant in a gene-dense region: 1-3 alleles with 100-300 transcript and regulatory
+    entries each, some with phenotypes and citations. Returns (CSQ, allele order).
+    '''
+    alleles = ["A", "C", "T"][:rng.randint(1, 3)]
+    csqs = []
+    for allele in alleles:
+        # VEP gives a feature once per allele
+        for (idx, feature_idx) in enumerate(rng.sample(range(400), rng.randint(100, 300))):
+            gene = f"ENSG{feature_idx // 10:011d}"
+            if idx % 10 == 9:
+                (consequences, feature_type, feature) = ("regulatory_region_variant", "RegulatoryFeature", f"ENSR{feature_idx:011d}")
+            else:
+                (consequences, feature_type, feature) = (rng.choice(CONSEQUENCES), "Transcript", f"ENST{feature_idx:011d}")
+
+            phenotypes = ""
+            if idx % 7 == 0:
+                phenotypes = "&".join([
+                    f"Phenotype_{rng.randrange(50)}+ClinVar+{rng.choice([gene, 'rs699'])}"
+                    for _ in range(rng.randint(1, 4))
+                ])
+            citations = "&".join([str(rng.randrange(10 ** 8)) for _ in range(rng.randint(0, 3))]) if idx % 5 == 0 else ""
+
+            csqs.append("|".join([allele, consequences, "MODERATE", "SYM", gene, feature_type, feature, "protein_coding", phenotypes, citations, "SNV"]))
+            if idx % 50 == 49:
+                # not from VEP, but counted per (feature, consequences) pair
+                csqs.append("|".join([allele, rng.choice(CONSEQUENCES), "MODERATE", "SYM", gene, feature_type, feature, "protein_coding", "", "", "SNV"]))
+
+    return (",".join(csqs), alleles)
+
+def summarise_strings(csq_entries: list, allele_order: list) -> list:
+    'Counting on formatted strings, as before CsqSummary, to check the counts against'
+    items_per_variant = {item: set() for item in PER_VARIANT_FIELDS}
+    items_per_allele = {}
+
+    for (allele, consequences, feature_stable_id, gene, phenotypes, citations, variant_class) in csq_entries:
+        if allele not in items_per_allele:
+            items_per_allele[allele] = {item: set() for item in PER_ALLELE_FIELDS}
+
+        add_regulatory_feature = False
+        add_transcript_feature = False
+        for csq in consequences.split("&"):
+            if csq not in SKIP_CONSEQUENCE:
+                if csq.startswith("regulatory"):
+                    add_regulatory_feature = True
+                else:
+                    add_transcript_feature = True
+
+        if add_transcript_feature:
+            items_per_allele[allele]["gene"].add(gene)
+            items_per_allele[allele]["transcipt_consequence"].add(f"{feature_stable_id}:{consequences}")
+        if add_regulatory_feature:
+            items_per_allele[allele]["regulatory_consequence"].add(f"{feature_stable_id}:{consequences}")
+
+        for phenotype in phenotypes.split("&"):
+            pheno_per_allele_fields = phenotype.split("+")
+            if len(pheno_per_allele_fields) != 3:
+                continue
+
+            (name, source, feature) = pheno_per_allele_fields
+            if feature.startswith("ENS"):
+                items_per_allele[allele]["gene_phenotype"].add(f"{name}:{source}:{feature}")
+            else:
+                items_per_allele[allele]["variant_phenotype"].add(f"{name}:{source}:{feature}")
+
+        for citation in citations.split("&"):
+            if citation != "":
+                items_per_variant["citation"].add(citation)
+
+    summary_info = []
+    for field in PER_ALLELE_FIELDS:
+        field_nums = []
+        for allele in allele_order:
+            if allele in items_per_allele and len(items_per_allele[allele][field]) > 0:
+                field_nums.append(str(len(items_per_allele[allele][field])))
+        if field_nums:
+            summary_info.append((PER_ALLELE_FIELDS[field], ",".join(field_nums)))
+
+    for field in PER_VARIANT_FIELDS:
+        if len(items_per_variant[field]) > 0:
+            summary_info.append((PER_VARIANT_FIELDS[field], str(len(items_per_variant[field]))))
+
+    return summary_info
+
+def time_summarise(summarise, variants: list, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for (csq_entries, allele_order) in variants:
+            summarise(csq_entries, allele_order)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+def trace_summarise(summarise, variants: list) -> tuple:
+    '''
+    Memory allocated while summarising, variant by variant: (peak KiB of a variant, KiB still
+    allocated after the last variant). The CSQ entries are allocated before tracing starts.
+    '''
+    peak = 0
+    tracemalloc.start()
+    start_size = tracemalloc.get_traced_memory()[0]
+    for (csq_entries, allele_order) in variants:
+        tracemalloc.reset_peak()
+        (before, _) = tracemalloc.get_traced_memory()
+        summarise(csq_entries, allele_order)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - start_size
+    tracemalloc.stop()
+
+    return (peak / 1024, retained / 1024)
+
+def main(args = None):
+    description = '''
+    Benchmark CsqSummary.summarise of summary_stats.py on the CSQ entries of a synthetic variant-dense chromosome.
+    Its counts are first compared with counting on formatted strings, as summary_stats.py did before CsqSummary.
+    '''
+    args = parse_args(args, description)
+
+    rng = random.Random(1)
+    csq_summary = CsqSummary(CSQ_DESCRIPTION, "homo_sapiens")
+    variants = []
+    for _ in range(args.variants):
+        (csqs, allele_order) = get_csqs(rng)
+        variants.append((csq_summary.parse(csqs), allele_order))
+    entries = sum(len(csq_entries) for (csq_entries, _) in variants)
+    print(f"[INFO] {args.variants} variants, {entries} CSQ entries")
+
+    for (csq_entries, allele_order) in variants:
+        if csq_summary.summarise(csq_entries, allele_order) != summarise_strings(csq_entries, allele_order):
+            print(f"[ERROR] CsqSummary counts differ from counting on strings")
+            exit(1)
+
+    strings_time = time_summarise(summarise_strings, variants, args.repeat)
+    summary_time = time_summarise(csq_summary.summarise, variants, args.repeat)
+    print(f"[INFO] Wall time: strings {strings_time:.2f}s, CsqSummary {summary_time:.2f}s, same counts")
+
+    traced_variants = variants[:args.memory_variants]
+    (strings_peak, strings_retained) = trace_summarise(summarise_strings, traced_variants)
+    (summary_peak, summary_retained) = trace_summarise(csq_summary.summarise, traced_variants)
+    print(f"[INFO] Peak memory of a variant over {len(traced_variants)} variants: strings {strings_peak:.0f} KiB, CsqSummary {summary_peak:.0f} KiB")
+    print(f"[INFO] Memory kept after them: strings {strings_retained:.0f} KiB, CsqSummary {summary_retained:.0f} KiB")
+
+if __name__ == "__main__":
+    sys.exit(main())
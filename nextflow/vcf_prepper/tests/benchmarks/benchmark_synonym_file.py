@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+from argparse import RawTextHelpFormatter
+import os
+import time
+import sqlite3
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+
+from generate_synonym_file import generate_synonym_file, resolve_synonyms
+
+CORE_DB = "benchmark_core_110_1"
+
+def parse_args(args = None, description: bool = None):
+    parser = argparse.ArgumentParser(description = description, formatter_class=RawTextHelpFormatter)
+
+    parser.add_argument('--contigs', dest="contigs", type=int, default=500000, help="number of seq regions in the synthetic core db (default: 500000)")
+    parser.add_argument('--reference_contigs', dest="reference_contigs", type=int, default=5000, help="number of seq regions to compare with the quadratic resolver (default: 5000)")
+    parser.add_argument('--temp_dir', dest="temp_dir", type=str, help="directory for the synthetic core db")
+
+    return parser.parse_args(args)
+
+def get_rows(contigs: int) -> list:
+    '''
+    Synthetic (seq_region_id, name, synonyms) of a scaffold-level assembly. A quarter of the
+    scaffolds have a name longer than 31 characters, every scaffold has a short INSDC synonym and
+    the long-named ones also have a long synonym. For every eighth scaffold another seq region is
+    named as that long synonym, so the long synonym is resolved to the short synonym of that
+    region; the other long synonyms cannot be resolved.
+    '''
+    padding = "_pseudomolecule_assembly_v1"
+    rows = []
+    for i in range(contigs):
+        if i % 4 == 0:
+            name = f"TraesCS_scaffold_{i:07d}{padding}"
+            long_synonym = f"TGAC_v1_scaffold_{i:07d}{padding}"
+            rows.append((i, name, [f"LS{i:08d}.1", long_synonym]))
+            if i % 8 == 0:
+                rows.append((contigs + i, long_synonym, [f"alt{i}"]))
+        else:
+            rows.append((i, f"scaffold_{i}", [f"LS{i:08d}.1", f"chrUn_{i}"]))
+
+    return rows
+
+def create_core_db(db_dir: str, contigs: int) -> None:
+    connection = sqlite3.connect(os.path.join(db_dir, CORE_DB + ".sqlite"))
+    connection.execute("CREATE TABLE seq_region (seq_region_id INTEGER, name TEXT)")
+    connection.execute("CREATE TABLE seq_region_synonym (seq_region_id INTEGER, synonym TEXT)")
+    for (seq_region_id, name, synonyms) in get_rows(contigs):
+        connection.execute("INSERT INTO seq_region VALUES (?, ?)", (seq_region_id, name))
+        connection.executemany("INSERT INTO seq_region_synonym VALUES (?, ?)", [(seq_region_id, synonym) for synonym in synonyms])
+    connection.commit()
+    connection.close()
+
+def resolve_synonyms_quadratic(rows) -> list:
+    'The resolver before the reverse index, to check the output against'
+    names = {}
+    for (synonym, name) in rows:
+        if synonym not in names or len(names[synonym]) > len(name):
+            names[synonym] = name
+
+    new_names = {}
+    for synonym in names:
+        name = names[synonym]
+        if len(name) > 31:
+            if len(synonym) > 31:
+                change_name = synonym
+                for alt_synonym in names:
+                    if names[alt_synonym] == synonym and len(alt_synonym) < 31:
+                        change_name = alt_synonym
+                new_names[synonym] = change_name
+        else:
+            new_names[synonym] = name
+
+    return list(new_names.items())
+
+def get_synonym_rows(contigs: int) -> list:
+    return [(synonym, name) for (_, name, synonyms) in get_rows(contigs) for synonym in synonyms]
+
+def main(args = None):
+    description = '''
+    Benchmark generate_synonym_file.py on a synthetic scaffold-level core db (sqlite, see bin/db.py).
+    The output of the indexed resolver is first compared with the quadratic resolver it replaced on a smaller db.
+    '''
+    args = parse_args(args, description)
+
+    # warnings for the long names that cannot be resolved are not shown
+    devnull = open(os.devnull, "w")
+
+    reference_rows = get_synonym_rows(args.reference_contigs)
+    start = time.perf_counter()
+    expected = resolve_synonyms_quadratic(reference_rows)
+    quadratic_time = time.perf_counter() - start
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(devnull):
+        resolved = list(resolve_synonyms(reference_rows))
+    indexed_time = time.perf_counter() - start
+    if resolved != expected:
+        print(f"[ERROR] Indexed resolver output differs from the quadratic resolver")
+        exit(1)
+    print(f"[INFO] {args.reference_contigs} seq regions: quadratic {quadratic_time:.2f}s, indexed {indexed_time:.3f}s, same output")
+
+    rows = get_synonym_rows(args.contigs)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(devnull):
+        for _ in resolve_synonyms(rows):
+            pass
+    print(f"[INFO] {args.contigs} seq regions: indexed {time.perf_counter() - start:.2f}s")
+
+    with tempfile.TemporaryDirectory(dir = args.temp_dir) as db_dir:
+        start = time.perf_counter()
+        create_core_db(db_dir, args.contigs)
+        print(f"[INFO] Created core db with {args.contigs} seq regions in {time.perf_counter() - start:.1f}s")
+
+        synonym_file = os.path.join(db_dir, "benchmark.synonyms")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            generate_synonym_file({"sqlite": db_dir}, CORE_DB, synonym_file, force = True)
+        total_time = time.perf_counter() - start
+
+        with open(synonym_file, "r") as file:
+            lines = sum(1 for _ in file)
+        print(f"[INFO] generate_synonym_file: {args.contigs} seq regions, {lines} synonyms written in {total_time:.2f}s")
+
+if __name__ == "__main__":
+    sys.exit(main())
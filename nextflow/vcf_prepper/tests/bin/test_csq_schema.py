@@ -0,0 +1,57 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+
+from csq_schema import CsqSchema
+
+CSQ_DESCRIPTION = '"Consequence annotations from Ensembl VEP. Format: Allele|Consequence|IMPACT|Feature|VARIANT_CLASS"'
+CSQS = "A|missense_variant|MODERATE|ENST01|SNV,T|intron_variant|MODIFIER|ENST02|SNV"
+
+def test_parse():
+    schema = CsqSchema(CSQ_DESCRIPTION, ["Consequence", "Allele"])
+
+    assert schema.parse(CSQS) == [("missense_variant", "A"), ("intron_variant", "T")]
+    assert schema.project("A|missense_variant|MODERATE|ENST01|SNV") == ("missense_variant", "A")
+
+def test_parse_all_fields():
+    schema = CsqSchema(CSQ_DESCRIPTION)
+
+    assert schema.fields == ["Allele", "Consequence", "IMPACT", "Feature", "VARIANT_CLASS"]
+    assert schema.parse(CSQS)[1] == ("T", "intron_variant", "MODIFIER", "ENST02", "SNV")
+
+def test_parse_one_field():
+    schema = CsqSchema(CSQ_DESCRIPTION, ["VARIANT_CLASS"])
+
+    assert schema.parse(CSQS) == [("SNV", ), ("SNV", )]
+
+def test_parse_missing_fields():
+    schema = CsqSchema(CSQ_DESCRIPTION, ["Feature", "PHENOTYPES"])
+
+    assert schema.parse(CSQS) == [("ENST01", ""), ("ENST02", "")]
+    assert not schema.has("PHENOTYPES")
+
+def test_parse_no_fields():
+    # callers ask for the fields the header has (as datachecks/test_vcf.py), which can be none
+    header = CsqSchema(CSQ_DESCRIPTION)
+    schema = CsqSchema(CSQ_DESCRIPTION, [field for field in ["PHENOTYPES", "PUBMED"] if header.has(field)])
+
+    assert schema.parse(CSQS) == [(), ()]
+    assert schema.project("A|missense_variant|MODERATE|ENST01|SNV") == ()
+
+    schema.set_fields(["IMPACT"])
+    assert schema.parse(CSQS) == [("MODERATE", ), ("MODIFIER", )]
@@ -0,0 +1,200 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+import sqlite3
+import types
+import datetime
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+
+import db
+from db import DatabaseError, iter_query, query, query_column, query_value, list_databases
+
+@pytest.fixture
+def server(tmp_path):
+    connection = sqlite3.connect(tmp_path / "homo_sapiens_core_114_38.sqlite")
+    connection.executescript('''
+        CREATE TABLE seq_region (seq_region_id INTEGER, name TEXT, length INTEGER, coord_system_id INTEGER);
+        INSERT INTO seq_region VALUES (1, '1', 248956422, 1), (2, 'X', 156040895, 1), (3, 'KI270728.1', 1872759, 2);
+        CREATE TABLE meta (meta_key TEXT, meta_value TEXT);
+        INSERT INTO meta VALUES ('species.division', 'EnsemblVertebrates');
+    ''')
+    connection.commit()
+    connection.close()
+    for database in ("mus_musculus_core_114_39", "homo_sapiens_variation_114_38"):
+        sqlite3.connect(tmp_path / f"{database}.sqlite").close()
+    (tmp_path / "notes.txt").write_text("not a database")
+
+    yield {"sqlite": str(tmp_path)}
+    db.close_connections()
+
+def test_query(server):
+    rows = query(server, "SELECT name, length FROM seq_region WHERE coord_system_id = %s ORDER BY seq_region_id", (1, ), "homo_sapiens_core_114_38")
+
+    assert rows == [("1", 248956422), ("X", 156040895)]
+    assert (rows[0].name, rows[0].length) == ("1", 248956422)
+    assert isinstance(rows[0].length, int)
+
+def test_query_quoted_parameter(server):
+    rows = query(server, "SELECT name FROM seq_region WHERE name = %s", ("X' OR '1'='1", ), "homo_sapiens_core_114_38")
+
+    assert rows == []
+
+def test_query_column(server):
+    names = query_column(server, "SELECT name FROM seq_region ORDER BY seq_region_id", (), "homo_sapiens_core_114_38")
+
+    assert names == ["1", "X", "KI270728.1"]
+
+def test_query_value(server):
+    sql = "SELECT meta_value FROM meta WHERE meta_key = %s"
+
+    assert query_value(server, sql, ("species.division", ), "homo_sapiens_core_114_38") == "EnsemblVertebrates"
+    assert query_value(server, sql, ("species.production_name", ), "homo_sapiens_core_114_38") is None
+
+def test_iter_query(server):
+    rows = iter_query(server, "SELECT seq_region_id, name FROM seq_region ORDER BY seq_region_id", (), "homo_sapiens_core_114_38")
+
+    assert next(rows) == (1, "1")
+    assert [row.name for row in rows] == ["X", "KI270728.1"]
+
+def test_iter_query_errors(server):
+    with pytest.raises(DatabaseError, match = "Unknown database"):
+        list(iter_query(server, "SELECT 1", (), "danio_rerio_core_114_11"))
+
+    with pytest.raises(DatabaseError):
+        list(iter_query(server, "SELECT * FROM no_table", (), "homo_sapiens_core_114_38"))
+
+def test_list_databases(server):
+    assert list_databases(server) == [
+        "homo_sapiens_core_114_38",
+        "homo_sapiens_variation_114_38",
+        "mus_musculus_core_114_39"
+    ]
+    assert list_databases(server, "%_core_114_%") == ["homo_sapiens_core_114_38", "mus_musculus_core_114_39"]
+    assert list_databases(server, "HOMO_SAPIENS_CORE%") == ["homo_sapiens_core_114_38"]
+    assert list_databases(server, "homo_sapiens_core_114_3_") == ["homo_sapiens_core_114_38"]
+    assert list_databases(server, "homo_sapiens_core_114") == []
+
+# output of mysql --batch --column-type-info for
+#   SELECT seq_region_id, name, length, created, score FROM ...
+CLIENT_OUTPUT = ''.join(
+    f"Field {index:3}:  `{name}`\n"
+    "Catalog:    `def`\n"
+    "Database:   `homo_sapiens_core_114_38`\n"
+    "Table:      `seq_region`\n"
+    "Org_table:  `seq_region`\n"
+    f"Type:       {column_type}\n"
+    "Collation:  binary (63)\n"
+    "Length:     10\n"
+    "Max_length: 9\n"
+    "Decimals:   0\n"
+    "Flags:      NOT_NULL\n"
+    "\n"
+    for (index, (name, column_type)) in enumerate([
+        ("seq_region_id", "LONG"),
+        ("name", "VAR_STRING"),
+        ("length", "LONGLONG"),
+        ("created", "DATETIME"),
+        ("score", "NEWDECIMAL")
+    ], 1)
+) + (
+    "seq_region_id\tname\tlength\tcreated\tscore\n"
+    "1\t1\t248956422\t2024-01-31 10:00:00\t0.50\n"
+    "2\tX\\tY\tNULL\t0000-00-00 00:00:00\tNULL\n"
+)
+
+def test_client_rows_are_typed(tmp_path, monkeypatch, capsys):
+    (tmp_path / "output.txt").write_text(CLIENT_OUTPUT)
+    mysql = tmp_path / "mysql"
+    mysql.write_text(f"#!/bin/sh\ncat {tmp_path / 'output.txt'}\n")
+    mysql.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(db, "pymysql", None)
+
+    server = {"host": "localhost", "port": 3306, "user": "ensro"}
+    rows = query(server, "SELECT seq_region_id, name, length, created, score FROM seq_region", (), "homo_sapiens_core_114_38")
+
+    assert rows == [
+        (1, "1", 248956422, datetime.datetime(2024, 1, 31, 10, 0, 0), Decimal("0.50")),
+        (2, "X\tY", None, "0000-00-00 00:00:00", None)
+    ]
+    assert rows[0]._fields == ("seq_region_id", "name", "length", "created", "score")
+
+    assert "[WARNING] PyMySQL is not installed" in capsys.readouterr().out
+
+class FakeConnection():
+    '''
+    Stand-in for a PyMySQL connection on the sqlite files. As PyMySQL, ping(reconnect = True)
+    opens a closed connection again without the database chosen by select_db.
+    '''
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.open = True
+        self.database = None
+
+    def ping(self, reconnect: bool = True):
+        if not self.open:
+            self.open = True
+            self.database = None
+
+    def select_db(self, database: str):
+        self.database = sqlite3.connect(os.path.join(self.directory, database + ".sqlite"))
+
+    def cursor(self, cursor_type):
+        if self.database is None:
+            raise FakeMySQLError("(1046, 'No database selected')")
+        return self.database.cursor(FakeCursor)
+
+    def close(self):
+        self.open = False
+
+class FakeCursor(sqlite3.Cursor):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def execute(self, sql: str, params: tuple):
+        return super().execute(sql.replace("%s", "?"), params)
+
+class FakeMySQLError(Exception):
+    pass
+
+@pytest.fixture
+def fake_pymysql(server, monkeypatch):
+    module = types.SimpleNamespace(
+        connect = lambda **kwargs: FakeConnection(server["sqlite"]),
+        cursors = types.SimpleNamespace(SSCursor = None),
+        MySQLError = FakeMySQLError
+    )
+    monkeypatch.setattr(db, "pymysql", module)
+
+    return {"host": "localhost", "port": 3306, "user": "ensro"}
+
+def test_reconnect_selects_database(fake_pymysql):
+    sql = "SELECT name FROM seq_region WHERE seq_region_id = %s"
+    database = "homo_sapiens_core_114_38"
+
+    assert query_value(fake_pymysql, sql, (1, ), database) == "1"
+    # e.g. - the server closed the connection after wait_timeout
+    for connection in db._connections.values():
+        connection.close()
+    assert query_value(fake_pymysql, sql, (2, ), database) == "X"
@@ -0,0 +1,158 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+import re
+import json
+import random
+import subprocess
+import threading
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+
+import helper
+from helper import Download, download_file
+
+class FtpStandIn(BaseHTTPRequestHandler):
+    '''
+    Files of server.files served with HEAD and range GET requests. A range response is cut after
+    server.cut_after bytes if it is set, and the ranges requested are kept in server.requested.
+    '''
+
+    def log_message(self, *args):
+        pass
+
+    def _file(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+        return data
+
+    def do_HEAD(self):
+        data = self._file()
+        if data is None:
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+
+    def do_GET(self):
+        data = self._file()
+        if data is None:
+            return
+
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if match is None:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        (start, end) = (int(match.group(1)), int(match.group(2)) + 1)
+        with self.server.lock:
+            self.server.requested.append((start, end))
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        if self.server.cut_after is not None:
+            end = min(end, start + self.server.cut_after)
+        self.wfile.write(data[start:end])
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FtpStandIn)
+    server.files = {}
+    server.cut_after = None
+    server.requested = []
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse = True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(helper, "DOWNLOAD_CHUNK_SIZE", 4096)
+    monkeypatch.setattr(helper, "DOWNLOAD_RETRIES", 1)
+    monkeypatch.setattr(helper, "DOWNLOAD_TIMEOUT", 5)
+
+def bsd_sum(data: bytes) -> tuple:
+    stdout = subprocess.run(["sum", "-r"], input = data, stdout = subprocess.PIPE, check = True).stdout
+    (checksum, blocks) = stdout.decode().split()[:2]
+
+    return (int(checksum), int(blocks))
+
+DATA = random.Random(1).randbytes(100000)
+
+def test_download(server, tmp_path):
+    server.files["/pub/homo_sapiens.fa.gz"] = DATA
+    server.files["/pub/CHECKSUMS"] = f"{bsd_sum(DATA)[0]} {bsd_sum(DATA)[1]} homo_sapiens.fa.gz\n".encode()
+    local_file = tmp_path / "homo_sapiens.fa.gz"
+
+    assert download_file(str(local_file), server.url + "/pub/homo_sapiens.fa.gz", verify_checksum = True) == 0
+    assert local_file.read_bytes() == DATA
+    assert os.listdir(tmp_path) == ["homo_sapiens.fa.gz"]
+
+def test_download_resume(server, tmp_path):
+    server.files["/homo_sapiens.fa.gz"] = DATA
+    local_file = tmp_path / "homo_sapiens.fa.gz"
+    url = server.url + "/homo_sapiens.fa.gz"
+
+    # every range is cut short, the download fails with what was written in the journal
+    server.cut_after = 10000
+    with pytest.raises(OSError):
+        Download(str(local_file), url, connections = 2).run()
+    assert not local_file.exists()
+    with open(str(local_file) + ".part.json") as file:
+        done = json.load(file)["done"]
+    assert done == [[0, 10000], [50000, 60000]]
+
+    # the next attempt only requests the missing ranges
+    server.cut_after = None
+    server.requested.clear()
+    assert Download(str(local_file), url, connections = 2, checksum = bsd_sum(DATA)).run()
+    assert local_file.read_bytes() == DATA
+    assert sorted(server.requested) == [(10000, 50000), (60000, 100000)]
+    assert os.listdir(tmp_path) == ["homo_sapiens.fa.gz"]
+
+def test_download_checksum_mismatch(server, tmp_path):
+    server.files["/pub/homo_sapiens.fa.gz"] = DATA
+    (checksum, blocks) = bsd_sum(DATA)
+    server.files["/pub/CHECKSUMS"] = f"{(checksum + 1) % 65536} {blocks} homo_sapiens.fa.gz\n".encode()
+    local_file = tmp_path / "homo_sapiens.fa.gz"
+
+    assert download_file(str(local_file), server.url + "/pub/homo_sapiens.fa.gz", verify_checksum = True) == 1
+    # a corrupt download is not kept to be resumed
+    assert os.listdir(tmp_path) == []
+
+def test_download_not_found(server, tmp_path):
+    local_file = tmp_path / "homo_sapiens.fa.gz"
+
+    with pytest.raises(urllib.error.HTTPError, match = "404"):
+        Download(str(local_file), server.url + "/homo_sapiens.fa.gz").run()
+    assert download_file(str(local_file), server.url + "/homo_sapiens.fa.gz") == 1
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,102 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+import io
+import tarfile
+import functools
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+
+from extract_cache import main, is_extracted
+
+ARCHIVE_NAME = "homo_sapiens_vep_114_GRCh38.tar.gz"
+CACHE_FILES = {
+    "homo_sapiens/114_GRCh38/info.txt": b"species\thomo_sapiens\n",
+    "homo_sapiens/114_GRCh38/1/1-1000000.gz": bytes(range(256)) * 100,
+    "homo_sapiens/114_GRCh38/X/1-1000000.gz": b"X" * 5000
+}
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def ftp_dir(tmp_path):
+    ftp_dir = tmp_path / "ftp"
+    ftp_dir.mkdir()
+    handler = functools.partial(QuietHandler, directory = str(ftp_dir))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+
+    yield (ftp_dir, f"http://127.0.0.1:{server.server_address[1]}")
+
+    server.shutdown()
+    server.server_close()
+
+def write_archive(archive_file) -> None:
+    with tarfile.open(archive_file, "w:gz") as tar:
+        for (name, data) in CACHE_FILES.items():
+            member = tarfile.TarInfo(name)
+            member.size = len(data)
+            tar.addfile(member, io.BytesIO(data))
+
+def test_extract_url(ftp_dir, tmp_path):
+    (ftp_dir, url) = ftp_dir
+    write_archive(ftp_dir / ARCHIVE_NAME)
+    cache_dir = tmp_path / "cache"
+
+    main([f"{url}/{ARCHIVE_NAME}", "--cache_dir", str(cache_dir)])
+
+    for (name, data) in CACHE_FILES.items():
+        assert (cache_dir / name).read_bytes() == data
+    assert is_extracted(str(cache_dir / "homo_sapiens/114_GRCh38"))
+
+def test_extract_not_found(ftp_dir, tmp_path, capsys):
+    (ftp_dir, url) = ftp_dir
+    cache_dir = tmp_path / "cache"
+    genome_cache_dir = str(cache_dir / "homo_sapiens/114_GRCh38")
+
+    with pytest.raises(SystemExit):
+        main([f"{url}/{ARCHIVE_NAME}", "--cache_dir", str(cache_dir)])
+    # the error of the source is reported, not that of reading an empty archive
+    output = capsys.readouterr().out
+    assert "HTTP Error 404" in output
+    assert "empty file" not in output
+
+    # the directory left by the failed attempt is not taken as an extracted cache
+    assert os.path.isdir(genome_cache_dir)
+    assert not is_extracted(genome_cache_dir)
+
+    write_archive(ftp_dir / ARCHIVE_NAME)
+    main([f"{url}/{ARCHIVE_NAME}", "--cache_dir", str(cache_dir)])
+    assert is_extracted(genome_cache_dir)
+    assert (cache_dir / "homo_sapiens/114_GRCh38/X/1-1000000.gz").read_bytes() == CACHE_FILES["homo_sapiens/114_GRCh38/X/1-1000000.gz"]
+
+def test_is_extracted_legacy(tmp_path):
+    # extracted by tar, before the manifest
+    legacy_dir = tmp_path / "homo_sapiens/113_GRCh38"
+    legacy_dir.mkdir(parents = True)
+    (legacy_dir / "info.txt").write_text("species\thomo_sapiens\n")
+    assert is_extracted(str(legacy_dir))
+
+    empty_dir = tmp_path / "homo_sapiens/114_GRCh38"
+    empty_dir.mkdir(parents = True)
+    assert not is_extracted(str(empty_dir))
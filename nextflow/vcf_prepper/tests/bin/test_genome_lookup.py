@@ -0,0 +1,139 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+import sqlite3
+from collections.abc import Mapping, Set
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+
+import db
+from genome_lookup import GenomeLookup, write_genome_lookup
+from generate_genome_bundle import generate_genome_bundle
+from generate_chrom_sizes import generate_chrom_sizes
+from generate_synonym_file import generate_synonym_file
+
+CORE_DB = "homo_sapiens_core_114_38"
+
+CHROM_SIZES = {"1": 248956423, "X": 156040896, "chr1": 248956423, "KI270728.1": 1872760, "scaffold_é": 10}
+SYNONYMS = {"chr1": "1", "chrX": "X", "NC_000001.11": "1", "contig_syn": "contig_1", "KI270728.1": "chr16_KI270728v1_random"}
+
+def test_round_trip(tmp_path):
+    lookup_file = str(tmp_path / "homo_sapiens_GRCh38.gcb")
+    write_genome_lookup(lookup_file, CHROM_SIZES, SYNONYMS)
+    lookup = GenomeLookup(lookup_file)
+
+    synonyms = lookup.synonyms
+    assert isinstance(synonyms, Mapping)
+    assert dict(synonyms) == SYNONYMS
+    assert len(synonyms) == len(SYNONYMS)
+    assert synonyms["NC_000001.11"] == "1"
+    assert synonyms.get("X") is None
+    assert "chrX" in synonyms and "1" not in synonyms
+    with pytest.raises(KeyError):
+        synonyms["chrY"]
+
+    chromosomes = lookup.chromosomes
+    assert isinstance(chromosomes, Set)
+    assert chromosomes == set(CHROM_SIZES)
+    assert len(chromosomes) == len(CHROM_SIZES)
+    assert "scaffold_é" in chromosomes
+    assert "chrX" not in chromosomes and "Y" not in chromosomes
+
+    # with a length but no synonym, with a synonym but no length, with both, with neither
+    assert lookup.find("X") == (None, 156040896)
+    assert lookup.find("chrX") == ("X", None)
+    assert lookup.find("KI270728.1") == ("chr16_KI270728v1_random", 1872760)
+    assert lookup.find("Y") == (None, None)
+
+    names = [name for (name, _, _) in lookup.items()]
+    assert names == sorted(set(CHROM_SIZES) | set(SYNONYMS), key = lambda name: name.encode())
+
+def test_empty_and_invalid(tmp_path):
+    lookup_file = str(tmp_path / "empty.gcb")
+    write_genome_lookup(lookup_file, {}, {})
+    lookup = GenomeLookup(lookup_file)
+
+    assert dict(lookup.synonyms) == {} and set(lookup.chromosomes) == set()
+    assert lookup.find("1") == (None, None)
+
+    for text in ("1\t248956423\n", "1\t248956423\nX\t156040896\n"):
+        (tmp_path / "homo_sapiens_GRCh38.chrom.sizes").write_text(text)
+        with pytest.raises(ValueError, match = "not a genome lookup file"):
+            GenomeLookup(str(tmp_path / "homo_sapiens_GRCh38.chrom.sizes"))
+
+@pytest.fixture
+def server(tmp_path):
+    'Core db with chromosomes and scaffolds of GRCh38, chromosomes of GRCh37 and contigs without version'
+    connection = sqlite3.connect(tmp_path / f"{CORE_DB}.sqlite")
+    connection.executescript('''
+        CREATE TABLE coord_system (coord_system_id INTEGER, name TEXT, version TEXT);
+        INSERT INTO coord_system VALUES (1, 'chromosome', 'GRCh38'), (2, 'scaffold', 'GRCh38'), (3, 'chromosome', 'GRCh37'), (4, 'contig', NULL);
+        CREATE TABLE seq_region (seq_region_id INTEGER, name TEXT, length INTEGER, coord_system_id INTEGER);
+        INSERT INTO seq_region VALUES
+            (1, '1', 248956422, 1),
+            (2, 'X', 156040895, 1),
+            (3, 'KI270728.1', 1872759, 2),
+            (4, 'HSCHR1_1_CTG3_ALTERNATE_SCAFFOLD_1', 180000, 2),
+            (5, '1', 249250621, 3),
+            (6, 'AC000001.1', 40000, 4),
+            (7, 'MT', 16569, 1);
+        CREATE TABLE seq_region_synonym (seq_region_synonym_id INTEGER, seq_region_id INTEGER, synonym TEXT);
+        INSERT INTO seq_region_synonym VALUES
+            (1, 1, 'chr1'),
+            (2, 1, 'NC_000001.11'),
+            (3, 2, 'chrX'),
+            (4, 3, 'chr16_KI270728v1_random'),
+            (5, 4, 'NT_187361.1'),
+            (6, 4, 'HSCHR1_1_CTG3_ALTERNATE_SCAFFOLD_SYNONYM'),
+            (7, 5, 'chr1'),
+            (8, 5, 'NC_000001.10'),
+            (9, 6, 'contig_1'),
+            (10, 3, 'X');
+    ''')
+    connection.commit()
+    connection.close()
+
+    yield {"sqlite": str(tmp_path)}
+    db.close_connections()
+
+def read_tsv(tsv_file: str) -> dict:
+    with open(tsv_file) as file:
+        return dict(line.rstrip("\n").split("\t") for line in file)
+
+def test_bundle_matches_generate_scripts(tmp_path, server):
+    bundle_prefix = str(tmp_path / f"{CORE_DB}.GRCh38")
+    generate_genome_bundle(server, CORE_DB, bundle_prefix, "GRCh38")
+    generate_chrom_sizes(server, CORE_DB, str(tmp_path / "homo_sapiens_GRCh38.chrom.sizes"), "GRCh38")
+    generate_synonym_file(server, CORE_DB, str(tmp_path / "homo_sapiens_GRCh38.synonyms"))
+
+    chrom_sizes = read_tsv(tmp_path / "homo_sapiens_GRCh38.chrom.sizes")
+    synonyms = read_tsv(tmp_path / "homo_sapiens_GRCh38.synonyms")
+    assert read_tsv(f"{bundle_prefix}.chrom.sizes") == chrom_sizes
+    assert read_tsv(f"{bundle_prefix}.synonyms") == synonyms
+
+    # GRCh38 lengths + 1, the longest where a synonym is also a name
+    assert chrom_sizes["1"] == chrom_sizes["chr1"] == "248956423"
+    assert chrom_sizes["X"] == "156040896"
+    assert "AC000001.1" not in chrom_sizes and "contig_1" not in chrom_sizes
+    # short synonyms of names longer than 31 characters are left out
+    assert "NT_187361.1" not in synonyms
+    assert synonyms["contig_1"] == "AC000001.1"
+
+    lookup = GenomeLookup(f"{bundle_prefix}.gcb")
+    assert dict(lookup.synonyms) == synonyms
+    assert {name: str(length) for (name, _, length) in lookup.items() if length is not None} == chrom_sizes
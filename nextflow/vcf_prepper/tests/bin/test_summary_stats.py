@@ -0,0 +1,65 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import gzip
+import json
+import subprocess
+
+import pytest
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+SCRIPT = os.path.join(TEST_DIR, "../../bin/summary_stats.py")
+# VEP output with CSQ - test_runvep.vcf.gz is the VEP input and has none
+INPUT_FILE = os.path.join(TEST_DIR, "../data/test_summarystats.vcf.gz")
+
+def run_summary_stats(out_dir, engine, threads):
+    output_file = os.path.join(out_dir, f"{engine}_{threads}.vcf.gz")
+    metrics_file = os.path.join(out_dir, f"{engine}_{threads}.json")
+    env = dict(os.environ, USER = os.environ.get("USER", "nextflow"))
+    subprocess.run([
+            sys.executable, SCRIPT, "homo_sapiens", "GRCh38", INPUT_FILE,
+            "-O", output_file,
+            "--engine", engine,
+            "--threads", str(threads),
+            "--metrics_file", metrics_file
+        ],
+        env = env, check = True, capture_output = True
+    )
+
+    with gzip.open(output_file, "rt") as file:
+        vcf = file.read()
+    with open(metrics_file) as file:
+        metrics = json.load(file)
+
+    return (vcf, metrics)
+
+@pytest.fixture(scope = "module")
+def cyvcf2_output(tmp_path_factory):
+    return run_summary_stats(tmp_path_factory.mktemp("cyvcf2"), "cyvcf2", 1)
+
+def test_cyvcf2_output(cyvcf2_output):
+    (vcf, metrics) = cyvcf2_output
+
+    assert metrics["variant_count"] == 48
+    assert metrics["chromosome_variant_count"] == {"1": 12, "2": 12, "X": 12, "MT": 12}
+    assert sum(1 for line in vcf.splitlines() if not line.startswith("#")) == 48
+
+@pytest.mark.parametrize("engine,threads", [("cyvcf2", 2), ("bytes", 1), ("bytes", 2)])
+def test_engines_match(tmp_path, cyvcf2_output, engine, threads):
+    (vcf, metrics) = run_summary_stats(tmp_path, engine, threads)
+
+    assert vcf == cyvcf2_output[0]
+    assert metrics == cyvcf2_output[1]
@@ -0,0 +1,148 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import random
+
+import pytest
+import pysam
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin"))
+from bgzf import BgzfWriter, BGZF_BLOCK_SIZE
+from helper import VcfIndex
+
+CONTIGS = {"1": 3_000_000, "2": 1_000_000, "X": 2_000_000}
+HEADER = "##fileformat=VCFv4.2\n" + \
+    "".join(f"##contig=<ID={name},length={length}>\n" for (name, length) in CONTIGS.items()) + \
+    '##INFO=<ID=END,Number=1,Type=Integer,Description="End position">\n' + \
+    '##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">\n' + \
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+def make_records(contigs: dict) -> list:
+    '''
+    Sorted records as (chrom, begin, end, line) - enough to span several BGZF blocks and index
+    windows, with some deletions, records at the same position and deletions with INFO/END.
+    '''
+    rng = random.Random(42)
+    records = []
+    for (chrom, length) in contigs.items():
+        pos = 1
+        while True:
+            pos += rng.choices([0, 1, 10, 50, 300, 2000, 20000], [2, 2, 2, 2, 2, 1, 0.2])[0]
+            if pos > length - 10000:
+                break
+
+            if rng.random() < 0.02:
+                end = pos + rng.randint(100, 100000)
+                (ref, alt, info) = ("N", "<DEL>", f"SVTYPE=DEL;END={end}")
+            else:
+                ref = "".join(rng.choice("ACGT") for _ in range(rng.choice([1, 1, 1, 5, 40])))
+                (alt, info, end) = ("A", ".", pos - 1 + len(ref))
+            line = f"{chrom}\t{pos}\tvar{len(records)}\t{ref}\t{alt}\t.\t.\t{info}\n"
+            records.append((chrom, pos - 1, end, line))
+
+    return records
+
+def write_vcf(output_file: str, records: list, index_type: str, threads: int = 1) -> VcfIndex:
+    index = VcfIndex(index_type)
+    with BgzfWriter(output_file, threads = threads, index = index) as file:
+        file.write(HEADER)
+        for record in records:
+            file.write(record[3])
+
+    return index
+
+@pytest.fixture(scope = "module")
+def records():
+    records = make_records(CONTIGS)
+    assert sum(len(record[3]) for record in records) > 4 * BGZF_BLOCK_SIZE
+    return records
+
+@pytest.mark.parametrize("index_type,threads", [("tbi", 1), ("csi", 1), ("tbi", 4)])
+def test_fetch_regions(tmp_path, records, index_type, threads):
+    output_file = str(tmp_path / "test.vcf.gz")
+    index_file = f"{output_file}.{index_type}"
+    index = write_vcf(output_file, records, index_type, threads)
+
+    assert index.write(index_file)
+
+    rng = random.Random(7)
+    regions = [(chrom, 0, length) for (chrom, length) in CONTIGS.items()]
+    for _ in range(200):
+        chrom = rng.choice(list(CONTIGS))
+        start = rng.randrange(CONTIGS[chrom])
+        regions.append((chrom, start, start + rng.choice([1, 100, 20000, 500000])))
+
+    with pysam.VariantFile(output_file, index_filename = index_file) as vcf:
+        for (chrom, start, stop) in regions:
+            fetched = [record.id for record in vcf.fetch(chrom, start, stop)]
+            expected = [
+                record[3].split("\t")[2] for record in records
+                if record[0] == chrom and record[1] < stop and record[2] > start
+            ]
+            assert fetched == expected, (chrom, start, stop)
+
+def test_record_counts(tmp_path, records):
+    output_file = str(tmp_path / "test.vcf.gz")
+    index = write_vcf(output_file, records, "tbi")
+    assert index.write(output_file + ".tbi")
+
+    with pysam.TabixFile(output_file, index = output_file + ".tbi") as vcf:
+        assert vcf.contigs == list(CONTIGS)
+        for chrom in CONTIGS:
+            assert sum(1 for _ in vcf.fetch(chrom)) == sum(1 for record in records if record[0] == chrom)
+
+@pytest.mark.parametrize("index_type", ["tbi", "csi"])
+@pytest.mark.parametrize("unsorted", ["positions", "chromosomes"])
+def test_unsorted_input(tmp_path, capsys, records, index_type, unsorted):
+    if unsorted == "positions":
+        # swap two records of chromosome 2
+        first = next(i for (i, record) in enumerate(records) if record[0] == "2" and records[i + 1][1] > record[1])
+        records = records[:first] + [records[first + 1], records[first]] + records[first + 2:]
+    else:
+        # chromosome 1 again after chromosome 2
+        records = records + [("1", 5, 6, "1\t6\tlate\tA\tC\t.\t.\t.\n")]
+
+    output_file = str(tmp_path / "test.vcf.gz")
+    index_file = f"{output_file}.{index_type}"
+    index = write_vcf(output_file, records, index_type)
+
+    assert not index.valid
+    assert not index.write(index_file)
+    assert not os.path.exists(index_file)
+    assert f"[WARNING] Cannot create {index_type} index" in capsys.readouterr().out
+
+    # the VCF itself is still written in full
+    with pysam.VariantFile(output_file) as vcf:
+        assert sum(1 for _ in vcf) == len(records)
+
+def test_large_position(tmp_path, capsys):
+    # tabix bins cover 2^29 bp, CSI bins with depth 6 go beyond that
+    contigs = {"1": 600_000_000}
+    line = "1\t590000000\tbig\tA\tC\t.\t.\t.\n"
+    header = HEADER.replace("##contig=<ID=1,length=3000000>", "##contig=<ID=1,length=600000000>")
+    for index_type in ("tbi", "csi"):
+        output_file = str(tmp_path / f"{index_type}.vcf.gz")
+        index = VcfIndex(index_type)
+        with BgzfWriter(output_file, index = index) as file:
+            file.write(header)
+            file.write(line)
+        assert index.write(f"{output_file}.{index_type}") == (index_type == "csi")
+
+    assert "too large for tbi index" in capsys.readouterr().out
+    output_file = str(tmp_path / "csi.vcf.gz")
+    with pysam.VariantFile(output_file, index_filename = output_file + ".csi") as vcf:
+        assert [record.id for record in vcf.fetch("1", 589999999, 590000000)] == ["big"]
+        assert [record.id for record in vcf.fetch("1", 0, 589999999)] == []
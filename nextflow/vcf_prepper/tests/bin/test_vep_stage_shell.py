@@ -0,0 +1,101 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import glob
+import subprocess
+
+import pytest
+
+BIN_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../bin")
+SHELL = os.path.join(BIN_DIR, "vep_stage_shell.sh")
+
+# task script as written by Nextflow - the shell directive as shebang, then the process script
+TASK_SCRIPT = '''#!{shell}
+cp homo_sapiens.ini config_used_by_vep.ini
+grep -E '^(cache|fasta|plugin) ' homo_sapiens.ini | while read -r name value; do
+  test -e "${{value#*=}}"
+done
+'''
+
+@pytest.fixture
+def task_dir(tmp_path):
+    'A VEP task directory with the VEP config input staged as a link to the genome config'
+    data_dir = tmp_path / "nfs"
+    (data_dir / "cache/homo_sapiens/114_GRCh38/1").mkdir(parents = True)
+    (data_dir / "cache/homo_sapiens/114_GRCh38/info.txt").write_text("species\thomo_sapiens\n")
+    (data_dir / "cache/homo_sapiens/114_GRCh38/1/1-1000000.gz").write_bytes(b"cache" * 100)
+    (data_dir / "Homo_sapiens.GRCh38.dna.toplevel.fa.gz").write_bytes(b"fasta" * 100)
+    (data_dir / "Homo_sapiens.GRCh38.dna.toplevel.fa.gz.fai").write_text("1\t500\t3\t60\t61\n")
+    (data_dir / "AlphaMissense_hg38.tsv.gz").write_bytes(b"plugin" * 100)
+
+    genome_config = tmp_path / "genome_temp_dir/homo_sapiens.ini"
+    genome_config.parent.mkdir()
+    genome_config.write_text(
+        "fork 2\n"
+        "species homo_sapiens\n"
+        "assembly GRCh38\n"
+        "cache_version 114\n"
+        f"cache {data_dir / 'cache'}\n"
+        f"fasta {data_dir / 'Homo_sapiens.GRCh38.dna.toplevel.fa.gz'}\n"
+        f"plugin AlphaMissense,file={data_dir / 'AlphaMissense_hg38.tsv.gz'}\n"
+    )
+
+    task_dir = tmp_path / "work/ab/cdef"
+    task_dir.mkdir(parents = True)
+    # as nxf_stage does, before the task script is run
+    (task_dir / "homo_sapiens.ini").symlink_to(genome_config)
+
+    return task_dir
+
+def run_task(task_dir, stage_dir) -> subprocess.CompletedProcess:
+    'Run the task script the way .command.run launches it: the shell directive and the script'
+    shell = [SHELL, str(stage_dir), "1", "/bin/bash", "-ue"]
+    (task_dir / ".command.sh").write_text(TASK_SCRIPT.format(shell = " ".join(shell)))
+
+    return subprocess.run(shell + [".command.sh"], cwd = task_dir, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+
+def test_stage_in_task_dir(task_dir, tmp_path):
+    stage_dir = tmp_path / "scratch/vep_stage"
+    genome_config = tmp_path / "genome_temp_dir/homo_sapiens.ini"
+    genome_config_text = genome_config.read_text()
+
+    process = run_task(task_dir, stage_dir)
+    assert process.returncode == 0, process.stderr.decode()
+
+    # VEP reads the config rewritten to the staged copies, the genome config is left as it is
+    config_used = (task_dir / "config_used_by_vep.ini").read_text()
+    settings = dict(line.split(" ", 1) for line in config_used.splitlines() if not line.startswith("#"))
+    assert settings["cache"].startswith(str(stage_dir))
+    assert settings["fasta"].startswith(str(stage_dir))
+    assert settings["plugin"].startswith(f"AlphaMissense,file={stage_dir}")
+    assert os.path.isfile(os.path.join(os.path.dirname(settings["fasta"]), "Homo_sapiens.GRCh38.dna.toplevel.fa.gz.fai"))
+    assert genome_config.read_text() == genome_config_text
+
+    # afterScript releases the staged files of the task
+    subprocess.run([os.path.join(BIN_DIR, "stage_vep_data.py"), "--release", "--stage_dir", str(stage_dir)], cwd = task_dir, check = True)
+    metas = [json.load(open(file)) for file in glob.glob(str(stage_dir / "objects/*.json"))]
+    assert len(metas) == 3
+    assert all(meta["refs"] == [] for meta in metas)
+
+def test_stage_failure_runs_task(task_dir, tmp_path):
+    # the stage directory cannot be created
+    (tmp_path / "scratch").write_text("")
+
+    process = run_task(task_dir, tmp_path / "scratch/vep_stage")
+
+    assert process.returncode == 0, process.stderr.decode()
+    assert b"[WARNING]" in process.stderr
+    assert (task_dir / "config_used_by_vep.ini").read_text() == (tmp_path / "genome_temp_dir/homo_sapiens.ini").read_text()
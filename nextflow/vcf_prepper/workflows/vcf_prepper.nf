@@ -29,6 +29,7 @@ include { CREATE_RANK_FILE } from "../modules/local/create_rank_file.nf"
 include { PREPARE_GENOME } from "../subworkflows/local/prepare_genome.nf"
 include { UPDATE_FIELDS } from "../modules/local/update_fields.nf"
 include { REMOVE_VARIANTS } from "../modules/local/remove_variants.nf"
+include { PRE_VEP } from "../modules/local/pre_vep.nf"
 include { RUN_VEP } from "../subworkflows/local/run_vep.nf"
 include { COUNT_VCF_VARIANT } from "../modules/local/count_vcf_variant.nf"
 include { SPLIT_VCF } from "../subworkflows/local/split_vcf.nf"
@@ -38,6 +39,7 @@ include { BED_TO_BIGBED } from "../modules/local/bed_to_bigbed.nf"
 include { BED_TO_WIG } from "../modules/local/bed_to_wig.nf"
 include { WIG_TO_BIGWIG } from "../modules/local/wig_to_bigwig.nf"
 include { SUMMARY_STATS } from "../modules/local/summary_stats.nf"
+include { POST_VEP } from "../modules/local/post_vep.nf"
 
 def parse_config (config) {
   input_set = []
@@ -87,11 +89,22 @@ workflow VCF_PREPPER {
   // api files
   if (!params.skip_vep) {
     // pre-process
-    UPDATE_FIELDS( PREPARE_GENOME.out )
-    REMOVE_VARIANTS( UPDATE_FIELDS.out )
+    if (params.pre_vep_single_pass) {
+      PRE_VEP( PREPARE_GENOME.out )
+      
+      PRE_VEP.out
+      .set { ch_pre_vep }
+    }
+    else {
+      UPDATE_FIELDS( PREPARE_GENOME.out )
+      REMOVE_VARIANTS( UPDATE_FIELDS.out )
+      
+      REMOVE_VARIANTS.out
+      .set { ch_pre_vep }
+    }
     
     // run vep
-    vep = RUN_VEP( REMOVE_VARIANTS.out )
+    vep = RUN_VEP( ch_pre_vep )
 
     // post-process
     COUNT_VCF_VARIANT( vep )
@@ -117,8 +130,22 @@ workflow VCF_PREPPER {
     ch_post_api = PREPARE_GENOME.out
   }
 
+  // track files and summary stats in a single pass over the VCF
+  post_vep_single_pass = params.post_vep_single_pass && !params.skip_tracks && !params.skip_stats
+  if (post_vep_single_pass) {
+    POST_VEP( CREATE_RANK_FILE.out, ch_post_api )
+
+    // create source tracks
+    BED_TO_BIGBED( POST_VEP.out.bed )
+    BED_TO_WIG( POST_VEP.out.bed )
+    WIG_TO_BIGWIG( BED_TO_WIG.out )
+
+    POST_VEP.out.vcf
+    .set { ch_stats_finish }
+  }
+
   // track files
-  if (!params.skip_tracks) {
+  if (!params.skip_tracks && !post_vep_single_pass) {
     // create bed from VCF
     // TODO: vcf_to_bed maybe faster without SPLIT_VCF - needs benchmarking
     SPLIT_VCF( ch_post_api )
@@ -141,7 +168,7 @@ workflow VCF_PREPPER {
   }
 
   // summary stats
-  if (!params.skip_stats) {
+  if (!params.skip_stats && !post_vep_single_pass) {
     // it can run in parallel to track generation
     SUMMARY_STATS( ch_post_api )
 
@@ -151,17 +178,27 @@ workflow VCF_PREPPER {
 
   // post process
   if (!params.skip_vep || !params.skip_stats){
-    if(!params.skip_stats && !params.skip_tracks) {
+    if (post_vep_single_pass) {
+      ch_stats_finish
+      .set { ch_post_process }
+    }
+    else if(!params.skip_stats && !params.skip_tracks) {
       ch_split_finish
       .join ( ch_stats_finish )
       .map {
-        meta, vcf, vcf_index ->
-          [meta, vcf, vcf_index]
+        meta, vcf, vcf_index, stats ->
+          [meta, vcf, vcf_index, stats]
       }
       .set { ch_post_process }
     }
     else if (params.skip_stats && !params.skip_tracks) {
-      ch_split_finish
+      // the split only carries meta, the VCF to move is the VEP output
+      ch_post_api
+      .join ( ch_split_finish )
+      .map {
+        meta, vcf, vcf_index ->
+          [meta, vcf, vcf_index, null]
+      }
       .set { ch_post_process }
     }
     else if (!params.skip_stats && params.skip_tracks) {
@@ -169,20 +206,34 @@ workflow VCF_PREPPER {
       .set { ch_post_process }
     }
     else {
+      // no variant metrics without summary stats
       ch_post_api
+      .map {
+        meta, vcf, vcf_index ->
+          [meta, vcf, vcf_index, null]
+      }
       .set { ch_post_process }
     }
 
     ch_post_process
     .map {
-      meta, vcf, vcf_index ->
+      meta, vcf, vcf_index, stats ->
         // TODO: when we have multiple source per genome we need to delete source specific files
         new_vcf = "${meta.genome_api_outdir}/variation.vcf.gz"
         new_vcf_index = "${meta.genome_api_outdir}/variation.vcf.gz.${meta.index_type}"
+        new_stats = "${meta.genome_api_outdir}/variation.stats.json"
         
         // in -resume vcf and vcf_index may not exists as already renamed
         // moveTo instead of renameTo - in -resume dest file may exists from previous run
         if ( file(vcf).exists() && file(vcf_index).exists() ) {
+          // metrics from a previous run would not match the new vcf
+          if ( stats != null && file(stats).exists() ) {
+            file(stats).moveTo(new_stats)
+          }
+          else {
+            file(new_stats).delete()
+          }
+
           file(vcf).moveTo(new_vcf)
           file(vcf_index).moveTo(new_vcf_index)
         }
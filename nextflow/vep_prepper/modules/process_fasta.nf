@@ -1,6 +1,7 @@
 process PROCESS_FASTA {
 	input:
 	tuple path(fasta), val(outdir_suffix)
+	path(scripts)
 
 	output:
 
@@ -9,8 +10,8 @@ process PROCESS_FASTA {
 	out_filename = fasta.getName().replace(".gz", ".bgz")
 
 	'''
-	gzip -dc !{fasta} | bgzip -c > !{out_filename}
-	samtools faidx !{out_filename}
+	# bgzip, .fai and .gzi in a single pass - prepare_fasta.py and bgzf.py are staged from vcf_prepper
+	python3 prepare_fasta.py !{fasta} -O !{out_filename} --threads !{task.cpus}
 
 	# move
 	mkdir -p !{out_dir}
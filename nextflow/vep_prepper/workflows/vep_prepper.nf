@@ -14,6 +14,9 @@ params.fasta_file = ""
 params.outdir = "/hps/nobackup/flicek/ensembl/variation/snhossain/website/vep_prepper/output"
 params.outdir_suffix = ""
 
+// scripts of vcf_prepper used to bgzip and index FASTA, staged in PROCESS_FASTA
+params.prepare_fasta_scripts = "${projectDir}/../vcf_prepper/bin/{prepare_fasta,bgzf}.py"
+
 // create payload? [TBD]
 params.payload = 0
 
@@ -67,7 +70,8 @@ workflow VEP_PREPPER {
   }
 
   PROCESS_GFF(gff_files)
-  PROCESS_FASTA(fasta_files)
+  prepare_fasta_scripts = Channel.fromPath(params.prepare_fasta_scripts).collect()
+  PROCESS_FASTA(fasta_files, prepare_fasta_scripts)
 
   // TBD
   if (params.payload){
@@ -35,6 +35,13 @@ from pathlib import Path
 from typing import List, Optional
 import requests
 
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), "..", "nextflow", "vcf_prepper", "bin"
+    )
+)
+import db
+
 ## IMPORTANT: currently this script only supports EVA - we should update the output to have Ensembl data manually -
 # - triticum_aestivum
 # - triticum_turgidum
@@ -132,7 +139,7 @@ def get_ensembl_species(server: dict, meta_db: str) -> dict:
     Query metadata db for every available genome.
 
     Raises:
-        SystemExit: If the underlying `mysql` subprocess fails.
+        SystemExit: If the query fails.
 
     Returns:
         dict:  `{genome_uuid: {species, assembly_id, assembly_name}}`.
@@ -148,34 +155,14 @@ def get_ensembl_species(server: dict, meta_db: str) -> dict:
             WHERE g.assembly_id = a.assembly_id
             """
 
-    process = subprocess.run(
-        [
-            "mysql",
-            "--host",
-            server["host"],
-            "--port",
-            server["port"],
-            "--user",
-            server["user"],
-            "--database",
-            meta_db,
-            "-N",
-            "--execute",
-            query,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-
-    if process.returncode != 0:
-        print(
-            f"[ERROR] Failed to retrieve Ensembl species - {process.stderr.decode().strip()}. \nExiting..."
-        )
+    try:
+        rows = db.query(server, query, database=meta_db)
+    except db.DatabaseError as e:
+        print(f"[ERROR] Failed to retrieve Ensembl species - {e}. \nExiting...")
         exit(1)
 
     ensembl_species = {}
-    for species_meta in process.stdout.decode().strip().split("\n"):
-        (genome_uuid, species, assembly, assembly_default) = species_meta.split()
+    for (genome_uuid, species, assembly, assembly_default) in rows:
         ensembl_species[genome_uuid] = {
             "species": species,
             "assembly_id": assembly,
@@ -191,7 +178,7 @@ def get_ensembl_vcf_filepaths(server: dict, meta_db: str) -> dict:
     VCF-prepper pipeline.
 
     Raises:
-        SystemExit: On failure of the SQL query / subprocess.
+        SystemExit: On failure of the SQL query.
 
     Returns:
         dict:  `{genome_uuid: {species, assembly_id, file_path}}`.
@@ -218,34 +205,14 @@ def get_ensembl_vcf_filepaths(server: dict, meta_db: str) -> dict:
             AND s.type = 'vcf';
     """
 
-    process = subprocess.run(
-        [
-            "mysql",
-            "--host",
-            server["host"],
-            "--port",
-            server["port"],
-            "--user",
-            server["user"],
-            "--database",
-            meta_db,
-            "-N",
-            "--execute",
-            query,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-
-    if process.returncode != 0:
-        print(
-            f"[ERROR] Failed to retrieve Ensembl species - {process.stderr.decode().strip()}. \nExiting..."
-        )
+    try:
+        rows = db.query(server, query, database=meta_db)
+    except db.DatabaseError as e:
+        print(f"[ERROR] Failed to retrieve Ensembl species - {e}. \nExiting...")
         exit(1)
 
     ensembl_filepaths = {}
-    for filepath_meta in process.stdout.decode().strip().split("\n"):
-        (accession, production_name, genome_uuid, file_path) = filepath_meta.split()
+    for (accession, production_name, genome_uuid, file_path) in rows:
         ensembl_filepaths[
             genome_uuid
         ] = {  # using genome_uuid as key, as assembly_id isn't unique i.e. GCA_015227675.2 is mapped to two genome_uuid
@@ -263,7 +230,7 @@ def get_ensembl_variant_counts(server: dict, meta_db: str) -> dict:
     metadata db.
 
     Raises:
-        SystemExit: When the MySQL subprocess exits non-zero.
+        SystemExit: When the MySQL query fails.
 
     Returns:
         dict:  `{genome_uuid: {"assembly": accession,
@@ -287,34 +254,14 @@ def get_ensembl_variant_counts(server: dict, meta_db: str) -> dict:
                 AND attr.name = 'variation.stats.short_variants';
     """
 
-    process = subprocess.run(
-        [
-            "mysql",
-            "--host",
-            server["host"],
-            "--port",
-            server["port"],
-            "--user",
-            server["user"],
-            "--database",
-            meta_db,
-            "-N",
-            "--execute",
-            query,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-
-    if process.returncode != 0:
-        print(
-            f"[ERROR] Failed to retrieve Ensembl variant counts - {process.stderr.decode().strip()}. \nExiting..."
-        )
+    try:
+        rows = db.query(server, query, database=meta_db)
+    except db.DatabaseError as e:
+        print(f"[ERROR] Failed to retrieve Ensembl variant counts - {e}. \nExiting...")
         exit(1)
 
     ensembl_variant_counts = {}
-    for ensembl_variant_count in process.stdout.decode().strip().split("\n"):
-        (assembly, genome_uuid, variant_count) = ensembl_variant_count.split()
+    for (assembly, genome_uuid, variant_count) in rows:
         ensembl_variant_counts[genome_uuid] = {
             "assembly": assembly,
             "variant_count": int(variant_count),
@@ -612,36 +559,14 @@ def get_ensembl_release_status(server: dict, meta_db: str) -> str:
             WHERE er.status IN ('prepared','planned');
     """
 
-    process = subprocess.run(
-        [
-            "mysql",
-            "--host",
-            server["host"],
-            "--port",
-            server["port"],
-            "--user",
-            server["user"],
-            "--database",
-            meta_db,
-            "-N",
-            "--execute",
-            query,
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-
-    if process.returncode != 0:
-        print(
-            f"[ERROR] Failed to retrieve release status - {process.stderr.decode().strip()}. \nExiting..."
-        )
+    try:
+        rows = db.query(server, query, database=meta_db)
+    except db.DatabaseError as e:
+        print(f"[ERROR] Failed to retrieve release status - {e}. \nExiting...")
         exit(1)
 
     ensembl_release_status = defaultdict(list)
-    for release_meta in process.stdout.decode().strip().split("\n"):
-        (genome_uuid, production_name, assembly_id, status, release_id) = (
-            release_meta.split()
-        )
+    for (genome_uuid, production_name, assembly_id, status, release_id) in rows:
         ensembl_release_status[genome_uuid] = {
             "species": re.sub(
                 r"_gca.*$", "", production_name
@@ -14,14 +14,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from cyvcf2 import VCF, Writer
+from cyvcf2 import VCF
 import argparse
 import configparser
 import subprocess
 import os
+import sys
 import json
 import pprint
 
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "nextflow", "vcf_prepper", "bin"))
+from helper import BgzfWriter, VcfIndex
+from db import DatabaseError, list_databases, query
+
 parser = argparse.ArgumentParser()
 parser.add_argument("--species", dest="species", type=str, help="Species production name")
 parser.add_argument("--version", dest="version", type=str, help="Ensembl version")
@@ -30,6 +35,7 @@ parser.add_argument("--vcf_config_dir", dest="vcf_config_dir", type=str, help="F
 parser.add_argument("--data_root_dir", dest="data_root_dir", type=str, help="Full path to the /nfs root directory where the genotype files located, default - /nfs/production/flicek/ensembl/production/ensemblftp/data_files")
 parser.add_argument("--division", dest="division", type=str, help="Ensembl division")
 parser.add_argument("--base_outdir", dest="base_outdir", type=str, help="Full path to the base output dir, default - /nfs/production/flicek/ensembl/variation/new_website/vep/custom_data/")
+parser.add_argument("--threads", dest="threads", type=int, default=1, help="Number of threads used to compress the output VCF, default - 1")
 args = parser.parse_args()
 
 species_list = args.species or None
@@ -39,6 +45,7 @@ vcf_config_dir = args.vcf_config_dir or None
 data_root_dir = args.data_root_dir or "/nfs/production/flicek/ensembl/production/ensemblftp/data_files"
 division = args.division or "vertebrates"
 base_outdir = args.base_outdir or "/nfs/production/flicek/ensembl/variation/new_website/vep/custom_data/"
+threads = args.threads
 
 def parse_ini(ini_file: str, section: str = "database") -> dict:
     config = configparser.ConfigParser()
@@ -59,118 +66,50 @@ def parse_ini(ini_file: str, section: str = "database") -> dict:
     }
 
 def get_db_name(server: dict, version: str, species: str, type: str) -> str:
-    query = f"SHOW DATABASES LIKE '{species}_{type}%{version}%';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-
-    results = process.stdout.decode().strip().split("\n")
+    results = list_databases(server, f"{species}_{type}%{version}%")
     if len(results) > 1:
         print(f"[WARNING] Multiple {type} database found - returning the first match only")
 
-    return results[0]
+    return results[0] if results else ""
 
 def get_population_against_id(server: dict, variation_db: str) -> str:
-    query = f"SELECT population_id, name from population;"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", variation_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-
     populations = {}
     try:
-        for record in process.stdout.decode().strip().split("\n"):
-            (id, name) = record.split("\t")
+        for (id, name) in query(server, "SELECT population_id, name from population;", (), variation_db):
             populations[id] = name.replace(",", "%2C")
-    except:
+    except DatabaseError:
         pass
     
     return populations
 
 def get_population_structure(server: dict, variation_db: str) -> str:
-    query = f"SELECT super_population_id, sub_population_id from population_structure;"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", variation_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
     super_population = {}
     try:
-        for record in process.stdout.decode().strip().split("\n"):
-            (super_population_id, sub_population_id) = record.split("\t")
+        for (super_population_id, sub_population_id) in query(server, "SELECT super_population_id, sub_population_id from population_structure;", (), variation_db):
             super_population[sub_population_id] = super_population_id
-    except:
+    except DatabaseError:
         pass
 
     return super_population
 
 def get_sample_against_id(server: dict, variation_db: str) -> str:
-    query = f"SELECT sample_id, name from sample;"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", variation_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
     samples = {}
     try:
-        for record in process.stdout.decode().strip().split("\n"):
-            (id, name) = record.split("\t")
+        for (id, name) in query(server, "SELECT sample_id, name from sample;", (), variation_db):
             samples[id] = name
-    except:
+    except DatabaseError:
         pass
 
     return samples
 
 def get_sample_populations(server: dict, variation_db: str) -> str:
-    query = f"SELECT sample_id, population_id from sample_population;"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", variation_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
     sample_populations = {}
     try:
-        for record in process.stdout.decode().strip().split("\n"):
-            (sample_id, population_id) = record.split("\t")
+        for (sample_id, population_id) in query(server, "SELECT sample_id, population_id from sample_population;", (), variation_db):
             if sample_id not in sample_populations:
                 sample_populations[sample_id] = []
             sample_populations[sample_id].append(population_id)
-    except:
+    except DatabaseError:
         pass
 
     return sample_populations
@@ -328,7 +267,11 @@ for species in species_list:
             print(f"[ERROR] cannot create output dir - {outdir}")
             exit(1)
 
-        output_vcf = Writer(output_file, input_vcf)
+        # write bgzipped and indexed output directly instead of bgzip-ing and indexing it afterwards
+        bgzipped_file = output_file + ".gz"
+        index = VcfIndex("csi")
+        output_vcf = BgzfWriter(bgzipped_file, threads = threads, index = index)
+        output_vcf.write(input_vcf.raw_header)
 
         # generally there are single file per population - if there is more than one, .e.g. - mouse MGP than we need to manually change it later on
         population_data[species].append({
@@ -377,7 +320,7 @@ for species in species_list:
                     variant.INFO[f"{population}_AF"] = ",".join([str(af) for af in afs])
 
             try:
-                output_vcf.write_record(variant)
+                output_vcf.write(str(variant))
             except:
                 pprint.pprint(variant)
                 exit(1)
@@ -385,14 +328,8 @@ for species in species_list:
         input_vcf.close()
         output_vcf.close()
 
-        process = subprocess.run(["bgzip", output_file], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if process.returncode != 0:
-            print(f"[WARNING] failed to bgzip - {output_file}")
-        else:
-            bgzipped_file = output_file + ".gz"
-            process = subprocess.run(["tabix", "-C", "-p", "vcf", bgzipped_file], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if process.returncode != 0:
-                print(f"[WARNING] failed to create tabix index for - {bgzipped_file}.gz")
+        if not index.write(bgzipped_file + ".csi"):
+            print(f"[WARNING] failed to create tabix index for - {bgzipped_file}")
 
 population_data_file = os.path.join(os.getcwd(), f"population_data_{division}.json")
 with open(population_data_file, "w") as file:
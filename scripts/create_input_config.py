@@ -19,9 +19,11 @@ import configparser
 import argparse
 import os
 import json
-import subprocess
 import requests
 
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "nextflow", "vcf_prepper", "bin"))
+from db import list_databases, query_value
+
 # IMPORTANT: currently this script only supports EVA - we should update the output to have Ensembl data manually; human will be manual as well
 
 EVA_REST_ENDPOINT = "https://www.ebi.ac.uk/eva/webservices/release/v1"
@@ -55,53 +57,20 @@ def parse_ini(ini_file: str, section: str = "database") -> dict:
     }
 
 def get_db_name(server: dict, version: str, species: str = "homo_sapiens", type: str = "core") -> str:
-    query = f"SHOW DATABASES LIKE '{species}_{type}%{version}%';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    return process.stdout.decode().strip()
+    databases = list_databases(server, f"{species}_{type}%{version}%")
+    return databases[0] if databases else ""
     
 def get_assembly_name(server: dict, core_db: str) -> str:
-    query = f"SELECT meta_value FROM meta where meta_key = 'assembly.default';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", core_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    return process.stdout.decode().strip()
+    query = "SELECT meta_value FROM meta where meta_key = 'assembly.default';"
+    return query_value(server, query, (), core_db) or ""
 
 # TBD: currently this scripts only support EVA
 def get_source() -> str:
     return "EVA"
 
 def get_genome_uuid(server: dict, meta_db: str, species, assembly) -> str:
-    query = f"SELECT genome_uuid FROM genome AS g, organism AS o, assembly AS a WHERE g.assembly_id = a.assembly_id and g.organism_id = o.organism_id and a.accession = '{assembly}' and o.ensembl_name = '{species}';"
-    process = subprocess.run(["mysql",
-            "--host", server["host"],
-            "--port", server["port"],
-            "--user", server["user"],
-            "--database", meta_db,
-            "-N",
-            "--execute", query
-        ],
-        stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE
-    )
-    
-    return process.stdout.decode().strip()
+    query = "SELECT genome_uuid FROM genome AS g, organism AS o, assembly AS a WHERE g.assembly_id = a.assembly_id and g.organism_id = o.organism_id and a.accession = %s and o.ensembl_name = %s;"
+    return query_value(server, query, (assembly, species), meta_db) or ""
     
 def get_latest_eva_version() -> int:
     url = EVA_REST_ENDPOINT + "/info/latest"
@@ -24,6 +24,12 @@ import requests
 from uuid import UUID
 from cyvcf2 import VCF
 
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "nextflow", "vcf_prepper", "bin"))
+from csq_schema import CsqSchema
+
+# variant metrics written by summary_stats.py next to the api VCF
+STATS_FILE_NAME = "variation.stats.json"
+
 def parse_args(args = None):
     parser = argparse.ArgumentParser()
     
@@ -55,21 +61,10 @@ def get_variant_count(file: str) -> str:
         {e}""")
         return None
 
-def get_csq_field_index(csq: str, field: str ="Consequence") -> int:
-    prefix = "Consequence annotations from Ensembl VEP. Format: "
-    csq_list = csq[len(prefix):].split("|")
-
-    for index, value in enumerate(csq_list):
-        if value == field:
-            return index
-
-    return None
-
 def get_variant_example(file: str, species: str) -> str:
     vcf = VCF(file)
     
-    csq_info_description = vcf.get_header_type("CSQ")["Description"].strip("\"")
-    consequence_idx = get_csq_field_index(csq_info_description, "Consequence")
+    csq_schema = CsqSchema.from_vcf(vcf, ["Consequence"])
 
     # if human, try to find rs699 in 400kbp range
     if species.startswith("homo_sapiens"):
@@ -82,10 +77,7 @@ def get_variant_example(file: str, species: str) -> str:
 
     # find a missense_variant
     for variant in vcf:
-        csqs = variant.INFO["CSQ"]
-        for csq in csqs.split(","):
-            consequence = csq.split("|")[consequence_idx]
-
+        for (consequence, ) in csq_schema.parse(variant.INFO["CSQ"]):
             if consequence == "missense_variant":
                 chrom = variant.CHROM
                 pos = variant.POS
@@ -102,19 +94,15 @@ def get_variant_example(file: str, species: str) -> str:
 def get_evidence_count(file: str, csq_field: str) -> int:
     vcf = VCF(file)
     
-    csq_info_description = vcf.get_header_type("CSQ")["Description"].strip("\"")
-    csq_field_idx = get_csq_field_index(csq_info_description, csq_field)
+    csq_schema = CsqSchema.from_vcf(vcf, [csq_field])
 
-    if csq_field_idx is None:
+    if not csq_schema.has(csq_field):
         return None
 
     # find a missense_variant
     count = 0
     for variant in vcf:
-        csqs = variant.INFO["CSQ"]
-        for csq in csqs.split(","):
-            csq_value = csq.split("|")[csq_field_idx]
-
+        for (csq_value, ) in csq_schema.parse(variant.INFO["CSQ"]):
             if csq_value != "":
                 count += 1
                 break
@@ -123,6 +111,14 @@ def get_evidence_count(file: str, csq_field: str) -> int:
     count = None if count == 0 else count
     return count
 
+def get_variant_stats(file: str) -> dict:
+    stats_file = os.path.join(os.path.dirname(file), STATS_FILE_NAME)
+    if not os.path.isfile(stats_file):
+        return None
+
+    with open(stats_file, "r") as f:
+        return json.load(f)
+
 def parse_input_config(input_config: str) -> dict:
     if not os.path.isfile(input_config):
         return []
@@ -206,9 +202,17 @@ def main(args = None):
             payload["genome_uuid"] = genome_uuid
 
             dataset_attribute = []
+
+            # use precomputed metrics if available, otherwise scan the VCF
+            variant_stats = get_variant_stats(api_vcf)
+            if variant_stats is None:
+                print(f"[INFO] {STATS_FILE_NAME} not found for {genome_uuid}, scanning {api_vcf}")
             
             if dataset_type == 'variation':
-                variant_count = get_variant_count(api_vcf)
+                if variant_stats is not None:
+                    variant_count = variant_stats["variant_count"]
+                else:
+                    variant_count = get_variant_count(api_vcf)
                 if variant_count is not None:
                     attribute = {}
                     attribute["name"] = "variation.short_variants"
@@ -216,20 +220,30 @@ def main(args = None):
                     dataset_attribute.append(attribute)
 
 
-                variant_example = get_variant_example(api_vcf, species)
+                if variant_stats is not None:
+                    variant_example = variant_stats["variant_example"]
+                else:
+                    variant_example = get_variant_example(api_vcf, species)
                 attribute = {}
                 attribute["name"] = "variation.sample_variant"
                 attribute["value"] = variant_example
                 dataset_attribute.append(attribute)
             else:
-                phenotype_count = get_evidence_count(api_vcf, "PHENOTYPES")
+                if variant_stats is not None:
+                    # do not report 0 count
+                    phenotype_count = variant_stats["phenotype_variant_count"] or None
+                else:
+                    phenotype_count = get_evidence_count(api_vcf, "PHENOTYPES")
                 if phenotype_count is not None:
                     attribute = {}
                     attribute["name"] = "variation.short_variants_with_phenotype_assertions"
                     attribute["value"] = phenotype_count
                     dataset_attribute.append(attribute)
 
-                publication_count = get_evidence_count(api_vcf, "PUBMED")
+                if variant_stats is not None:
+                    publication_count = variant_stats["citation_variant_count"] or None
+                else:
+                    publication_count = get_evidence_count(api_vcf, "PUBMED")
                 if publication_count is not None:
                     attribute = {}
                     attribute["name"] = "variation.short_variants_with_publications"